@@ -6,17 +6,30 @@ A Python Flask application that:
 3. Sends notifications to doctors and family based on verification results
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import concurrent.futures
+import io
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import json
 from pathlib import Path
 
-from ocr_reader import OCRReader
+from ocr_reader import OCRReader, OCRUnavailableError, preload_ocr_engines
+from ocr_cache import OCRResultCache
+from preprocessing import DEFAULT_STEPS, ImagePreprocessor
+from image_downloader import ImageDownloader, ImageTooLargeError, read_limited, iter_file_chunks
+from matcher import MedicineMatcher
+from drug_lexicon import load_default_lexicon
+from photo_store import PhotoStore
+from photo_hash import HASH_KIND, DuplicateDetector, image_hash
+from visual_matcher import VisualMatcher
 from medicine_manager import MedicineManager
 from notification_service import NotificationService
+from contact_directory import ContactDirectory
+from outbox import NotificationOutbox, NotificationRetry
+from jobs import JobQueue
 
 # Optional Firebase integration
 try:
@@ -27,13 +40,36 @@ except ImportError:
     FIREBASE_AVAILABLE = False
     print("⚠️  Firebase Admin SDK not available. Install: pip install firebase-admin")
 
+
+
+class InMemoryRequest(Request):
+    """Keep multipart uploads in memory instead of spooling large ones to a temp file"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # MAX_CONTENT_LENGTH bounds the request, so the buffer is bounded too
+        return io.BytesIO()
+
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 CORS(app)  # Enable CORS for frontend integration
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+DEFAULT_PAGE_SIZE = 50
+OCR_RETRY_AFTER = '5'  # seconds, sent with 503 when OCR is at capacity
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 100
+BATCH_WORKERS = 8  # items matched, saved and notified concurrently
+
+# OCR_STRATEGY=tiered tries cheap OCR passes first and stops as soon as one
+# yields a match at least OCR_ACCEPT_CONFIDENCE confident; 'single' runs one pass
+OCR_STRATEGY = os.getenv('OCR_STRATEGY', 'tiered').lower()
+OCR_ACCEPT_CONFIDENCE = float(os.getenv('OCR_ACCEPT_CONFIDENCE', '0.85'))
+
+DUPLICATE_SCAN = 20  # recent verifications searched for a repeat of the same photo
 
 # Create upload directories
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -49,9 +85,103 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 # Initialize services
-ocr_reader = OCRReader()
+# OCR_EXECUTION_MODE=process runs OCR in a bounded process pool (OCR_WORKERS,
+# OCR_TASK_TIMEOUT, OCR_MAX_PENDING); requests beyond capacity get a 503
+ocr_reader = OCRReader(
+    execution_mode=os.getenv('OCR_EXECUTION_MODE', 'inline'),
+    max_workers=int(os.getenv('OCR_WORKERS', '0')) or None,
+    task_timeout=float(os.getenv('OCR_TASK_TIMEOUT', '60')),
+    max_pending=int(os.getenv('OCR_MAX_PENDING', '0')) or None,
+    # Pooled keep-alive session for image URLs, with retries on 5xx/timeouts
+    downloader=ImageDownloader(
+        max_bytes=MAX_FILE_SIZE,
+        connect_timeout=float(os.getenv('DOWNLOAD_CONNECT_TIMEOUT', '5')),
+        read_timeout=float(os.getenv('DOWNLOAD_READ_TIMEOUT', '30')),
+        max_retries=int(os.getenv('DOWNLOAD_RETRIES', '2')),
+        pool_size=int(os.getenv('DOWNLOAD_POOL_SIZE', '10'))
+    ),
+    # Identical photos (re-shoots, client retries) reuse earlier OCR results
+    cache=OCRResultCache(
+        memory_entries=int(os.getenv('OCR_CACHE_ENTRIES', '512')),
+        disk_dir=os.getenv('OCR_CACHE_DIR', 'data/ocr_cache'),
+        disk_max_bytes=int(os.getenv('OCR_CACHE_MAX_MB', '256')) * 1024 * 1024
+    ) if os.getenv('OCR_CACHE', '1') != '0' else None,
+    # Tesseract preprocessing: add 'crop' to OCR_PREPROCESS_STEPS for label cropping
+    preprocessor=ImagePreprocessor(
+        steps=os.getenv('OCR_PREPROCESS_STEPS', ','.join(DEFAULT_STEPS)).split(','),
+        target_text_height=int(os.getenv('OCR_TEXT_HEIGHT', '32')),
+        max_side=int(os.getenv('OCR_MAX_SIDE', '2400'))
+    ),
+    # Passes for OCR_STRATEGY=tiered, cheapest first
+    tiered_passes=[p.strip() for p in os.getenv('OCR_PASSES', '').split(',') if p.strip()] or None
+)
 medicine_manager = MedicineManager()
-notification_service = NotificationService()
+# Drug lexicon correction is opt-in (DRUG_LEXICON=1) until the word list
+# covers look-alike drug names
+medicine_matcher = MedicineMatcher(
+    lexicon=load_default_lexicon(os.getenv('DRUG_LEXICON_FILE')) if os.getenv('DRUG_LEXICON', '0') == '1' else None
+)
+
+# Doctor and family contacts: config/user_contacts.json, indexed in memory
+# and reloaded when the file changes. CONTACTS_DB=<sqlite file> (e.g.
+# data/medicines.db) reads them from its user_contacts table instead;
+# fill it with: python contact_directory.py import config/user_contacts.json <file>
+contact_directory = ContactDirectory(db_path=os.getenv('CONTACTS_DB') or None)
+
+# Outbox and match digests share the medicines database with the SQLite
+# backend (see NotificationOutbox below and "digest" in notification_config.json)
+notification_db = getattr(medicine_manager.storage, 'db_path', None) or os.path.join('data', 'outbox.db')
+notification_service = NotificationService(contacts=contact_directory, digest_db=notification_db)
+
+# Notifications are queued in a durable outbox together with the verification
+# record (same transaction with the SQLite backend) and sent by background
+# dispatchers with retries, so verify never waits on SMTP or SMS.
+# NOTIFICATION_OUTBOX=0 sends them inline instead
+notification_outbox = NotificationOutbox(
+    db_path=notification_db,
+    dispatchers=int(os.getenv('NOTIFICATION_DISPATCHERS', '2')),
+    max_attempts=int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '5')),
+    retry_delay=float(os.getenv('NOTIFICATION_RETRY_DELAY', '30'))
+) if os.getenv('NOTIFICATION_OUTBOX', '1') != '0' else None
+
+# Back photos are fingerprinted at registration (ORB keypoints, colour/edge
+# histograms) and patient photos compared with them; the visual score is
+# fused with the OCR confidence. VISUAL_MATCHING=0 disables this
+visual_matcher = VisualMatcher(
+    use_keypoints=os.getenv('VISUAL_KEYPOINTS', '1') != '0'
+) if os.getenv('VISUAL_MATCHING', '1') != '0' else None
+
+# A near-duplicate of a photo the user sent within DUPLICATE_WINDOW seconds
+# (burst shots, re-sends) returns the earlier verification: no OCR, no new
+# record, no notifications. DUPLICATE_WINDOW=0 disables this
+duplicate_detector = DuplicateDetector(
+    window_seconds=float(os.getenv('DUPLICATE_WINDOW', '120')),
+    max_distance=int(os.getenv('DUPLICATE_MAX_DISTANCE', '16')),
+    wait_timeout=float(os.getenv('OCR_TASK_TIMEOUT', '60'))
+)
+
+# OCR reads uploads from memory; the originals are kept on disk by a background
+# writer unless PERSIST_UPLOADS=0 (records then have no photo path)
+photo_store = PhotoStore(UPLOAD_FOLDER, enabled=os.getenv('PERSIST_UPLOADS', '1') != '0')
+
+# Background workers for async verification (?async=1). Set JOB_QUEUE_DB to
+# share the queue between gunicorn workers and keep jobs across restarts.
+# The in-memory queue is per process, so with several workers
+# (gunicorn.conf.py, WEB_CONCURRENCY) the SQLite queue is the default
+job_queue_db = os.getenv('JOB_QUEUE_DB') or None
+if job_queue_db is None and int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+    job_queue_db = os.path.join('data', 'jobs.db')
+job_queue = JobQueue(
+    workers=int(os.getenv('JOB_WORKERS', '2')),
+    db_path=job_queue_db,
+    max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+)
+
+# OCR engines load lazily on first use. OCR_PRELOAD=easyocr (or
+# "tesseract,easyocr") loads them now instead - with gunicorn's preload_app
+# this happens once in the master and workers share the model weights
+if os.getenv('OCR_PRELOAD'):
+    preload_ocr_engines([e.strip() for e in os.getenv('OCR_PRELOAD').split(',') if e.strip()])
 
 
 def allowed_file(filename):
@@ -60,6 +190,11 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def read_upload(file) -> bytes:
+    """Read an uploaded file into memory, enforcing MAX_FILE_SIZE"""
+    return read_limited(iter_file_chunks(file.stream), MAX_FILE_SIZE)
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -123,16 +258,23 @@ def register_medicine():
         
         # Extract text using OCR
         if image_url:
-            # Use Firebase Storage URL
-            ocr_text = ocr_reader.extract_text_from_url(image_url)
+            # Use Firebase Storage URL (downloaded up front when it is also fingerprinted)
+            image_bytes = load_image_bytes(image_url, None) if visual_matcher else None
+            if image_bytes is not None:
+                ocr_text = ocr_reader.extract_text_from_bytes(image_bytes)
+            else:
+                ocr_text = ocr_reader.extract_text_from_url(image_url)
             photo_path_or_url = image_url
         else:
-            # Use uploaded file
+            # Use uploaded file (OCR runs on the in-memory bytes)
+            image_bytes = read_upload(file)
             filename = secure_filename(f"{user_id}_{medicine_name}_{datetime.now().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'medicine_back', filename)
-            file.save(filepath)
-            ocr_text = ocr_reader.extract_text(filepath)
-            photo_path_or_url = filepath
+            ocr_text = ocr_reader.extract_text_from_bytes(image_bytes)
+            photo_path_or_url = photo_store.save('medicine_back', filename, image_bytes)
+        
+        visual_fingerprint = None
+        if visual_matcher and image_bytes is not None:
+            visual_fingerprint = visual_matcher.fingerprint(image_bytes)
         
         # Register medicine
         medicine_data = {
@@ -146,16 +288,21 @@ def register_medicine():
             'verified': True  # Back photo contains the medicine name
         }
         
-        medicine_id = medicine_manager.register_medicine(medicine_data)
+        medicine_id = medicine_manager.register_medicine(medicine_data, visual_fingerprint=visual_fingerprint)
         
         return jsonify({
             'success': True,
             'medicine_id': medicine_id,
             'message': f'Medicine "{medicine_name}" registered successfully',
             'ocr_extracted_text': ocr_text,
+            'visual_fingerprint': visual_fingerprint is not None,
             'medicine_data': medicine_data
         }), 200
         
+    except ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except OCRUnavailableError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': OCR_RETRY_AFTER}
     except Exception as e:
         import traceback
         print(f"Error in register_medicine: {traceback.format_exc()}")
@@ -175,6 +322,9 @@ def verify_medicine():
     - imageUrl: Firebase Storage URL (optional if file provided)
     - user_id: ID of the patient (required)
     - medicine_id: Optional - specific medicine ID to verify against
+    
+    With ?async=1 the request returns 202 and a job_id immediately;
+    poll GET /api/medicine/jobs/<job_id> for the result
     """
     try:
         # Check if JSON request (Firebase URL) or form data (file upload)
@@ -211,68 +361,301 @@ def verify_medicine():
         if not user_id:
             return jsonify({'error': 'User ID is required'}), 400
         
-        # Extract text using OCR
-        if image_url:
-            # Use Firebase Storage URL
-            patient_ocr_text = ocr_reader.extract_text_from_url(image_url)
-            photo_path_or_url = image_url
-        else:
-            # Use uploaded file
+        run_async = request.args.get('async', '').lower() in ('1', 'true', 'yes')
+        
+        filepath = None
+        image_bytes = None
+        if not image_url:
+            image_bytes = read_upload(file)
             filename = secure_filename(f"{user_id}_patient_{datetime.now().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'patient_photos', filename)
-            file.save(filepath)
-            patient_ocr_text = ocr_reader.extract_text(filepath)
-            photo_path_or_url = filepath
+            if run_async:
+                # The job may run in another process after this request ends,
+                # so it needs the photo on disk before it is queued
+                filepath = photo_store.write('patient_photos', filename, image_bytes)
+                image_bytes = None
+            else:
+                filepath = photo_store.save('patient_photos', filename, image_bytes)
         
-        # Get registered medicines for the user
-        if medicine_id:
-            # Verify against specific medicine
-            registered_medicines = [medicine_manager.get_medicine(medicine_id)]
-            registered_medicines = [m for m in registered_medicines if m]
-        else:
-            # Verify against all user's medicines
-            registered_medicines = medicine_manager.get_user_medicines(user_id)
+        params = {
+            'user_id': user_id,
+            'medicine_id': medicine_id,
+            'image_url': image_url,
+            'filepath': filepath
+        }
         
-        if not registered_medicines:
+        if run_async:
+            job_id = job_queue.submit('verify', params)
             return jsonify({
-                'verified': False,
-                'message': 'No registered medicines found for this user',
-                'patient_ocr_text': patient_ocr_text
-            }), 200
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/api/medicine/jobs/{job_id}'
+            }), 202
         
-        # Compare patient photo OCR with registered medicines
-        verification_results = []
-        for medicine in registered_medicines:
-            match_result = ocr_reader.compare_text(
-                patient_ocr_text, 
-                medicine['medicine_name'],
-                medicine.get('back_photo_ocr', '')
-            )
-            
-            verification_results.append({
-                'medicine_id': medicine['medicine_id'],
-                'medicine_name': medicine['medicine_name'],
-                'match': match_result['match'],
-                'confidence': match_result['confidence'],
-                'match_details': match_result
-            })
+        result, status_code = run_verification(params, image_bytes=image_bytes)
+        return jsonify(result), status_code
         
-        # Find best match
-        best_match = max(verification_results, key=lambda x: x['confidence'])
-        is_verified = best_match['match']
+    except ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except OCRUnavailableError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': OCR_RETRY_AFTER}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def run_verification(params: dict, image_bytes: bytes = None):
+    """
+    Verification pipeline: OCR, match against registered medicines,
+    persist the record and notify contacts
+    Runs inline for /api/medicine/verify or in a job worker for async requests
+    Args:
+        params: user_id, medicine_id (optional), and image_url or filepath
+        image_bytes: Uploaded photo already in memory (inline requests only);
+                     params['filepath'] is then just where a copy is kept
+    Returns:
+        (response payload, HTTP status code)
+    """
+    image_url = params.get('image_url')
+    if image_url:
+        # Use Firebase Storage URL
+        photo_path_or_url = image_url
+    elif image_bytes is not None:
+        # Use uploaded file held in memory
+        photo_path_or_url = params.get('filepath')
+    else:
+        # Use uploaded file stored by an async request
+        photo_path_or_url = params['filepath']
+    
+    candidates = load_candidates(params)
+    
+    # A URL photo is opened once for all checks: revalidated with the server
+    # (ETag/Last-Modified) and, if unchanged, its hash, fingerprint and OCR
+    # text come from the cache without downloading it again
+    source = None
+    if image_url and candidates:
+        source = open_photo(image_url)
+    
+    # Near-duplicate of a recent photo: answer with that verification
+    photo_hash = None
+    claim = None
+    if duplicate_detector.enabled and candidates:
+        if source is not None:
+            photo_hash = derive_from_photo(source, f'photo_hash:{HASH_KIND}', hash_photo)
+        else:
+            if image_bytes is None:
+                image_bytes = load_image_bytes(image_url, photo_path_or_url)
+            photo_hash = hash_photo(image_bytes)
+    if photo_hash:
+        duplicate_id, claim = duplicate_detector.acquire(
+            params['user_id'],
+            photo_hash,
+            [candidate['medicine_id'] for candidate in candidates],
+            lambda: medicine_manager.get_user_verifications(params['user_id'], limit=DUPLICATE_SCAN)
+        )
+        previous = medicine_manager.get_verification(duplicate_id) if duplicate_id else None
+        if previous:
+            return verification_response(previous, duplicate=True), 200
+    
+    verification_id = None
+    try:
+        # Compare the photo's appearance with fingerprinted back photos
+        visual_scores = None
+        if visual_matcher and visual_matcher.has_fingerprints(candidates):
+            if source is not None:
+                visual_scores = visual_matcher.score_fingerprint(
+                    derive_from_photo(source, visual_matcher.fingerprint_name, visual_matcher.fingerprint),
+                    candidates
+                )
+            else:
+                if image_bytes is None:
+                    image_bytes = load_image_bytes(image_url, photo_path_or_url)
+                if image_bytes is not None:
+                    visual_scores = visual_matcher.score(image_bytes, candidates)
         
-        # Prepare verification record
-        verification_data = {
-            'user_id': user_id,
-            'patient_photo_path': photo_path_or_url,  # Can be URL or path
-            'patient_photo_url': image_url if image_url else None,  # Store URL separately if provided
-            'patient_ocr_text': patient_ocr_text,
-            'verification_results': verification_results,
-            'best_match': best_match,
-            'verified': is_verified,
-            'verified_at': datetime.now().isoformat()
-        }
+        # Extract text using OCR
+        ocr_info = None
+        if OCR_STRATEGY == 'tiered' and candidates:
+            def best_confidence(text):
+                results = medicine_matcher.compare(text, candidates, visual_scores)
+                return max((r['confidence'] for r in results if r['match']), default=0.0)
+            
+            if source is not None:
+                image = source
+            elif image_bytes is not None:
+                image = image_bytes
+            else:
+                image = photo_path_or_url
+            tiered = ocr_reader.extract_text_tiered(
+                image,
+                score=best_confidence,
+                accept_score=OCR_ACCEPT_CONFIDENCE
+            )
+            patient_ocr_text = tiered.text
+            ocr_info = {'pass': tiered.decided_by, 'early_exit': tiered.accepted, 'passes': tiered.passes}
+        elif source is not None:
+            patient_ocr_text = ocr_reader.extract_text_from_source(source)
+        elif image_bytes is not None:
+            patient_ocr_text = ocr_reader.extract_text_from_bytes(image_bytes)
+        elif image_url:
+            patient_ocr_text = ocr_reader.extract_text_from_url(image_url)
+        else:
+            patient_ocr_text = ocr_reader.extract_text(photo_path_or_url)
         
+        result, status_code = complete_verification(
+            params, patient_ocr_text, photo_path_or_url,
+            candidates=candidates, ocr_info=ocr_info, photo_hash=photo_hash, visual_scores=visual_scores
+        )
+        verification_id = result.get('verification_id')
+        return result, status_code
+    finally:
+        # Hand the result to any burst shots of this photo waiting on it
+        duplicate_detector.release(claim, verification_id)
+
+
+def open_photo(image_url):
+    """
+    Open a photo URL for the duplicate, visual and OCR checks
+    Returns:
+        The ImageSource, or None if it could not be fetched (the checks
+        then fall back to reading it on their own, and OCR reports the
+        problem as usual)
+    """
+    try:
+        return ocr_reader.open_image(image_url)
+    except ImageTooLargeError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Could not read photo: {e}")
+        return None
+
+
+def derive_from_photo(source, name, compute):
+    """Value computed from an opened photo (cached by its content), or None if the body cannot be fetched"""
+    try:
+        return source.derived(name, compute)
+    except ImageTooLargeError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Could not read photo: {e}")
+        return None
+
+
+def load_image_bytes(image_url, filepath):
+    """
+    Read a photo that is not in memory yet (image URL or async upload),
+    for the checks that need its bytes besides OCR
+    Returns:
+        The encoded image, or None if it could not be read (OCR then
+        reports the problem as usual)
+    """
+    try:
+        if image_url:
+            return ocr_reader.downloader.fetch(image_url).content
+        with open(filepath, 'rb') as f:
+            return f.read()
+    except ImageTooLargeError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Could not read photo: {e}")
+        return None
+
+
+def hash_photo(image_bytes):
+    """Perceptual hash of a photo, or None if it cannot be decoded"""
+    if image_bytes is None:
+        return None
+    try:
+        return image_hash(image_bytes)
+    except Exception as e:
+        print(f"⚠️  Could not hash photo: {e}")
+        return None
+
+
+def load_candidates(params: dict):
+    """Match artifacts of the medicines to verify against (precomputed at registration)"""
+    if params.get('medicine_id'):
+        # Verify against specific medicine
+        candidate = medicine_manager.get_match_artifact(params['medicine_id'])
+        return [candidate] if candidate else []
+    # Verify against all user's medicines
+    return medicine_manager.get_user_match_artifacts(params['user_id'])
+
+
+def complete_verification(
+    params: dict,
+    patient_ocr_text: str,
+    photo_path_or_url,
+    candidates=None,
+    ocr_info=None,
+    photo_hash=None,
+    visual_scores=None
+):
+    """
+    Second half of the verification pipeline, after OCR: match, persist, notify
+    Args:
+        params: user_id, medicine_id (optional), image_url (optional)
+        patient_ocr_text: OCR text from the patient photo
+        photo_path_or_url: Where the patient photo is kept (may be None)
+        candidates: Match artifacts of the medicines to compare against, if already loaded
+        ocr_info: How the text was extracted (tiered OCR: deciding pass and all passes run)
+        photo_hash: Perceptual hash of the photo, kept for duplicate detection
+        visual_scores: Visual similarity to each candidate, fused with the OCR confidence
+    Returns:
+        (response payload, HTTP status code)
+    """
+    user_id = params['user_id']
+    image_url = params.get('image_url')
+    
+    if candidates is None:
+        candidates = load_candidates(params)
+    
+    if not candidates:
+        return {
+            'verified': False,
+            'message': 'No registered medicines found for this user',
+            'patient_ocr_text': patient_ocr_text
+        }, 200
+    
+    # Compare patient photo OCR with all registered medicines at once
+    match_results = medicine_matcher.compare(patient_ocr_text, candidates, visual_scores)
+    verification_results = []
+    for candidate, match_result in zip(candidates, match_results):
+        verification_results.append({
+            'medicine_id': candidate['medicine_id'],
+            'medicine_name': candidate['registered_name'],
+            'match': match_result['match'],
+            'confidence': match_result['confidence'],
+            'match_details': match_result
+        })
+    
+    # Find best match
+    best_match = max(verification_results, key=lambda x: x['confidence'])
+    is_verified = best_match['match']
+    
+    # Prepare verification record
+    verification_data = {
+        'user_id': user_id,
+        'patient_photo_path': photo_path_or_url,  # Can be URL or path
+        'patient_photo_url': image_url if image_url else None,  # Store URL separately if provided
+        'patient_ocr_text': patient_ocr_text,
+        'verification_results': verification_results,
+        'best_match': best_match,
+        'verified': is_verified,
+        'verified_at': datetime.now().isoformat()
+    }
+    if ocr_info:
+        verification_data['ocr'] = ocr_info
+    if photo_hash:
+        verification_data['photo_hash'] = photo_hash
+    
+    if notification_outbox:
+        # Save verification record with its notification queued for the dispatchers
+        verification_id = medicine_manager.save_verification(
+            verification_data,
+            outbox=notification_outbox,
+            notification={'user_id': user_id, 'verification_data': verification_data, 'is_verified': is_verified}
+        )
+        notification_status = None
+    else:
         # Save verification record
         verification_id = medicine_manager.save_verification(verification_data)
         
@@ -282,17 +665,207 @@ def verify_medicine():
             verification_data=verification_data,
             is_verified=is_verified
         )
+    
+    return verification_response(
+        {'verification_id': verification_id, **verification_data},
+        notification_status=notification_status
+    ), 200
+
+
+def _deliver_notification(payload: dict) -> dict:
+    """Outbox send function: notify a verification's contacts"""
+    status = notification_service.send_verification_notification(
+        user_id=payload['user_id'],
+        verification_data=payload['verification_data'],
+        is_verified=payload['is_verified']
+    )
+    # Contacts exist but nothing reached them although a channel is on
+    # (e.g. SMTP down): try again later. Not when a send timed out (it may
+    # still arrive, a retry could notify twice), nor for match notices added
+    # to digests, which the digest delivers
+    if (status['total_sent'] == 0 and status.get('contacts') and not status.get('digest_queued')
+            and not status.get('outcome_unknown') and notification_service.channels_enabled()):
+        raise NotificationRetry('No contact could be notified')
+    return status
+
+
+if notification_outbox:
+    notification_outbox.set_sender(_deliver_notification)
+
+
+def verification_response(record: dict, notification_status=None, duplicate: bool = False) -> dict:
+    """
+    API payload for a verification record
+    Args:
+        record: Saved verification record
+        notification_status: Result of notifying the contacts (None: queued in the outbox)
+        duplicate: The request repeated this (earlier) verification's photo;
+                   nobody is notified again
+    """
+    is_verified = record['verified']
+    response = {
+        'verified': is_verified,
+        'verification_id': record['verification_id'],
+        'message': f'Medicine verification: {"✅ MATCH" if is_verified else "❌ MISMATCH"}',
+        'best_match': record['best_match'],
+        'all_results': record['verification_results'],
+        'patient_ocr_text': record['patient_ocr_text'],
+        'ocr': record.get('ocr')
+    }
+    if notification_status is not None:
+        response['notifications_sent'] = notification_status
+    elif notification_outbox:
+        response['notifications'] = 'queued'
+        response['notification_status_url'] = f"/api/medicine/verifications/{record['verification_id']}/notifications"
+    if duplicate:
+        response['duplicate'] = True
+        response['notifications'] = 'suppressed'
+        response.pop('notification_status_url', None)
+        response['notifications_sent'] = {
+            'sent_to_doctor': False,
+            'sent_to_family': False,
+            'total_sent': 0,
+            'errors': [],
+            'suppressed': 'duplicate photo'
+        }
+    return response
+
+
+@app.route('/api/medicine/verify/batch', methods=['POST'])
+def verify_medicine_batch():
+    """
+    Verify many patient photos in one request (e.g. a care home dose round)
+    Accepts either:
+    1. JSON: {"items": [{"user_id", "imageUrl", "medicine_id"?}, ...]}
+    2. Form data: an "items" field holding that JSON list, where an item may
+       name an uploaded file field ("file": "<field name>") instead of imageUrl
+    
+    Images are downloaded concurrently and OCR'd as a batch, each user's
+    medicines are loaded once, and results are streamed back as NDJSON
+    (one JSON object per line, tagged with the item's index) as they complete
+    """
+    try:
+        is_json = request.content_type and 'application/json' in request.content_type
+        if is_json:
+            items = (request.get_json(silent=True) or {}).get('items')
+        else:
+            try:
+                items = json.loads(request.form.get('items', ''))
+            except ValueError:
+                return jsonify({'error': 'items must be a JSON list'}), 400
         
-        return jsonify({
-            'verified': is_verified,
-            'verification_id': verification_id,
-            'message': f'Medicine verification: {"✅ MATCH" if is_verified else "❌ MISMATCH"}',
-            'best_match': best_match,
-            'all_results': verification_results,
-            'patient_ocr_text': patient_ocr_text,
-            'notifications_sent': notification_status
-        }), 200
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} items per batch'}), 400
+        
+        # Validate items and read uploads while the request is still open;
+        # an invalid item is reported on its own line instead of failing the batch
+        prepared = [_prepare_batch_item(index, item) for index, item in enumerate(items)]
         
+    except ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return Response(
+        stream_with_context(_run_verification_batch(prepared)),
+        mimetype='application/x-ndjson'
+    )
+
+
+def _prepare_batch_item(index: int, item) -> dict:
+    """Validate one batch item and load its image source"""
+    if not isinstance(item, dict):
+        return {'index': index, 'error': 'Item must be an object'}
+    
+    user_id = str(item.get('user_id', '')).strip()
+    image_url = str(item.get('imageUrl', '')).strip()
+    file_field = str(item.get('file', '')).strip()
+    if not user_id:
+        return {'index': index, 'error': 'User ID is required'}
+    
+    prepared = {
+        'index': index,
+        'user_id': user_id,
+        'medicine_id': str(item.get('medicine_id', '')).strip(),
+        'image_url': image_url or None,
+        'filepath': None
+    }
+    if image_url:
+        prepared['source'] = image_url
+        return prepared
+    
+    file = request.files.get(file_field) if file_field else None
+    if file is None or file.filename == '':
+        return {'index': index, 'error': 'Either file or imageUrl is required'}
+    if not allowed_file(file.filename):
+        return {'index': index, 'error': 'Invalid file type. Allowed: png, jpg, jpeg, gif'}
+    
+    image_bytes = read_upload(file)
+    filename = secure_filename(f"{user_id}_patient_{datetime.now().timestamp()}_{index}.{file.filename.rsplit('.', 1)[1].lower()}")
+    prepared['filepath'] = photo_store.save('patient_photos', filename, image_bytes)
+    prepared['source'] = image_bytes
+    return prepared
+
+
+def _run_verification_batch(prepared: list):
+    """Generator behind /api/medicine/verify/batch, yielding NDJSON lines"""
+    def line(payload):
+        return json.dumps(payload) + '\n'
+    
+    valid = []
+    for item in prepared:
+        if 'error' in item:
+            yield line(item)
+        else:
+            valid.append(item)
+    if not valid:
+        return
+    
+    texts = ocr_reader.extract_texts([item['source'] for item in valid])
+    
+    # Load each user's match artifacts once for the whole batch
+    user_candidates = {}
+    for item in valid:
+        if not item['medicine_id'] and item['user_id'] not in user_candidates:
+            user_candidates[item['user_id']] = medicine_manager.get_user_match_artifacts(item['user_id'])
+    
+    def complete(item, text):
+        if isinstance(text, Exception):
+            return {'index': item['index'], 'user_id': item['user_id'], 'error': str(text)}
+        candidates = None if item['medicine_id'] else user_candidates[item['user_id']]
+        try:
+            result, status_code = complete_verification(
+                item, text, item['image_url'] or item['filepath'], candidates=candidates
+            )
+        except Exception as e:
+            return {'index': item['index'], 'user_id': item['user_id'], 'error': str(e)}
+        return {'index': item['index'], 'user_id': item['user_id'], **result}
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(valid))) as executor:
+        futures = [executor.submit(complete, item, text) for item, text in zip(valid, texts)]
+        for future in concurrent.futures.as_completed(futures):
+            yield line(future.result())
+
+
+def _run_verification_job(params: dict) -> dict:
+    """Job handler for async verification"""
+    result, status_code = run_verification(params)
+    return {**result, 'http_status': status_code}
+
+
+job_queue.register('verify', _run_verification_job)
+
+
+@app.route('/api/medicine/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status (and, once finished, the result) of an async job"""
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -318,23 +891,68 @@ def list_medicines():
 
 @app.route('/api/medicine/verifications', methods=['GET'])
 def list_verifications():
-    """Get all verification records for a user"""
+    """
+    Get verification records for a user, newest first, one page at a time
+    
+    Query parameters:
+    - user_id: ID of the patient (required)
+    - limit: Page size (default 50, max 500)
+    - before: Cursor from a previous response's next_cursor
+    - fields: Comma-separated fields to return (e.g. verified,verified_at,best_match)
+    """
     try:
         user_id = request.args.get('user_id', '').strip()
         if not user_id:
             return jsonify({'error': 'User ID is required'}), 400
         
-        verifications = medicine_manager.get_user_verifications(user_id)
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        if limit < 1:
+            return jsonify({'error': 'limit must be positive'}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+        
+        before = request.args.get('before', '').strip() or None
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+        
+        try:
+            verifications, next_cursor = medicine_manager.get_user_verifications_page(
+                user_id, limit=limit, before=before, fields=fields or None
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         return jsonify({
             'success': True,
             'verifications': verifications,
-            'count': len(verifications)
+            'count': len(verifications),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/medicine/verifications/<verification_id>/notifications', methods=['GET'])
+def get_verification_notifications(verification_id):
+    """Delivery status of a verification's queued notifications"""
+    try:
+        if notification_outbox is None:
+            return jsonify({'error': 'Notification outbox is disabled'}), 404
+        notifications = notification_outbox.get_for_verification(verification_id)
+        if not notifications:
+            return jsonify({'error': 'No notifications found for this verification'}), 404
+        return jsonify({
+            'success': True,
+            'verification_id': verification_id,
+            'notifications': notifications
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/medicine/<medicine_id>', methods=['DELETE'])
 def delete_medicine(medicine_id):
     """Delete a registered medicine"""
@@ -348,13 +966,36 @@ def delete_medicine(medicine_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Runtime counters for monitoring"""
+    return jsonify({
+        'medicine_cache': medicine_manager.cache_stats(),
+        'jobs': job_queue.stats(),
+        'notifications': notification_outbox.stats() if notification_outbox else None,
+        'smtp': notification_service.smtp_stats(),
+        'contacts': contact_directory.stats(),
+        'digest': notification_service.digest.stats() if notification_service.digest else None,
+        'ocr': ocr_reader.stats(),
+        'downloads': ocr_reader.downloader.stats(),
+        'photo_store': photo_store.stats(),
+        'duplicates': duplicate_detector.stats(),
+        'visual': visual_matcher.stats() if visual_matcher else None,
+        'lexicon': medicine_matcher.lexicon.stats() if medicine_matcher.lexicon else None
+    }), 200
+
+
 if __name__ == '__main__':
     print("🚀 Starting Medicine Verification System...")
     print("📋 API Endpoints:")
     print("   POST /api/medicine/register - Register medicine with back photo")
-    print("   POST /api/medicine/verify - Verify patient medicine photo")
+    print("   POST /api/medicine/verify - Verify patient medicine photo (?async=1 for a job)")
+    print("   POST /api/medicine/verify/batch - Verify many photos, NDJSON results")
+    print("   GET  /api/medicine/jobs/<id> - Async verification job status")
     print("   GET  /api/medicine/list?user_id=XXX - List user medicines")
-    print("   GET  /api/medicine/verifications?user_id=XXX - List verifications")
+    print("   GET  /api/medicine/verifications?user_id=XXX&limit=50&before=CURSOR - List verifications")
+    print("   GET  /api/medicine/verifications/<id>/notifications - Notification delivery status")
     print("   DELETE /api/medicine/<id> - Delete medicine")
+    print("   GET  /api/metrics - Cache and runtime counters")
     print("\n🔗 API running on http://localhost:5000")
     app.run(debug=True, host='0.0.0.0', port=5000)
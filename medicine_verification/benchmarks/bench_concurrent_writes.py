@@ -0,0 +1,114 @@
+"""
+Concurrent Write Stress Benchmark
+Runs several worker processes against one data directory, each registering
+medicines and saving verifications through MedicineManager, then checks
+that no record was lost and reports throughput per backend and worker count
+
+Usage:
+    python benchmarks/bench_concurrent_writes.py [--writes 200] [--workers 1 4 16]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medicine_manager import MedicineManager  # noqa: E402
+
+
+def _worker(data_dir: str, backend: str, worker_id: int, writes: int, start_event):
+    """Write `writes` medicines and `writes` verifications for one user"""
+    manager = MedicineManager(data_dir, backend=backend)
+    user_id = f'bench_user_{worker_id}'
+    start_event.wait()
+    for i in range(writes):
+        medicine_id = manager.register_medicine({
+            'medicine_name': f'Medicine {worker_id}-{i}',
+            'user_id': user_id,
+            'registered_at': f'{i:08d}',
+        })
+        manager.save_verification({
+            'user_id': user_id,
+            'best_match': {'medicine_id': medicine_id},
+            'verified': True,
+            'verified_at': f'{i:08d}',
+        })
+    manager.storage.close()
+
+
+def run(backend: str, workers: int, writes: int) -> dict:
+    """
+    Run one benchmark round
+    Returns:
+        Dictionary with expected/actual record counts and throughput
+    """
+    data_dir = tempfile.mkdtemp(prefix=f'bench_{backend}_')
+    try:
+        # Create the files/schema once before the workers race
+        MedicineManager(data_dir, backend=backend).storage.close()
+
+        ctx = multiprocessing.get_context('spawn')
+        start_event = ctx.Event()
+        processes = [
+            ctx.Process(target=_worker, args=(data_dir, backend, w, writes, start_event))
+            for w in range(workers)
+        ]
+        for p in processes:
+            p.start()
+        # Give workers time to import and open storage before timing starts
+        time.sleep(1.0)
+        started = time.perf_counter()
+        start_event.set()
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+        manager = MedicineManager(data_dir, backend=backend)
+        medicines = sum(len(manager.get_user_medicines(f'bench_user_{w}')) for w in range(workers))
+        verifications = sum(len(manager.get_user_verifications(f'bench_user_{w}')) for w in range(workers))
+        manager.storage.close()
+
+        expected = workers * writes
+        return {
+            'backend': backend,
+            'workers': workers,
+            'expected': expected,
+            'medicines': medicines,
+            'verifications': verifications,
+            'lost': (expected - medicines) + (expected - verifications),
+            'writes_per_sec': (2 * expected) / elapsed if elapsed else 0.0,
+        }
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writes', type=int, default=200, help='medicines + verifications per worker')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--backends', nargs='+', default=['sqlite', 'journal', 'json'])
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'workers':>8}{'expected':>10}{'medicines':>11}{'verifs':>8}{'lost':>6}{'writes/s':>11}")
+    failed = False
+    for backend in args.backends:
+        for workers in args.workers:
+            result = run(backend, workers, args.writes)
+            failed = failed or result['lost'] != 0
+            print(f"{result['backend']:<10}{result['workers']:>8}{result['expected']:>10}"
+                  f"{result['medicines']:>11}{result['verifications']:>8}{result['lost']:>6}"
+                  f"{result['writes_per_sec']:>11.0f}")
+
+    if failed:
+        print("❌ Lost writes detected")
+        sys.exit(1)
+    print("✅ Zero lost writes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Drug Lexicon Benchmark
+Measures load time, memory footprint and per-token lookup cost of the drug
+lexicon, and the match rate of MedicineMatcher with and without lexicon
+correction on synthetic OCR-noised labels
+
+Usage:
+    python benchmarks/bench_lexicon.py [--samples 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from drug_lexicon import DEFAULT_LEXICON_FILE, DrugLexicon  # noqa: E402
+from matcher import MedicineMatcher, build_match_artifact  # noqa: E402
+
+# Typical Tesseract misreads
+CONFUSIONS = {'o': '0', 'l': '1', 'i': '1', 's': '5', 'b': '8', 'e': 'c', 'm': 'rn', 'n': 'h', 'c': 'e'}
+FILLER = 'each film coated tablet contains excipients store below 30c protect from light batch exp'.split()
+
+
+def ocr_noise(rng: random.Random, word: str, edits: int) -> str:
+    """Apply a few OCR-style substitutions or drops to a word"""
+    chars = list(word)
+    for _ in range(edits):
+        i = rng.randrange(len(chars))
+        if chars[i] in CONFUSIONS and rng.random() < 0.8:
+            chars[i] = CONFUSIONS[chars[i]]
+        else:
+            del chars[i]
+    return ''.join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=500)
+    parser.add_argument('--lexicon', default=DEFAULT_LEXICON_FILE)
+    args = parser.parse_args()
+
+    # Load time and memory
+    started = time.perf_counter()
+    for _ in range(5):
+        DrugLexicon.load(args.lexicon)
+    load_ms = (time.perf_counter() - started) / 5 * 1000
+
+    tracemalloc.start()
+    lexicon = DrugLexicon.load(args.lexicon)
+    memory_kb = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    print(f"terms: {len(lexicon)}   index keys: {lexicon.stats()['index_keys']}   "
+          f"load: {load_ms:.1f} ms   memory: {memory_kb:.0f} KB")
+
+    rng = random.Random(7)
+    terms = [t for t in lexicon._terms if len(t) >= 7]
+    noisy = [ocr_noise(rng, rng.choice(terms), rng.choice([1, 1, 2])) for _ in range(args.samples)]
+    started = time.perf_counter()
+    for token in noisy:
+        lexicon.correct_token(token)
+    print(f"lookup: {(time.perf_counter() - started) / len(noisy) * 1e6:.1f} us/token")
+
+    # Match rate on noisy labels, 5 registered medicines per user
+    plain = MedicineMatcher()
+    corrected = MedicineMatcher(lexicon=lexicon)
+    hits = {'without lexicon': 0, 'with lexicon': 0}
+    confidence = {'without lexicon': 0.0, 'with lexicon': 0.0}
+    timings = {'without lexicon': 0.0, 'with lexicon': 0.0}
+    for _ in range(args.samples):
+        drugs = rng.sample(terms, 5)
+        strengths = [rng.choice([5, 10, 250, 500]) for _ in drugs]
+        artifacts = [build_match_artifact(f'{d.title()} {s}mg') for d, s in zip(drugs, strengths)]
+        target = rng.randrange(5)
+        words = [rng.choice(FILLER) for _ in range(15)]
+        strength = str(strengths[target]).replace('0', 'O') if rng.random() < 0.5 else strengths[target]
+        label = f'{ocr_noise(rng, drugs[target].upper(), rng.choice([1, 2]))} {strength}mg'
+        words.insert(rng.randrange(len(words)), label)
+        patient_text = ' '.join(words)
+
+        for name, matcher in (('without lexicon', plain), ('with lexicon', corrected)):
+            started = time.perf_counter()
+            results = matcher.compare(patient_text, artifacts)
+            timings[name] += time.perf_counter() - started
+            confidence[name] += results[target]['confidence']
+            best = max(range(5), key=lambda i: results[i]['confidence'])
+            if best == target and results[best]['match']:
+                hits[name] += 1
+
+    for name in hits:
+        print(f"{name:>16}: match rate {hits[name] / args.samples:.1%}   "
+              f"mean confidence {confidence[name] / args.samples:.3f}   "
+              f"{timings[name] / args.samples * 1000:.2f} ms/verification")
+
+
+if __name__ == '__main__':
+    main()
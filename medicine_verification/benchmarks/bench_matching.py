@@ -0,0 +1,96 @@
+"""
+Matching Benchmark
+Compares per-medicine difflib matching (OCRReader.compare_text in a loop)
+with vectorized matching (MedicineMatcher) for users with N registered
+medicines, using synthetic label text
+
+Usage:
+    python benchmarks/bench_matching.py [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from matcher import MedicineMatcher, NUMPY_AVAILABLE, build_match_artifact  # noqa: E402
+from ocr_reader import OCRReader  # noqa: E402
+
+DRUGS = [
+    'Paracetamol', 'Amoxicillin', 'Metformin', 'Atorvastatin', 'Amlodipine', 'Omeprazole',
+    'Losartan', 'Levothyroxine', 'Azithromycin', 'Cetirizine', 'Ibuprofen', 'Pantoprazole',
+    'Clopidogrel', 'Metoprolol', 'Telmisartan', 'Gliclazide', 'Montelukast', 'Rosuvastatin',
+]
+FILLER = (
+    'each film coated tablet contains excipients q s store below 30 c protect from light '
+    'keep out of reach of children dosage as directed by the physician mfg lic no batch exp'
+).split()
+
+
+def label_text(rng: random.Random, name: str, strength: str, words: int = 60) -> str:
+    """Synthetic back-label OCR text mentioning the medicine a few times"""
+    parts = [rng.choice(FILLER) for _ in range(words)]
+    for _ in range(3):
+        parts.insert(rng.randrange(len(parts)), f'{name.upper()} {strength}')
+    return ' '.join(parts)
+
+
+def make_medicines(rng: random.Random, count: int):
+    medicines = []
+    for i in range(count):
+        name = f'{DRUGS[i % len(DRUGS)]}{"" if i < len(DRUGS) else i}'
+        strength = f'{rng.choice([5, 10, 25, 50, 250, 500])}mg'
+        medicines.append((f'{name} {strength}', label_text(rng, name, strength)))
+    return medicines
+
+
+def time_per_call(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("⚠️  NumPy not installed: MedicineMatcher runs its pure-Python fallback")
+
+    rng = random.Random(42)
+    reader = OCRReader.__new__(OCRReader)  # compare_text needs no OCR engine
+    matcher = MedicineMatcher()
+
+    print(f"{'medicines':>9}  {'difflib loop':>14}  {'vectorized':>12}  {'speedup':>8}")
+    for count in (1, 5, 20, 50):
+        medicines = make_medicines(rng, count)
+        name, ocr = medicines[count // 2]
+        patient_text = label_text(rng, name.split()[0], name.split()[1], words=40)
+
+        def difflib_loop():
+            for registered_name, registered_ocr in medicines:
+                reader.compare_text(patient_text, registered_name, registered_ocr)
+
+        def vectorized():
+            matcher.compare(patient_text, [build_match_artifact(n, o) for n, o in medicines])
+
+        artifacts = [build_match_artifact(n, o) for n, o in medicines]
+
+        def vectorized_precomputed():
+            matcher.compare(patient_text, artifacts)
+
+        old = time_per_call(difflib_loop, args.repeat)
+        new = time_per_call(vectorized, args.repeat)
+        pre = time_per_call(vectorized_precomputed, args.repeat)
+        print(f"{count:>9}  {old * 1000:>11.2f} ms  {new * 1000:>9.2f} ms  {old / new:>7.1f}x"
+              f"   (artifacts precomputed: {pre * 1000:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+OCR Startup Benchmark
+Reports import time and memory for the OCR module, the cost of the first
+(lazy) engine load, and the memory of N workers that each load EasyOCR
+privately versus N workers forked from a master that preloaded it
+
+Usage:
+    python benchmarks/bench_ocr_startup.py [--workers 4]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+def memory_kb(pid: int = None) -> dict:
+    """RSS and PSS (proportional set size, counts shared pages fractionally) in kB"""
+    pid = pid or os.getpid()
+    result = {'rss': 0, 'pss': 0}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    result['rss'] = int(line.split()[1])
+                elif line.startswith('Pss:'):
+                    result['pss'] = int(line.split()[1])
+    except FileNotFoundError:
+        # Non-Linux: fall back to peak RSS
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['rss'] = peak // 1024 if sys.platform == 'darwin' else peak
+    return result
+
+
+def _run_probe(code: str):
+    """Run a measurement snippet in a fresh interpreter and parse '<seconds> <rss_kb>'"""
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=BASE_DIR)
+    if out.returncode != 0:
+        error = (out.stderr.strip().splitlines() or ['unknown error'])[-1]
+        raise RuntimeError(error)
+    seconds, rss_delta = out.stdout.strip().splitlines()[-1].split()
+    return float(seconds), int(rss_delta)
+
+
+def measure_import():
+    """Import time and memory of ocr_reader in a fresh interpreter"""
+    code = (
+        "import time, sys; sys.path.insert(0, %r);"
+        "from benchmarks.bench_ocr_startup import memory_kb;"
+        "base = memory_kb()['rss']; t = time.perf_counter();"
+        "import ocr_reader; r = ocr_reader.OCRReader();"
+        "print(time.perf_counter() - t, memory_kb()['rss'] - base)"
+    ) % BASE_DIR
+    return _run_probe(code)
+
+
+def measure_engine_load(engine: str):
+    """Time and memory of the first lazy engine load in a fresh interpreter"""
+    loader = 'get_easyocr_reader()' if engine == 'easyocr' else 'get_pytesseract()'
+    code = (
+        "import time, sys; sys.path.insert(0, %r);"
+        "from benchmarks.bench_ocr_startup import memory_kb;"
+        "import ocr_reader; base = memory_kb()['rss']; t = time.perf_counter();"
+        "ocr_reader.%s;"
+        "print(time.perf_counter() - t, memory_kb()['rss'] - base)"
+    ) % (BASE_DIR, loader)
+    return _run_probe(code)
+
+
+def _touch_reader_and_report(write_fd: int):
+    """Child: use the EasyOCR reader once, then report its memory"""
+    import numpy as np
+    import ocr_reader
+    reader = ocr_reader.get_easyocr_reader()
+    reader.readtext(np.full((64, 256, 3), 255, dtype=np.uint8))
+    mem = memory_kb()
+    os.write(write_fd, f"{mem['rss']} {mem['pss']}\n".encode())
+    time.sleep(2)  # stay alive so siblings' PSS accounting includes us
+    os._exit(0)
+
+
+def measure_workers(workers: int, preload: bool):
+    """Total RSS/PSS of N forked workers, with or without a preloaded model"""
+    import ocr_reader
+    if preload:
+        ocr_reader.get_easyocr_reader()
+
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _touch_reader_and_report(write_fd)
+        pids.append(pid)
+    os.close(write_fd)
+
+    with os.fdopen(read_fd) as pipe:
+        lines = [pipe.readline() for _ in range(workers)]
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    totals = {'rss': 0, 'pss': 0}
+    for line in lines:
+        rss, pss = line.split()
+        totals['rss'] += int(rss)
+        totals['pss'] += int(pss)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    import ocr_reader
+
+    try:
+        seconds, rss = measure_import()
+        print(f"import ocr_reader + OCRReader(): {seconds * 1000:8.1f} ms  +{rss / 1024:7.1f} MB RSS")
+    except RuntimeError as e:
+        print(f"import ocr_reader + OCRReader(): failed ({e})")
+
+    for engine, available in (('tesseract', ocr_reader.TESSERACT_AVAILABLE),
+                              ('easyocr', ocr_reader.EASYOCR_AVAILABLE)):
+        if not available:
+            print(f"first {engine} load: skipped (not installed)")
+            continue
+        try:
+            seconds, rss = measure_engine_load(engine)
+            print(f"first {engine} load:{'':14}{seconds * 1000:8.1f} ms  +{rss / 1024:7.1f} MB RSS")
+        except RuntimeError as e:
+            print(f"first {engine} load: failed ({e})")
+
+    if not ocr_reader.EASYOCR_AVAILABLE or not hasattr(os, 'fork'):
+        print("worker pool comparison: skipped (needs EasyOCR and fork())")
+        return
+
+    # Each comparison runs in its own child so the parent stays model-free
+    for preload in (False, True):
+        pid = os.fork()
+        if pid == 0:
+            totals = measure_workers(args.workers, preload)
+            label = 'preloaded (shared)' if preload else 'private per worker'
+            print(f"{args.workers} workers, {label:<19}: total RSS {totals['rss'] / 1024:8.1f} MB, "
+                  f"total PSS {totals['pss'] / 1024:8.1f} MB")
+            sys.stdout.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Preprocessing Benchmark
+Per-step preprocessing latency for several pipeline configurations, and
+(if the tesseract binary is installed) Tesseract time and output on the
+preprocessed image, so accuracy can be weighed against latency
+
+Uses the given photos, or a synthetic 12 MP label (skewed, uneven lighting)
+
+Usage:
+    python benchmarks/bench_preprocessing.py [photo.jpg ...] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+from preprocessing import CV2_AVAILABLE, DEFAULT_STEPS, ImagePreprocessor  # noqa: E402
+
+CONFIGS = {
+    'no downscale': ('exif', 'grayscale', 'threshold', 'deskew'),
+    'default': DEFAULT_STEPS,
+    'default + crop': DEFAULT_STEPS + ('crop',),
+    'downscale only': ('exif', 'grayscale', 'downscale'),
+}
+
+
+def synthetic_label() -> bytes:
+    """12 MP JPEG of a skewed, unevenly lit medicine label"""
+    image = Image.new('RGB', (4032, 3024), (205, 195, 175))
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=80)
+    except TypeError:  # Pillow < 10.1
+        font = ImageFont.load_default()
+    lines = ['PARACETAMOL TABLETS IP 500 mg', 'Each uncoated tablet contains', 'Paracetamol IP 500 mg',
+             'Store below 30C. Protect from light', 'Batch No. PX2231  Exp. 08/2027']
+    for i in range(16):
+        draw.text((500, 500 + i * 120), lines[i % len(lines)], fill=(25, 25, 35), font=font)
+    # Shadow across one side
+    shadow = Image.linear_gradient('L').rotate(90).resize(image.size)
+    image = Image.composite(image, Image.new('RGB', image.size, (90, 85, 80)), shadow.point(lambda v: 120 + v // 2))
+    image = image.rotate(3.5, fillcolor=(205, 195, 175))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('photos', nargs='*')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    photos = {}
+    for path in args.photos:
+        with open(path, 'rb') as f:
+            photos[os.path.basename(path)] = f.read()
+    if not photos:
+        photos['synthetic 12MP label'] = synthetic_label()
+
+    pytesseract = None
+    if shutil.which('tesseract'):
+        import pytesseract
+    else:
+        print("⚠️  tesseract binary not found: reporting preprocessing time only")
+    if not CV2_AVAILABLE:
+        print("⚠️  OpenCV not installed: every configuration runs the PIL fallback")
+
+    for name, image_bytes in photos.items():
+        print(f"\n{name} ({len(image_bytes) / 1024:.0f} KB)")
+        for label, steps in CONFIGS.items():
+            preprocessor = ImagePreprocessor(steps=steps)
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                image = preprocessor.run(image_bytes)
+            total_ms = (time.perf_counter() - started) / args.repeat * 1000
+            step_ms = preprocessor.stats()['step_ms']
+            steps_text = '  '.join(f"{step} {values['mean']:.0f}" for step, values in step_ms.items())
+            print(f"  {label:<15} {image.size[0]}x{image.size[1]:<5} preprocess {total_ms:6.0f} ms  ({steps_text})")
+
+            if pytesseract:
+                started = time.perf_counter()
+                text = pytesseract.image_to_string(image, config='--oem 3 --psm 6')
+                ocr_ms = (time.perf_counter() - started) * 1000
+                print(f"  {'':<15} tesseract {ocr_ms:6.0f} ms: {' '.join(text.split())[:70]!r}")
+
+
+if __name__ == '__main__':
+    main()
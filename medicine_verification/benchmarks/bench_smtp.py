@@ -0,0 +1,141 @@
+"""
+SMTP Sending Benchmark
+Messages/sec for notification emails against a local SMTP sink, comparing a
+new connection per email (how NotificationService used to send) with pooled
+sessions, all recipients of an event on one session
+
+The sink delays every reply by --latency ms to stand in for the round trip
+to a real mail provider; STARTTLS and login (several more round trips per
+connection, plus the TLS handshake) are not simulated, so the gain against
+a real server is larger
+
+Usage:
+    python benchmarks/bench_smtp.py [--events 100] [--recipients 3] [--threads 2] [--latency 20]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import smtplib
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from notification_service import NotificationService  # noqa: E402
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server that accepts and discards mail"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float):
+        super().__init__(('127.0.0.1', 0), SinkHandler)
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+        self.lock = threading.Lock()
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str):
+        time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply('220 sink ESMTP')
+        for raw in self.rfile:
+            command = raw.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-sink\r\n250 8BITMIME')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 OK: queued')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:  # HELO, MAIL, RCPT, NOOP, RSET
+                self.reply('250 OK')
+
+
+def connect_per_email(config: dict, recipients, subject: str, message: str):
+    """Previous behaviour: connect, send one email and quit, for every recipient"""
+    for recipient in recipients:
+        msg = MIMEMultipart()
+        msg['From'] = config['sender_email']
+        msg['To'] = recipient
+        msg['Subject'] = subject
+        msg.attach(MIMEText(message, 'plain'))
+        server = smtplib.SMTP(config['smtp_server'], config['smtp_port'])
+        server.send_message(msg)
+        server.quit()
+
+
+def run(label: str, send, events: int, recipients: int, threads: int, sink: SMTPSink) -> float:
+    """Send `events` notifications from `threads` dispatcher threads; returns messages/sec"""
+    sink.connections = sink.messages = 0
+    addresses = [f'contact{i}@example.com' for i in range(recipients)]
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):  # per-email log lines
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(lambda i: send(addresses, f'Medicine Verified - event {i}', 'Body ' * 100), range(events)))
+    elapsed = time.perf_counter() - started
+    rate = sink.messages / elapsed
+    print(f"{label:<28} {sink.messages:>5} messages   {sink.connections:>4} connections   {rate:8.1f} msg/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=100)
+    parser.add_argument('--recipients', type=int, default=3, help='doctor + family members per event')
+    parser.add_argument('--threads', type=int, default=2, help='sending threads (outbox dispatchers)')
+    parser.add_argument('--latency', type=float, default=20, help='sink reply delay in ms')
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.latency / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    email_config = {
+        'enabled': True,
+        'smtp_server': '127.0.0.1',
+        'smtp_port': sink.server_address[1],
+        'sender_email': 'alerts@example.com',
+        'sender_password': '',
+        'use_tls': False,
+        'pool_size': args.threads,
+    }
+    config_file = os.path.join(tempfile.mkdtemp(), 'notification_config.json')
+    with open(config_file, 'w') as f:
+        json.dump({'email': email_config}, f)
+    service = NotificationService(config_file)
+
+    print(f"events: {args.events}   recipients/event: {args.recipients}   "
+          f"threads: {args.threads}   reply latency: {args.latency:.0f} ms")
+    before = run('connection per email', lambda to, subject, body: connect_per_email(email_config, to, subject, body),
+                 args.events, args.recipients, args.threads, sink)
+    after = run('pooled sessions', service._send_emails, args.events, args.recipients, args.threads, sink)
+    print(f"speedup: {after / before:.1f}x")
+    print(f"pool: {service.smtp_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Visual Matching Benchmark
+Fingerprint time, stored fingerprint size, comparison latency per candidate,
+and how well visual scores separate re-photographed labels (rotated, scaled,
+relit, on a background) from other registered labels
+
+With synthetic labels it also photographs look-alike packs (same
+manufacturer layout and print, another drug) and reports how many of them
+MedicineMatcher verifies when OCR reads nothing or only its own name; a
+visual score alone must never verify one
+
+Uses synthetic pack labels unless label photos are given; with real photos,
+pass pairs as registered.jpg:patient.jpg
+
+Usage:
+    python benchmarks/bench_visual.py [--labels 20] [--no-keypoints]
+    python benchmarks/bench_visual.py back1.jpg:photo1.jpg back2.jpg:photo2.jpg
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont  # noqa: E402
+
+from matcher import MedicineMatcher, build_match_artifact  # noqa: E402
+from visual_matcher import CV2_AVAILABLE, VisualMatcher  # noqa: E402
+
+WORDS = ['PARACETAMOL', 'AMLODIPINE', 'METFORMIN', 'ATORVASTATIN', 'OMEPRAZOLE', 'LOSARTAN',
+         'CETIRIZINE', 'IBUPROFEN', 'AZITHROMYCIN', 'PANTOPRAZOLE', 'TELMISARTAN', 'GLIMEPIRIDE']
+
+
+def font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def synthetic_label(rng: random.Random, drug: str = None) -> Image.Image:
+    """
+    A pack back with a brand band, logo shapes and text
+    Args:
+        drug: Name printed in the band instead of a random one; the same rng
+              state with another drug draws a look-alike pack
+    """
+    colour = tuple(rng.randrange(40, 230) for _ in range(3))
+    image = Image.new('RGB', (1200, 800), (245, 245, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 1200, rng.randrange(120, 220)), fill=colour)
+    for _ in range(rng.randrange(2, 5)):
+        x, y, r = rng.randrange(100, 1100), rng.randrange(250, 700), rng.randrange(20, 60)
+        draw.ellipse((x - r, y - r, x + r, y + r), outline=colour, width=rng.randrange(4, 10))
+    name = rng.choice(WORDS)
+    draw.text((60, 40), f'{drug or name} {rng.choice([5, 10, 250, 500])} mg', fill='white', font=font(80))
+    for i in range(6):
+        draw.text((60, 300 + i * 70), ' '.join(rng.sample(WORDS, 3)).lower(), fill=(30, 30, 30), font=font(40))
+    return image
+
+
+def photograph(rng: random.Random, label: Image.Image) -> Image.Image:
+    """Simulate a patient's photo of a label: rotated, scaled, relit, on a table"""
+    scale = rng.uniform(0.6, 1.0)
+    image = label.resize((int(label.width * scale), int(label.height * scale)))
+    image = image.rotate(rng.uniform(-12, 12), expand=True, fillcolor=(120, 100, 80))
+    image = ImageEnhance.Brightness(image).enhance(rng.uniform(0.75, 1.2))
+    table = Image.new('RGB', (1600, 1200), (120, 100, 80))
+    table.paste(image, (rng.randrange(0, 1600 - image.width), rng.randrange(0, 1200 - image.height)))
+    return table
+
+
+def encode(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pairs', nargs='*', help='registered.jpg:patient.jpg')
+    parser.add_argument('--labels', type=int, default=20)
+    parser.add_argument('--no-keypoints', action='store_true')
+    args = parser.parse_args()
+
+    matcher = VisualMatcher(use_keypoints=not args.no_keypoints)
+    if not matcher.use_keypoints:
+        print("⚠️  Comparing histograms only" + ("" if CV2_AVAILABLE else " (OpenCV not installed)"))
+
+    if args.pairs:
+        pairs = []
+        for pair in args.pairs:
+            registered, patient = pair.split(':')
+            with open(registered, 'rb') as f, open(patient, 'rb') as g:
+                pairs.append((f.read(), g.read()))
+    else:
+        rng = random.Random(3)
+        labels = [synthetic_label(rng) for _ in range(args.labels)]
+        pairs = [(encode(label), encode(photograph(rng, label))) for label in labels]
+
+    started = time.perf_counter()
+    registered = [matcher.fingerprint(back) for back, _ in pairs]
+    fingerprint_ms = (time.perf_counter() - started) / len(pairs) * 1000
+    size_kb = statistics.mean(len(json.dumps(f)) for f in registered) / 1024
+    print(f"labels: {len(pairs)}   fingerprint: {fingerprint_ms:.1f} ms   stored size: {size_kb:.1f} KB")
+
+    same, other, compare_ms, hits = [], [], [], 0
+    for i, (_, photo) in enumerate(pairs):
+        patient = matcher.fingerprint(photo)
+        scores = []
+        for j, candidate in enumerate(registered):
+            started = time.perf_counter()
+            score = matcher.compare(patient, candidate)
+            compare_ms.append((time.perf_counter() - started) * 1000)
+            scores.append(score)
+            (same if i == j else other).append(score)
+        hits += max(range(len(scores)), key=scores.__getitem__) == i
+
+    print(f"compare: {statistics.mean(compare_ms):.2f} ms/candidate (p95 "
+          f"{sorted(compare_ms)[int(len(compare_ms) * 0.95)]:.2f} ms)")
+    print(f"same label:  mean {statistics.mean(same):.3f}   min {min(same):.3f}")
+    print(f"other label: mean {statistics.mean(other):.3f}   max {max(other):.3f}")
+    print(f"top-1 accuracy: {hits / len(pairs):.1%}")
+
+    if not args.pairs:
+        look_alikes(matcher, args.labels)
+
+
+def look_alikes(matcher: VisualMatcher, count: int):
+    """
+    Photos of look-alike packs (same layout, another drug) against the
+    registered pack, fused with sparse OCR text as MedicineMatcher does
+    """
+    rng = random.Random(5)
+    medicine_matcher = MedicineMatcher()
+    genuine_scores, look_alike_scores = [], []
+    verified = {'look-alike, no text read': 0, 'look-alike, its own name read': 0,
+                'genuine, no text read': 0, 'genuine, part of the name read': 0}
+    for _ in range(count):
+        seed = rng.randrange(1 << 30)
+        drug, other = rng.sample(WORDS, 2)
+        registered = matcher.fingerprint(encode(synthetic_label(random.Random(seed), drug)))
+        artifact = build_match_artifact(drug.title())
+        for kind, label_drug in (('genuine', drug), ('look-alike', other)):
+            photo = encode(photograph(rng, synthetic_label(random.Random(seed), label_drug)))
+            score = matcher.compare(matcher.fingerprint(photo), registered)
+            (genuine_scores if kind == 'genuine' else look_alike_scores).append(score)
+            texts = {'no text read': '', 'its own name read': label_drug, 'part of the name read': label_drug[:5]}
+            for reading, text in texts.items():
+                if f'{kind}, {reading}' in verified:
+                    result = medicine_matcher.compare(text, [artifact], [score])[0]
+                    verified[f'{kind}, {reading}'] += result['match']
+
+    print(f"look-alike packs: visual score mean {statistics.mean(look_alike_scores):.3f}   "
+          f"max {max(look_alike_scores):.3f} (genuine: mean {statistics.mean(genuine_scores):.3f})")
+    for case, hits in verified.items():
+        print(f"  verified, {case}: {hits}/{count}")
+
+
+if __name__ == '__main__':
+    main()
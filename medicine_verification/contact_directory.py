@@ -0,0 +1,246 @@
+"""
+Contact Directory Module
+Looks up each patient's doctor and family contacts for notifications
+- Default source: config/user_contacts.json, parsed once into an in-memory
+  index keyed by user ID and reloaded when the file changes (its mtime, size
+  and inode are checked at most every few seconds), so a lookup is a dict
+  access instead of a full-file parse
+- A file that fails to parse on reload is ignored and the last good index kept
+- Optional SQLite source: a user_contacts table (primary key user_id), for
+  directories too large or too often edited for one JSON file; shared by
+  all worker processes with no reload needed
+- Bulk lookup of many patients at once (one query per 500 users)
+- Without any source (no file, no database), every patient gets the
+  DEFAULT_DOCTOR_* / DEFAULT_FAMILY_* contacts from the environment
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_contacts (
+        user_id TEXT PRIMARY KEY,
+        contacts TEXT NOT NULL,
+        updated_at TEXT
+    );
+"""
+
+BULK_CHUNK = 500  # stays below SQLite's bound-parameter limit
+
+
+def default_contacts() -> Dict:
+    """Contacts from the DEFAULT_* environment variables"""
+    return {
+        'doctor': {
+            'email': os.getenv('DEFAULT_DOCTOR_EMAIL', ''),
+            'phone': os.getenv('DEFAULT_DOCTOR_PHONE', ''),
+            'name': 'Doctor'
+        },
+        'family': [
+            {
+                'email': os.getenv('DEFAULT_FAMILY_EMAIL', ''),
+                'phone': os.getenv('DEFAULT_FAMILY_PHONE', ''),
+                'name': 'Family Member'
+            }
+        ]
+    }
+
+
+class ContactDirectory:
+    """Indexed user ID -> contacts lookup backed by a JSON file or SQLite"""
+
+    def __init__(
+        self,
+        contacts_file: str = 'config/user_contacts.json',
+        db_path: Optional[str] = None,
+        check_interval: float = 2.0
+    ):
+        """
+        Initialize the directory
+        Args:
+            contacts_file: JSON file mapping user IDs to contacts
+            db_path: SQLite file with a user_contacts table; used instead of
+                     the JSON file when given
+            check_interval: Seconds between checks of the JSON file for changes
+        """
+        self.contacts_file = contacts_file
+        self.db_path = db_path
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._index: Optional[Dict[str, Dict]] = None  # None: no file, use defaults
+        self._signature = None
+        self._next_check = 0.0
+        self._warned_defaults = False
+        self._stats = {'lookups': 0, 'misses': 0, 'reloads': 0, 'reload_errors': 0}
+
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connect().executescript(SCHEMA)
+
+    @property
+    def backend(self) -> str:
+        return 'sqlite' if self.db_path else 'json'
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection (reopened after fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _file_index(self) -> Optional[Dict[str, Dict]]:
+        """The JSON file's index, reloaded if the file changed since the last check"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return self._index
+        with self._lock:
+            if now < self._next_check:
+                return self._index
+            self._next_check = now + self.check_interval
+            try:
+                info = os.stat(self.contacts_file)
+                signature = (info.st_mtime_ns, info.st_size, info.st_ino)
+            except OSError:
+                signature = None
+            if signature == self._signature:
+                return self._index
+
+            if signature is None:
+                self._index = None
+            else:
+                try:
+                    with open(self.contacts_file, 'r') as f:
+                        index = json.load(f)
+                    if not isinstance(index, dict):
+                        raise ValueError('expected an object keyed by user ID')
+                    self._index = index
+                    self._stats['reloads'] += 1
+                except (OSError, ValueError) as e:
+                    self._stats['reload_errors'] += 1
+                    print(f"⚠️  Could not load {self.contacts_file}: {e}"
+                          + (" (keeping the previous contacts)" if self._index is not None else ""))
+            self._signature = signature
+            return self._index
+
+    def get(self, user_id: str) -> Dict:
+        """
+        Get a user's contacts
+        Args:
+            user_id: Patient user ID
+        Returns:
+            Dictionary with 'doctor' and 'family' keys (empty if the user has none)
+        """
+        return self.get_many([user_id])[user_id]
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Get contacts for many users at once
+        Args:
+            user_ids: Patient user IDs
+        Returns:
+            Dictionary mapping every requested user ID to its contacts
+            (empty for users without any)
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if self.db_path:
+            found = self._query(user_ids)
+        else:
+            index = self._file_index()
+            if index is None:
+                self._warn_defaults()
+                found = {user_id: default_contacts() for user_id in user_ids}
+            else:
+                found = {user_id: index[user_id] for user_id in user_ids if user_id in index}
+
+        with self._lock:
+            self._stats['lookups'] += len(user_ids)
+            self._stats['misses'] += len(user_ids) - len(found)
+        return {user_id: found.get(user_id, {}) for user_id in user_ids}
+
+    def _query(self, user_ids: List[str]) -> Dict[str, Dict]:
+        found = {}
+        conn = self._connect()
+        for start in range(0, len(user_ids), BULK_CHUNK):
+            chunk = user_ids[start:start + BULK_CHUNK]
+            rows = conn.execute(
+                f"SELECT user_id, contacts FROM user_contacts WHERE user_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for user_id, contacts in rows:
+                found[user_id] = json.loads(contacts)
+        return found
+
+    def _warn_defaults(self):
+        if not self._warned_defaults:
+            self._warned_defaults = True
+            print(f"⚠️  {self.contacts_file} not found, notifying the DEFAULT_* contacts from the environment")
+
+    def put(self, user_id: str, contacts: Dict):
+        """Add or replace a user's contacts (SQLite directory only)"""
+        self.put_many({user_id: contacts})
+
+    def put_many(self, contacts_by_user: Dict[str, Dict]) -> int:
+        """
+        Add or replace many users' contacts in one transaction (SQLite directory only)
+        Returns:
+            Number of users written
+        """
+        if not self.db_path:
+            raise ValueError('Contacts can only be written to a SQLite directory; edit the JSON file instead')
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO user_contacts (user_id, contacts, updated_at) VALUES (?, ?, ?)',
+                [(user_id, json.dumps(contacts), now) for user_id, contacts in contacts_by_user.items()]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(contacts_by_user)
+
+    def import_file(self, contacts_file: Optional[str] = None) -> int:
+        """
+        Copy a JSON contacts file into the SQLite directory
+        Returns:
+            Number of users imported
+        """
+        with open(contacts_file or self.contacts_file, 'r') as f:
+            return self.put_many(json.load(f))
+
+    def stats(self) -> Dict:
+        """Lookup counters, for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+        if self.db_path:
+            users = self._connect().execute('SELECT COUNT(*) FROM user_contacts').fetchone()[0]
+        else:
+            users = len(self._index) if self._index is not None else None
+        return {'backend': self.backend, 'users': users, **stats}
+
+
+if __name__ == '__main__':
+    # Usage: python contact_directory.py import [contacts_file] [db_path]
+    if len(sys.argv) < 2 or sys.argv[1] != 'import':
+        print("Usage: python contact_directory.py import [contacts_file] [db_path]")
+        sys.exit(1)
+
+    source = sys.argv[2] if len(sys.argv) > 2 else 'config/user_contacts.json'
+    target = sys.argv[3] if len(sys.argv) > 3 else os.path.join('data', 'medicines.db')
+    count = ContactDirectory(db_path=target).import_file(source)
+    print(f"✅ Imported contacts for {count} users into {target}")
@@ -0,0 +1,267 @@
+"""
+Drug Lexicon Module
+Offline dictionary of drug names used to correct OCR tokens before matching
+- Loaded from a bundled word list (resources/drug_names.txt)
+- SymSpell-style deletion index: every term is indexed under the strings
+  left after deleting up to N characters from its prefix, so looking up a
+  misread token costs a handful of dict probes instead of a scan of the
+  whole lexicon
+- Common OCR digit/letter confusions are undone first (0->o, 1->l, 5->s
+  inside words; O->0 inside strengths, e.g. "5OOmg" -> "500mg")
+- Only tokens that show OCR damage (digits inside a word) are corrected: a
+  well-formed word missing from the lexicon may be another drug one or two
+  letters away (prednisone / prednisolone), never a misread of it
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+DEFAULT_LEXICON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'drug_names.txt')
+
+# Shorter tokens are too ambiguous to correct ("tab", "mg", batch codes)
+MIN_TOKEN_LENGTH = 5
+
+# Lookups remembered per lexicon (labels repeat the same words a lot)
+LOOKUP_MEMO_SIZE = 4096
+
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9]+')
+STRENGTH_TOKEN_PATTERN = re.compile(r'^(?=.*\d)[0-9OoIl]+(mcg|mg|ml|g|iu)$', re.IGNORECASE)
+
+# Characters Tesseract commonly reads in place of letters inside a word
+LETTER_CONFUSIONS = str.maketrans({'0': 'o', '1': 'l', '5': 's', '8': 'b', '6': 'g'})
+DIGIT_CONFUSIONS = str.maketrans({'O': '0', 'o': '0', 'I': '1', 'l': '1'})
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions)
+    Returns:
+        The distance, or max_distance + 1 as soon as it is known to be larger
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    too_far = max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            value = previous[j - 1] if ca == cb else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if previous2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min >= too_far:
+            return too_far
+        previous2, previous = previous, current
+    return min(previous[-1], too_far)
+
+
+class DrugLexicon:
+    """Drug-name dictionary with a deletion index for fast fuzzy lookup"""
+
+    def __init__(self, max_edit_distance: int = 2, prefix_length: int = 7):
+        """
+        Initialize an empty lexicon
+        Args:
+            max_edit_distance: Largest correction made (tokens under 9 letters
+                               are limited to 1 edit)
+            prefix_length: Only this many leading characters are indexed,
+                           which bounds the index size for long names
+        """
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+
+        self._terms: List[str] = []
+        self._counts: List[int] = []
+        self._term_ids: Dict[str, int] = {}
+        # delete string -> term id, or tuple of term ids when shared
+        self._deletes: Dict[str, Union[int, Tuple[int, ...]]] = {}
+        self._memo: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._stats = {'tokens': 0, 'corrected': 0}
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_LEXICON_FILE, **kwargs) -> 'DrugLexicon':
+        """
+        Build a lexicon from a word list
+        Args:
+            path: File with one name per line, optionally followed by a tab and
+                  a count; blank lines and lines starting with # are skipped
+        Returns:
+            DrugLexicon instance
+        """
+        lexicon = cls(**kwargs)
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                name, _, count = line.partition('\t')
+                lexicon.add(name, int(count) if count.strip().isdigit() else 1)
+        return lexicon
+
+    def add(self, name: str, count: int = 1):
+        """Add a name (each word of a multi-word name is indexed separately)"""
+        for word in name.lower().split():
+            if len(word) < MIN_TOKEN_LENGTH or not word.isalpha():
+                continue
+            if word in self._term_ids:
+                self._counts[self._term_ids[word]] = max(self._counts[self._term_ids[word]], count)
+                continue
+            term_id = len(self._terms)
+            self._memo.clear()
+            self._terms.append(word)
+            self._counts.append(count)
+            self._term_ids[word] = term_id
+            for key in self._delete_variants(word[:self.prefix_length], self.max_edit_distance):
+                existing = self._deletes.get(key)
+                if existing is None:
+                    self._deletes[key] = term_id
+                elif isinstance(existing, int):
+                    self._deletes[key] = (existing, term_id)
+                else:
+                    self._deletes[key] = existing + (term_id,)
+
+    @staticmethod
+    def _delete_variants(word: str, max_deletes: int) -> set:
+        """word and every string left after deleting up to max_deletes characters"""
+        variants = {word}
+        frontier = {word}
+        for _ in range(max_deletes):
+            frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, word: str) -> bool:
+        return word.lower() in self._term_ids
+
+    def lookup(self, word: str) -> Optional[str]:
+        """
+        Find the closest lexicon term to a word
+        Args:
+            word: Lowercase alphabetic token
+        Returns:
+            The word itself if known, the closest term within the allowed edit
+            distance (ties go to the higher count), or None
+        """
+        if word in self._term_ids:
+            return word
+        if word in self._memo:
+            return self._memo[word]
+        max_distance = min(self.max_edit_distance, 1 if len(word) < 9 else 2)
+        prefix = word[:self.prefix_length]
+
+        best = None
+        checked = set()
+        for key in self._delete_variants(prefix, max_distance):
+            hits = self._deletes.get(key)
+            if hits is None:
+                continue
+            for term_id in (hits,) if isinstance(hits, int) else hits:
+                if term_id in checked:
+                    continue
+                checked.add(term_id)
+                distance = edit_distance(word, self._terms[term_id], max_distance)
+                if distance > max_distance:
+                    continue
+                rank = (distance, -self._counts[term_id])
+                if best is None or rank < best[0]:
+                    best = (rank, self._terms[term_id])
+
+        result = best[1] if best else None
+        if len(self._memo) >= LOOKUP_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[word] = result
+        return result
+
+    def correct_token(self, token: str) -> str:
+        """
+        Correct one OCR token; returns it unchanged when there is nothing to fix
+        Words made of letters only are never changed (see the module docstring)
+        """
+        strength = STRENGTH_TOKEN_PATTERN.match(token)
+        if strength:
+            unit = strength.group(1)
+            return token[:-len(unit)].translate(DIGIT_CONFUSIONS) + unit
+        if len(token) < MIN_TOKEN_LENGTH:
+            return token
+        word = token.lower()
+        if word.isalpha():
+            return token
+        # Mostly letters with a few misread digits: undo the usual confusions
+        if sum(c.isdigit() for c in word) * 3 > len(word):
+            return token
+        word = word.translate(LETTER_CONFUSIONS)
+        if not word.isalpha():
+            return token
+        corrected = self.lookup(word)
+        if corrected is None:
+            return token
+        return token if corrected == token.lower() else corrected
+
+    def correct_text(self, text: str, keep: Optional[Set[str]] = None) -> str:
+        """
+        Correct every token of an OCR text against the lexicon
+        Args:
+            text: OCR text
+            keep: Lowercase words never corrected (e.g. the registered names
+                  being matched, which may be brands missing from the lexicon)
+        Returns:
+            Text with misread drug names (and strengths) replaced by their
+            canonical lowercase form; everything else is left as is
+        """
+        corrected = 0
+        tokens = 0
+
+        def replace(match):
+            nonlocal corrected, tokens
+            tokens += 1
+            token = match.group(0)
+            if keep and token.lower() in keep:
+                return token
+            fixed = self.correct_token(token)
+            if fixed != token:
+                corrected += 1
+            return fixed
+
+        result = TOKEN_PATTERN.sub(replace, text or '')
+        with self._lock:
+            self._stats['tokens'] += tokens
+            self._stats['corrected'] += corrected
+        return result
+
+    def stats(self) -> Dict:
+        """Index size and correction counters, for monitoring"""
+        with self._lock:
+            return {
+                'terms': len(self._terms),
+                'index_keys': len(self._deletes),
+                **self._stats,
+            }
+
+
+def load_default_lexicon(path: Optional[str] = None) -> Optional[DrugLexicon]:
+    """
+    Load the bundled (or a custom) lexicon, or None if the file is missing
+    Args:
+        path: Word list path; defaults to resources/drug_names.txt
+    """
+    path = path or DEFAULT_LEXICON_FILE
+    try:
+        return DrugLexicon.load(path)
+    except OSError as e:
+        print(f"⚠️  Drug lexicon not loaded ({path}): {e}")
+        return None
+
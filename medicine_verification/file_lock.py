@@ -0,0 +1,137 @@
+"""
+File Lock Module
+Cross-process locking and atomic file replacement for the file-based
+storage backends, so several server workers can share one data directory
+"""
+
+import json
+import os
+import tempfile
+import threading
+import weakref
+from typing import Any
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows
+    import msvcrt
+    FCNTL_AVAILABLE = False
+
+
+# Live locks, reset in forked children so a lock held by another parent
+# thread at fork time cannot deadlock the child
+_locks = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for lock in list(_locks):
+        lock._thread_lock = threading.RLock()
+        lock._depth = 0
+        lock._fd = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class FileLock:
+    """
+    Advisory lock on a companion lock file
+    - exclusive (default) or shared mode; shared falls back to exclusive on Windows
+    - re-entrant within a process: only the outermost acquire touches the file
+    - thread-safe: a process-local lock serializes threads before the file lock
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize a lock
+        Args:
+            path: Lock file path (created if missing)
+        """
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        _locks.add(self)
+
+    def acquire(self, shared: bool = False):
+        """Block until the lock is held"""
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(self._fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+            except Exception:
+                os.close(self._fd)
+                self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        """Release one level of the lock"""
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    def shared(self) -> '_LockContext':
+        """Context manager holding the lock in shared mode"""
+        return _LockContext(self, shared=True)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class _LockContext:
+    """Context manager for FileLock.shared()"""
+
+    def __init__(self, lock: FileLock, shared: bool):
+        self.lock = lock
+        self.shared = shared
+
+    def __enter__(self):
+        self.lock.acquire(shared=self.shared)
+        return self.lock
+
+    def __exit__(self, exc_type, exc, tb):
+        self.lock.release()
+
+
+def atomic_write_json(path: str, data: Any, indent: int = 2):
+    """
+    Write JSON via a temp file + fsync + rename
+    Readers see either the old or the new file, never a partial write
+    Args:
+        path: Destination file
+        data: JSON-serializable data
+        indent: JSON indentation
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
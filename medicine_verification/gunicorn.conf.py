@@ -0,0 +1,31 @@
+"""
+Gunicorn configuration
+Usage: gunicorn -c gunicorn.conf.py app:app
+
+Set OCR_PRELOAD=easyocr to load the EasyOCR model once in the master
+process: workers forked afterwards share the weights copy-on-write
+instead of each holding a private copy
+"""
+
+import os
+import sys
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+
+# The in-memory job queue is per process: with several workers a job status
+# poll can land on a worker that never saw the job. Share jobs through SQLite
+if workers > 1:
+    os.environ.setdefault('JOB_QUEUE_DB', os.path.join('data', 'jobs.db'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# Import app.py (and run OCR_PRELOAD) in the master before forking
+preload_app = bool(os.getenv('OCR_PRELOAD'))
+
+
+def post_fork(server, worker):
+    """Keep each worker's torch inference single-threaded after fork"""
+    # torch thread pools created before fork are not usable in the child,
+    # and N workers x all-core pools would oversubscribe the CPUs anyway
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(int(os.getenv('OCR_TORCH_THREADS', '1')))
@@ -0,0 +1,220 @@
+"""
+Image Downloader Module
+Downloads images (Firebase Storage or any HTTP/HTTPS URL) for OCR
+- One pooled, keep-alive requests.Session per process, shared by all threads,
+  so repeated downloads from the same host skip the TCP/TLS handshake
+- Separate connect and read timeouts
+- Bounded retries with jittered exponential backoff on 5xx, timeouts and
+  dropped connections
+- Maximum download size enforced while streaming
+- Latency and byte counters for monitoring
+"""
+
+import collections
+import io
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    """Image is larger than the configured limit"""
+
+
+def read_limited(chunks: Iterable[bytes], max_bytes: int) -> bytes:
+    """
+    Collect a stream into memory without letting it grow past a limit
+    Args:
+        chunks: Byte chunks, e.g. response.iter_content() or iter_file_chunks()
+        max_bytes: Maximum total size
+    Returns:
+        The stream contents
+    Raises:
+        ImageTooLargeError: As soon as the stream exceeds max_bytes
+    """
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        if buffer.tell() + len(chunk) > max_bytes:
+            raise ImageTooLargeError(f'Image exceeds the {max_bytes} byte limit')
+        buffer.write(chunk)
+    return buffer.getvalue()
+
+
+def iter_file_chunks(stream, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Iterate over a file-like object (e.g. Werkzeug FileStorage.stream) in chunks"""
+    return iter(lambda: stream.read(chunk_size), b'')
+
+
+class Download(NamedTuple):
+    """Result of ImageDownloader.fetch"""
+    status_code: int
+    content: Optional[bytes]  # None for 304 Not Modified
+    headers: Mapping[str, str]  # case-insensitive
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+# Errors worth another attempt: the server or network may recover
+RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class _ServerError(Exception):
+    """5xx response, retried before surfacing the original HTTPError"""
+
+    def __init__(self, http_error: requests.HTTPError):
+        super().__init__(str(http_error))
+        self.http_error = http_error
+
+
+class ImageDownloader:
+    """Pooled HTTP client for image downloads"""
+
+    def __init__(
+        self,
+        max_bytes: int = 16 * 1024 * 1024,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        pool_size: int = 10
+    ):
+        """
+        Initialize the downloader
+        Args:
+            max_bytes: Largest body accepted; larger downloads are aborted mid-stream
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait between bytes from the server
+            max_retries: Extra attempts after a 5xx, timeout or dropped connection
+            backoff_base: First retry waits up to this many seconds (doubling after)
+            backoff_max: Upper bound on any single backoff
+            pool_size: Keep-alive connections kept per host
+        """
+        self.max_bytes = max_bytes
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=1000)
+        self._stats = {
+            'downloads': 0, 'not_modified': 0, 'failures': 0,
+            'retries': 0, 'too_large': 0, 'bytes': 0,
+        }
+
+    def _get_session(self) -> requests.Session:
+        """Create the session on first use (and again after fork: sockets must not be shared)"""
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> Download:
+        """
+        Download a URL into memory, retrying transient failures
+        Args:
+            url: HTTP/HTTPS URL
+            headers: Extra request headers (e.g. If-None-Match)
+        Returns:
+            Download with the body, or with content None on 304 Not Modified
+        Raises:
+            ImageTooLargeError: Body exceeds max_bytes
+            requests.RequestException: Non-retryable error, or retries exhausted
+        """
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                result = self._fetch_once(url, headers)
+                break
+            except ImageTooLargeError:
+                self._count('too_large')
+                raise
+            except RETRYABLE_ERRORS + (_ServerError,) as e:
+                if attempt >= self.max_retries:
+                    self._count('failures')
+                    if isinstance(e, _ServerError):
+                        raise e.http_error
+                    raise
+            except requests.RequestException:
+                self._count('failures')
+                raise
+            attempt += 1
+            self._count('retries')
+            # Full jitter: spreads out retries from concurrent requests
+            time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))))
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._latencies.append(elapsed)
+            if result.not_modified:
+                self._stats['not_modified'] += 1
+            else:
+                self._stats['downloads'] += 1
+                self._stats['bytes'] += len(result.content)
+        return result
+
+    def _fetch_once(self, url: str, headers: Optional[Dict[str, str]]) -> Download:
+        response = self._get_session().get(
+            url,
+            headers=headers,
+            stream=True,
+            timeout=(self.connect_timeout, self.read_timeout)
+        )
+        with response:
+            if response.status_code == 304:
+                return Download(304, None, response.headers)
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                if response.status_code >= 500:
+                    raise _ServerError(e)
+                raise
+            content_length = int(response.headers.get('Content-Length') or 0)
+            if content_length > self.max_bytes:
+                raise ImageTooLargeError(f'Image is {content_length} bytes, limit is {self.max_bytes}')
+            content = read_limited(response.iter_content(STREAM_CHUNK_SIZE), self.max_bytes)
+            return Download(response.status_code, content, response.headers)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> Dict:
+        """Download counters and latency percentiles (last 1000 requests), for monitoring"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._stats)
+        if latencies:
+            stats['latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'p95': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+            }
+        else:
+            stats['latency_ms'] = None
+        return stats
+
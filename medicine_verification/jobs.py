@@ -0,0 +1,351 @@
+"""
+Job Queue Module
+Runs long pipelines (e.g. medicine verification) in background worker
+threads so the HTTP request can return a job ID immediately
+- In-memory queue by default (no external broker)
+- Optional SQLite-backed queue: jobs survive restarts, and every server
+  worker process can claim queued jobs and report any job's status; a job
+  abandoned by a dead process is re-queued, at most max_attempts times
+- Worker threads start on a process's first use of the queue, so none run
+  in a gunicorn master that loaded the app before forking
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+class JobQueue:
+    """Local worker pool with pluggable job storage"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        db_path: Optional[str] = None,
+        lease_seconds: float = 300.0,
+        retention_seconds: float = 24 * 3600,
+        poll_interval: float = 0.5,
+        max_attempts: int = 3
+    ):
+        """
+        Initialize the job queue (workers start on first use in each process)
+        Args:
+            workers: Number of worker threads in this process
+            db_path: SQLite file for a persistent, multi-process queue (None = in-memory)
+            lease_seconds: A running job not finished within this time is
+                           considered abandoned (e.g. its process died) and re-queued
+            retention_seconds: How long finished jobs are kept for status queries
+            poll_interval: How often idle SQLite workers look for new jobs (seconds)
+            max_attempts: Runs of a job before one abandoned again is marked
+                          failed instead of re-queued (e.g. a photo that
+                          crashes its worker every time)
+        """
+        self.handlers: Dict[str, Callable[[Dict], Dict]] = {}
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.store = SQLiteJobStore(db_path) if db_path else MemoryJobStore()
+        self.workers = max(1, workers)
+
+        self._start_lock = threading.Lock()
+        self._pid = None  # process the workers run in
+        self._wakeup = threading.Event()
+
+    def _ensure_workers(self):
+        """Start this process's worker threads unless they are running"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            self._purge_lock = threading.Lock()
+            self._last_purge = time.monotonic()
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def register(self, kind: str, handler: Callable[[Dict], Dict]):
+        """
+        Register the function that runs jobs of a kind
+        Args:
+            kind: Job kind name
+            handler: Called with the job params; returns a JSON-serializable result
+        """
+        self.handlers[kind] = handler
+
+    def submit(self, kind: str, params: Dict) -> str:
+        """
+        Queue a job
+        Args:
+            kind: Registered job kind
+            params: JSON-serializable parameters for the handler
+        Returns:
+            Job ID
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job = {
+            'job_id': str(uuid.uuid4()),
+            'kind': kind,
+            'status': QUEUED,
+            'params': params,
+            'result': None,
+            'error': None,
+            'attempts': 0,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+        }
+        self._ensure_workers()
+        self.store.add(job)
+        self._wakeup.set()
+        return job['job_id']
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """
+        Get a job's public status
+        Returns:
+            Job dictionary (without params) or None if unknown/expired
+        """
+        self._ensure_workers()
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k not in ('params', 'finished_ts')}
+
+    def stats(self) -> Dict:
+        """Job counts by status, for monitoring"""
+        self._ensure_workers()
+        return self.store.counts()
+
+    def _worker_loop(self):
+        """Claim and run jobs until the process exits"""
+        while True:
+            job = self.store.claim(self.lease_seconds, self.max_attempts)
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                self._maybe_purge()
+                continue
+
+            handler = self.handlers.get(job['kind'])
+            try:
+                if handler is None:
+                    raise RuntimeError(f"No handler registered for job kind '{job['kind']}'")
+                result = handler(job['params'])
+                self.store.finish(job['job_id'], SUCCEEDED, result=result)
+            except Exception as e:
+                print(f"❌ Job {job['job_id']} ({job['kind']}) failed: {e}")
+                self.store.finish(job['job_id'], FAILED, error=str(e))
+
+    def _maybe_purge(self):
+        """Drop expired finished jobs, at most once a minute per process"""
+        with self._purge_lock:
+            if time.monotonic() - self._last_purge < 60:
+                return
+            self._last_purge = time.monotonic()
+        try:
+            self.store.purge(self.retention_seconds)
+        except Exception as e:
+            print(f"⚠️  Job purge failed: {e}")
+
+
+class MemoryJobStore:
+    """Process-local job storage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+        self._queue: 'queue.Queue[str]' = queue.Queue()
+
+    def add(self, job: Dict):
+        with self._lock:
+            self._jobs[job['job_id']] = job
+        self._queue.put(job['job_id'])
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, lease_seconds: float, max_attempts: int) -> Optional[Dict]:
+        # Jobs die with the process here, so none is ever re-queued
+        try:
+            job_id = self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != QUEUED:
+                return None
+            job['status'] = RUNNING
+            job['started_at'] = datetime.now().isoformat()
+            job['attempts'] += 1
+            return dict(job)
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(status=status, result=result, error=error,
+                           finished_at=datetime.now().isoformat(), finished_ts=time.time())
+
+    def purge(self, retention_seconds: float):
+        cutoff = time.time() - retention_seconds
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items() if job.get('finished_ts', cutoff + 1) < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def counts(self) -> Dict:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
+
+
+class SQLiteJobStore:
+    """Job storage shared by every process using the same database file"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            params TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            lease_until REAL,
+            finished_ts REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Initialize SQLite job storage
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(self.SCHEMA)
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+        if 'attempts' not in columns:
+            # Queue created before attempts were counted
+            conn.execute('ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection (reopened after fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict:
+        job = {key: row[key] for key in (
+            'job_id', 'kind', 'status', 'error', 'attempts', 'created_at', 'started_at', 'finished_at'
+        )}
+        job['params'] = json.loads(row['params']) if row['params'] else {}
+        job['result'] = json.loads(row['result']) if row['result'] else None
+        return job
+
+    def add(self, job: Dict):
+        self._connect().execute(
+            'INSERT INTO jobs (job_id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job['job_id'], job['kind'], job['status'], json.dumps(job['params']), job['created_at'])
+        )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self._connect().execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, lease_seconds: float, max_attempts: int) -> Optional[Dict]:
+        """
+        Atomically move the oldest queued (or abandoned) job to running
+        An abandoned job that has already run max_attempts times is marked
+        failed instead
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ?, finished_ts = ?, lease_until = NULL '
+                'WHERE status = ? AND lease_until < ? AND attempts >= ?',
+                (FAILED, f'Abandoned after {max_attempts} attempt(s): the worker running it stopped',
+                 datetime.now().isoformat(), now, RUNNING, now, max_attempts)
+            )
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) '
+                'ORDER BY created_at LIMIT 1',
+                (QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            started_at = datetime.now().isoformat()
+            conn.execute(
+                'UPDATE jobs SET status = ?, started_at = ?, lease_until = ?, attempts = attempts + 1 '
+                'WHERE job_id = ?',
+                (RUNNING, started_at, now + lease_seconds, row['job_id'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        job = self._row_to_job(row)
+        job.update(status=RUNNING, started_at=started_at, attempts=row['attempts'] + 1)
+        return job
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        self._connect().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, finished_ts = ? '
+            'WHERE job_id = ?',
+            (status, json.dumps(result) if result is not None else None, error,
+             datetime.now().isoformat(), time.time(), job_id)
+        )
+
+    def purge(self, retention_seconds: float):
+        self._connect().execute(
+            'DELETE FROM jobs WHERE finished_ts IS NOT NULL AND finished_ts < ?',
+            (time.time() - retention_seconds,)
+        )
+
+    def counts(self) -> Dict:
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        for status, count in self._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            counts[status] = count
+        return counts
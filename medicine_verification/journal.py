@@ -0,0 +1,399 @@
+"""
+Verification Journal Module
+Append-only, line-delimited storage for verification records
+- Each record is one JSON line appended to a journal file (O(1) writes)
+- fsync is batched by record count and time instead of per write
+- An in-memory per-user offset index lets reads seek straight to records
+- A background compactor folds the journal into a snapshot file and
+  writes an index sidecar, so startup only has to scan the short journal
+- Several worker processes may share one journal: appends and compaction
+  hold an exclusive file lock, reads a shared one, and each process catches
+  up on records (or compactions) written by the others before it reads
+- Each process opens its own file handles and starts its own maintenance
+  thread on its first append or read, so none runs in a gunicorn master that
+  loaded the app before forking
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from file_lock import FileLock
+
+# Segment identifiers used in index entries
+SNAPSHOT = 0
+JOURNAL = 1
+
+class VerificationJournal:
+    """Append-only verification store with a per-user offset index"""
+
+    def __init__(
+        self,
+        data_dir: str,
+        name: str = 'verifications',
+        fsync_batch: int = 64,
+        fsync_interval: float = 1.0,
+        compact_min_records: int = 10000,
+        compact_check_interval: float = 60.0,
+        background: bool = True
+    ):
+        """
+        Initialize the journal and rebuild the index
+        Args:
+            data_dir: Directory holding the journal files
+            name: Base file name
+            fsync_batch: fsync after this many unsynced appends
+            fsync_interval: fsync pending appends at least this often (seconds)
+            compact_min_records: Journal size (records) that triggers compaction
+            compact_check_interval: How often the compactor checks the journal (seconds)
+            background: Run the background fsync/compaction thread (started
+                        on first use in each process)
+        """
+        self.snapshot_file = os.path.join(data_dir, f'{name}.snapshot.jsonl')
+        self.index_file = os.path.join(data_dir, f'{name}.snapshot.idx')
+        self.journal_file = os.path.join(data_dir, f'{name}.journal.jsonl')
+        self.lock = FileLock(os.path.join(data_dir, f'{name}.lock'))
+
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.compact_min_records = compact_min_records
+        self.compact_check_interval = compact_check_interval
+
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        with self.lock:
+            for path in (self.snapshot_file, self.journal_file):
+                if not os.path.exists(path):
+                    open(path, 'ab').close()
+            self._rebuild_index(repair=True)
+            self._open_handles()
+        self._handles_pid = os.getpid()
+
+        self.background = background
+        self._stop = threading.Event()
+        self._thread = None
+        self._maintenance_pid = None
+
+    def _open_handles(self):
+        """Open the append handle and the per-segment read handles"""
+        # O_APPEND handle: writes from every process land at the current end
+        self._journal = open(self.journal_file, 'ab')
+        self._readers = {
+            SNAPSHOT: open(self.snapshot_file, 'rb'),
+            JOURNAL: open(self.journal_file, 'rb'),
+        }
+
+    def _ensure_process(self):
+        """
+        Prepare this process on its first use of the journal (caller holds the lock)
+        A forked child reopens its file handles (inherited ones share seek
+        positions with the parent); every process starts its own maintenance
+        thread
+        """
+        pid = os.getpid()
+        if self._handles_pid == pid and self._maintenance_pid == pid:
+            return
+        if self._handles_pid != pid:
+            self._open_handles()
+            self._unsynced = 0
+            self._handles_pid = pid
+        if self._maintenance_pid != pid:
+            self._stop = threading.Event()
+            self._thread = None
+            if self.background:
+                self._thread = threading.Thread(target=self._maintenance_loop, name='journal-maintenance', daemon=True)
+                self._thread.start()
+            self._maintenance_pid = pid
+
+    # ------------------------------------------------------------------
+    # Startup
+    # ------------------------------------------------------------------
+
+    def _rebuild_index(self, repair: bool = False):
+        """
+        Rebuild the in-memory index from the snapshot sidecar and journal
+        Args:
+            repair: Truncate torn tails left by a crash (requires the exclusive lock)
+        """
+        self._by_id: Dict[str, Tuple[int, int]] = {}
+        self._by_user: Dict[str, List[Tuple[int, int]]] = {}
+        self._snapshot_size = 0
+        self._journal_size = 0
+        self._journal_records = 0
+        self._index_stat = self._stat_index()
+
+        self._load_snapshot_index(repair)
+        self._journal_size = self._scan(self.journal_file, JOURNAL)
+        if repair and os.path.getsize(self.journal_file) > self._journal_size:
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(self._journal_size)
+
+    def _stat_index(self) -> Optional[Tuple[int, int]]:
+        """Identity of the current index sidecar; changes on every compaction"""
+        try:
+            st = os.stat(self.index_file)
+            return (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _load_snapshot_index(self, repair: bool):
+        """Load the snapshot index sidecar, rebuilding it if missing or stale"""
+        actual_size = os.path.getsize(self.snapshot_file)
+        index = None
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    index = json.load(f)
+            except Exception:
+                index = None
+
+        if index and index.get('size', -1) <= actual_size:
+            self._snapshot_size = index['size']
+            self._by_user = {
+                user_id: [(SNAPSHOT, offset) for offset in offsets]
+                for user_id, offsets in index['users'].items()
+            }
+            self._by_id = {vid: (SNAPSHOT, offset) for vid, offset in index['ids'].items()}
+            if repair and actual_size > self._snapshot_size:
+                # Interrupted compaction: discard the partially appended tail
+                with open(self.snapshot_file, 'r+b') as f:
+                    f.truncate(self._snapshot_size)
+            return
+
+        self._snapshot_size = self._scan(self.snapshot_file, SNAPSHOT)
+        if repair and actual_size > self._snapshot_size:
+            with open(self.snapshot_file, 'r+b') as f:
+                f.truncate(self._snapshot_size)
+
+    def _refresh(self):
+        """
+        Pick up changes made by other processes (caller holds the lock)
+        A replaced index sidecar means another process compacted: rebuild.
+        A longer journal means another process appended: index the new tail.
+        """
+        if self._stat_index() != self._index_stat:
+            self._rebuild_index()
+        elif os.path.getsize(self.journal_file) > self._journal_size:
+            self._journal_size = self._scan(self.journal_file, JOURNAL, start=self._journal_size)
+
+    def _scan(self, path: str, segment: int, start: int = 0) -> int:
+        """
+        Index every complete record in a file from `start`
+        Returns:
+            Offset just past the last complete record
+        """
+        offset = start
+        with open(path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                vid = record.get('verification_id')
+                # Records already folded into the snapshot are skipped
+                if vid and vid not in self._by_id:
+                    self._index(record, (segment, offset))
+                if segment == JOURNAL:
+                    self._journal_records += 1
+                offset += len(line)
+        return offset
+
+    def _index(self, record: Dict, position: Tuple[int, int]):
+        """Add a record position to the in-memory index"""
+        self._by_id[record['verification_id']] = position
+        user_id = record.get('user_id')
+        if user_id:
+            self._by_user.setdefault(user_id, []).append(position)
+
+    # ------------------------------------------------------------------
+    # Reads and writes
+    # ------------------------------------------------------------------
+
+    def append(self, record: Dict):
+        """
+        Append a verification record
+        Args:
+            record: Verification record (must contain verification_id)
+        """
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        with self.lock:
+            self._ensure_process()
+            self._refresh()
+            if os.path.getsize(self.journal_file) > self._journal_size:
+                # Torn line from a crashed writer: cut it off before appending
+                self._journal.truncate(self._journal_size)
+            self._journal.write(line)
+            self._journal.flush()
+            self._index(record, (JOURNAL, self._journal_size))
+            self._journal_size += len(line)
+            self._journal_records += 1
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_batch or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def _sync(self):
+        """fsync pending journal appends (caller holds the lock)"""
+        if self._unsynced:
+            os.fsync(self._journal.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _read_at(self, position: Tuple[int, int]) -> Dict:
+        """Read the record stored at an index position (caller holds the lock)"""
+        segment, offset = position
+        reader = self._readers[segment]
+        reader.seek(offset)
+        return json.loads(reader.readline())
+
+    def get(self, verification_id: str) -> Optional[Dict]:
+        """Return a record by ID, or None"""
+        with self.lock.shared():
+            self._ensure_process()
+            self._refresh()
+            position = self._by_id.get(verification_id)
+            return self._read_at(position) if position else None
+
+    def get_user_records(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Return a user's records, newest first
+        Only the last `limit` positions are read from disk
+        """
+        with self.lock.shared():
+            self._ensure_process()
+            self._refresh()
+            positions = self._by_user.get(user_id, [])
+            if limit:
+                positions = positions[-limit:]
+            return [self._read_at(position) for position in reversed(positions)]
+
+    def get_user_page(self, user_id: str, limit: int, end: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Return the user's records at positions [end - limit, end), newest first
+        Args:
+            user_id: User ID
+            limit: Page size
+            end: Exclusive end position (None for the newest record)
+        Returns:
+            (records, start position of the page; 0 means no older records)
+        """
+        with self.lock.shared():
+            self._ensure_process()
+            self._refresh()
+            positions = self._by_user.get(user_id, [])
+            end = len(positions) if end is None else max(0, min(int(end), len(positions)))
+            start = max(0, end - limit)
+            records = [self._read_at(position) for position in reversed(positions[start:end])]
+            return records, start
+
+    def count(self) -> int:
+        """Total number of indexed records"""
+        with self.lock.shared():
+            self._ensure_process()
+            self._refresh()
+            return len(self._by_id)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def compact(self) -> int:
+        """
+        Fold the journal into the snapshot
+        Journal bytes are appended to the snapshot, the index sidecar is
+        replaced atomically, then the journal is truncated. A crash at any
+        step is recovered on startup (partial snapshot tails are truncated,
+        journal records already in the snapshot are skipped).
+        Returns:
+            Number of records folded
+        """
+        with self.lock:
+            self._ensure_process()
+            self._refresh()
+            if not self._journal_records:
+                return 0
+
+            self._sync()
+            folded = self._journal_records
+            base = self._snapshot_size
+
+            # 1. Append journal bytes to the snapshot
+            with open(self.journal_file, 'rb') as src, open(self.snapshot_file, 'ab') as dst:
+                remaining = self._journal_size
+                while remaining > 0:
+                    chunk = src.read(min(1024 * 1024, remaining))
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    remaining -= len(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+
+            # 2. Rebase journal positions onto the snapshot
+            def rebase(position):
+                segment, offset = position
+                return (SNAPSHOT, base + offset) if segment == JOURNAL else position
+
+            self._by_id = {vid: rebase(pos) for vid, pos in self._by_id.items()}
+            self._by_user = {uid: [rebase(pos) for pos in positions] for uid, positions in self._by_user.items()}
+            self._snapshot_size = base + self._journal_size
+
+            # 3. Atomically replace the index sidecar
+            self._write_index()
+
+            self._index_stat = self._stat_index()
+
+            # 4. Truncate the journal in place (other processes keep their handles)
+            self._journal.truncate(0)
+            os.fsync(self._journal.fileno())
+            self._journal_size = 0
+            self._journal_records = 0
+
+            return folded
+
+    def _write_index(self):
+        """Write the snapshot index sidecar via rename (caller holds the lock)"""
+        index = {
+            'size': self._snapshot_size,
+            'users': {uid: [offset for _, offset in positions] for uid, positions in self._by_user.items()},
+            'ids': {vid: offset for vid, (_, offset) in self._by_id.items()},
+        }
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.index_file)
+
+    def _maintenance_loop(self):
+        """Background thread: flush batched fsyncs and compact when due"""
+        last_compact_check = time.monotonic()
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                with self.lock:
+                    self._sync()
+                if time.monotonic() - last_compact_check >= self.compact_check_interval:
+                    last_compact_check = time.monotonic()
+                    if self._journal_records >= self.compact_min_records:
+                        folded = self.compact()
+                        if folded:  # 0: another process compacted first
+                            print(f"🗜️  Compacted {folded} verification records into snapshot")
+            except Exception as e:
+                print(f"❌ Journal maintenance error: {e}")
+
+    def close(self):
+        """Stop the background thread and flush everything to disk"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        with self.lock:
+            self._sync()
+            self._journal.close()
+            for reader in self._readers.values():
+                reader.close()
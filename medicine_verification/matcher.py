@@ -0,0 +1,417 @@
+"""
+Matcher Module
+Scores a patient photo's OCR text against all of a user's registered
+medicines at once
+- Each medicine's match artifact (normalized name, strength, token set,
+  n-gram signature) is computed once at registration and stored
+- A strength on the label that conflicts with the registered one (10 mg
+  read, 5 mg registered) keeps the confidence below the match threshold
+- Character n-gram TF-IDF vectors, compared by cosine similarity in a single
+  NumPy matrix product instead of one difflib pass per medicine
+- Results keep the fields of OCRReader.compare_text
+- Without NumPy the same scores are computed on sparse dicts in pure Python
+- Misread drug names in the patient text are corrected against an optional
+  drug lexicon (drug_lexicon.py); the uncorrected text is scored as well and
+  the lower score kept, so a correction is never what creates a match
+- Optional visual scores (visual_matcher.py) are fused into the confidence;
+  they can confirm a partly read name but never make a match on their own
+  (look-alike packs from one manufacturer share layout and colours)
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("⚠️  NumPy not available, matching runs in pure Python. Install: pip install numpy")
+
+NGRAM_SIZE = 3
+MATCH_THRESHOLD = 0.6
+OCR_MATCH_THRESHOLD = 0.6
+
+# How much a visual score can add to the OCR confidence: a lot when OCR read
+# little text and matched nothing (foil blister packs), little otherwise.
+# Unless OCR read at least the first VISUAL_MIN_NAME_PREFIX letters of the
+# registered drug name, the fused confidence stays at VISUAL_ONLY_CAP (below
+# MATCH_THRESHOLD): a pack that merely looks like the registered one, or
+# whose name only shares a stem with it (pantoprazole, omeprazole), is never
+# verified by its looks
+VISUAL_WEIGHT = 0.15
+VISUAL_WEIGHT_SPARSE_TEXT = 0.8
+SPARSE_TEXT_CHARS = 20
+VISUAL_MIN_NAME_PREFIX = 5
+VISUAL_ONLY_CAP = 0.55
+
+# Bump when the artifact layout or normalization changes; stored artifacts
+# with another version are rebuilt from the medicine record
+MATCH_ARTIFACT_VERSION = 1
+
+# Highest confidence for a medicine whose strength conflicts with the label's:
+# a wrong dose is never verified, whatever the name or the photo's look
+STRENGTH_CONFLICT_CAP = 0.5
+
+STRENGTH_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(mcg|mg|g|ml|iu|%)(?![a-z])', re.IGNORECASE)
+
+# Strength units as (dimension, factor to the dimension's base unit)
+STRENGTH_UNITS = {'mcg': ('mass', 0.001), 'mg': ('mass', 1.0), 'g': ('mass', 1000.0),
+                  'ml': ('volume', 1.0), 'iu': ('iu', 1.0), '%': ('percent', 1.0)}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace"""
+    return ' '.join((text or '').lower().split())
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> Counter:
+    """Character n-gram counts of normalized text, padded so word edges count"""
+    if not text:
+        return Counter()
+    padded = f' {text} '
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def normalize_drug_name(name: str, dosage: str = '') -> Tuple[str, Optional[str]]:
+    """
+    Split a medicine name into a normalized drug name and strength
+    e.g. "PARACETAMOL Tablets 500 mg" -> ("paracetamol tablets", "500mg")
+    Args:
+        name: Registered medicine name
+        dosage: Dosage field, used when the name has no strength
+    Returns:
+        (drug name, strength or None)
+    """
+    text = normalize_text(name)
+    found = STRENGTH_PATTERN.search(text) or STRENGTH_PATTERN.search(normalize_text(dosage))
+    strength = f'{found.group(1)}{found.group(2).lower()}' if found else None
+    drug = STRENGTH_PATTERN.sub(' ', text)
+    drug = ' '.join(re.sub(r'[^a-z0-9\s-]', ' ', drug).split())
+    return drug, strength
+
+
+def parse_strengths(text: str) -> List[Tuple[str, float]]:
+    """
+    Strengths in a text as (dimension, amount in the base unit)
+    e.g. "Amlodipine 10 mg, 0.5 g" -> [('mass', 10.0), ('mass', 500.0)]
+    """
+    strengths = []
+    for value, unit in STRENGTH_PATTERN.findall(text or ''):
+        dimension, factor = STRENGTH_UNITS[unit.lower()]
+        strengths.append((dimension, float(value) * factor))
+    return strengths
+
+
+def strength_conflicts(registered_strength: Optional[str], patient_strengths: List[Tuple[str, float]]) -> bool:
+    """
+    Whether the label states strengths of the registered strength's kind
+    (e.g. mg) and none of them is the registered one
+    A label without a readable strength does not conflict
+    """
+    registered = parse_strengths(registered_strength)
+    if not registered:
+        return False
+    dimension, amount = registered[0]
+    same_kind = [value for kind, value in patient_strengths if kind == dimension]
+    return bool(same_kind) and not any(math.isclose(value, amount, rel_tol=1e-3) for value in same_kind)
+
+
+def build_match_artifact(registered_name: str, registered_ocr: str = '', dosage: str = '') -> Dict:
+    """
+    Compute a medicine's match artifact
+    Everything the matcher needs about a registered medicine, so verification
+    never re-tokenizes it or loads the raw back-photo OCR text
+    Args:
+        registered_name: Registered medicine name
+        registered_ocr: OCR text from the registered back photo
+        dosage: Dosage information
+    Returns:
+        JSON-serializable artifact
+    """
+    name = normalize_text(registered_name)
+    ocr = normalize_text(registered_ocr)
+    _, strength = normalize_drug_name(registered_name, dosage)
+    return {
+        'version': MATCH_ARTIFACT_VERSION,
+        'registered_name': registered_name,
+        'strength': strength,
+        'name': name,
+        'name_words': sorted(set(name.split())),
+        'name_ngrams': dict(char_ngrams(name)),
+        'has_ocr': bool(ocr),
+        'ocr_ngrams': dict(char_ngrams(ocr)),
+    }
+
+
+def match_confidence(direct_match: bool, word_match_ratio: float, similarity: float, ocr_match: bool) -> float:
+    """Combine the individual match signals into one confidence score"""
+    if direct_match:
+        return 0.95
+    elif word_match_ratio >= 0.8:
+        return 0.85
+    elif similarity >= 0.7:
+        return similarity
+    elif ocr_match:
+        return 0.75
+    elif word_match_ratio >= 0.5:
+        return word_match_ratio * 0.7
+    else:
+        return similarity * 0.5
+
+
+def build_match_result(
+    patient_text: str,
+    registered_name: str,
+    direct_match: bool,
+    similarity: float,
+    word_match_ratio: float,
+    ocr_match: bool,
+    common_words,
+    strength_conflict: bool = False
+) -> Dict:
+    """
+    Assemble a compare_text-shaped result
+    Args:
+        strength_conflict: The label's strength differs from the registered
+                           one; confidence is capped below the match threshold
+    """
+    confidence = match_confidence(direct_match, word_match_ratio, similarity, ocr_match)
+    if strength_conflict:
+        confidence = min(confidence, STRENGTH_CONFLICT_CAP)
+    return {
+        'match': confidence >= MATCH_THRESHOLD,
+        'confidence': round(confidence, 3),
+        'direct_match': direct_match,
+        'similarity': round(similarity, 3),
+        'word_match_ratio': round(word_match_ratio, 3),
+        'ocr_match': ocr_match,
+        'common_words': list(common_words),
+        'strength_conflict': strength_conflict,
+        'registered_name': registered_name,
+        'patient_text': patient_text[:100]  # First 100 chars for reference
+    }
+
+
+def name_prefix_read(registered_name: str, patient_text: str) -> bool:
+    """
+    Whether the patient text has a word of at least VISUAL_MIN_NAME_PREFIX
+    letters that starts the registered drug name
+    e.g. "AMLODIP" for "Amlodipine 5mg", but not "PANTOPRAZOLE" for "Omeprazole"
+    """
+    drug, _ = normalize_drug_name(registered_name)
+    drug_words = drug.split()
+    if not drug_words:
+        return False
+    return any(
+        len(word) >= VISUAL_MIN_NAME_PREFIX and drug_words[0].startswith(word)
+        for word in re.findall(r'[a-z]+', normalize_text(patient_text))
+    )
+
+
+def fuse_visual_confidence(ocr_confidence: float, visual_score: float, sparse_text: bool) -> float:
+    """
+    Combine OCR confidence with a visual score
+    Visual evidence can only raise the confidence (1 - (1 - ocr) * (1 - w * visual)):
+    a photo of the other side of the pack, or in poor light, looks different
+    without being a different medicine
+    Args:
+        sparse_text: OCR read next to nothing and matched no medicine, so the
+                     visual score weighs more (MedicineMatcher.compare still
+                     requires part of the name to be read for a match)
+    """
+    weight = VISUAL_WEIGHT_SPARSE_TEXT if sparse_text else VISUAL_WEIGHT
+    return 1 - (1 - ocr_confidence) * (1 - weight * visual_score)
+
+
+class MedicineMatcher:
+    """Vectorized matching of patient text against candidate medicines"""
+
+    def __init__(self, lexicon=None):
+        """
+        Initialize the matcher
+        Args:
+            lexicon: DrugLexicon used to correct the patient text, or None
+        """
+        self.lexicon = lexicon
+
+    def compare(
+        self,
+        patient_text: str,
+        candidates: List[Dict],
+        visual_scores: Optional[List[Optional[float]]] = None
+    ) -> List[Dict]:
+        """
+        Score patient text against every candidate
+        Args:
+            patient_text: OCR text from the patient photo
+            candidates: Match artifacts (build_match_artifact) of the registered medicines
+            visual_scores: Optional visual similarity per candidate (None: no fingerprint)
+        Returns:
+            One compare_text-shaped result per candidate, in order; with a
+            visual score, 'confidence' is the fused score and the text-only one
+            is kept as 'ocr_confidence'
+        """
+        if not candidates:
+            return []
+
+        results = self._score_text(patient_text, patient_text, candidates)
+        if self.lexicon is not None:
+            keep = {word for candidate in candidates for word in candidate['name_words']}
+            corrected_text = self.lexicon.correct_text(patient_text, keep=keep)
+            if corrected_text != patient_text:
+                # A correction may lower a score, never raise it
+                corrected = self._score_text(patient_text, corrected_text, candidates)
+                results = [min(pair, key=lambda result: result['confidence']) for pair in zip(results, corrected)]
+
+        sparse_text = (
+            sum(c.isalnum() for c in patient_text or '') < SPARSE_TEXT_CHARS
+            and not any(result['match'] for result in results)
+        )
+        for result, visual_score in zip(results, visual_scores or []):
+            if visual_score is None:
+                continue
+            confidence = fuse_visual_confidence(result['confidence'], visual_score, sparse_text)
+            if not name_prefix_read(result['registered_name'], patient_text):
+                # Looks alone only confirm: no match without part of the name
+                confidence = min(confidence, max(result['confidence'], VISUAL_ONLY_CAP))
+            if result['strength_conflict']:
+                confidence = min(confidence, STRENGTH_CONFLICT_CAP)
+            result['ocr_confidence'] = result['confidence']
+            result['visual_score'] = visual_score
+            result['confidence'] = round(confidence, 3)
+            result['match'] = confidence >= MATCH_THRESHOLD
+        return results
+
+    def _score_text(self, patient_text: str, scored_text: str, candidates: List[Dict]) -> List[Dict]:
+        """
+        Text-only results for one version of the patient text
+        Args:
+            patient_text: OCR text as read (reported in the results)
+            scored_text: Text actually scored (patient_text, or its lexicon correction)
+        """
+        patient = normalize_text(scored_text)
+        scorer = self._cosine_scores if NUMPY_AVAILABLE else self._cosine_scores_python
+        name_scores, ocr_scores = scorer(patient, candidates)
+
+        patient_words = set(patient.split())
+        patient_strengths = parse_strengths(patient)
+        results = []
+        for candidate, similarity, ocr_similarity in zip(candidates, name_scores, ocr_scores):
+            name_words = set(candidate['name_words'])
+            common_words = name_words & patient_words
+            results.append(build_match_result(
+                patient_text,
+                candidate['registered_name'],
+                direct_match=candidate['name'] in patient,
+                similarity=float(similarity),
+                word_match_ratio=len(common_words) / len(name_words) if name_words else 0,
+                ocr_match=candidate['has_ocr'] and float(ocr_similarity) > OCR_MATCH_THRESHOLD,
+                common_words=common_words,
+                strength_conflict=strength_conflicts(candidate.get('strength'), patient_strengths)
+            ))
+        return results
+
+    @staticmethod
+    def _queries(patient: str, name_lengths: List[int]) -> Tuple[List[Counter], List[int]]:
+        """
+        The texts a candidate is scored against: the whole patient text, then
+        each run of patient words as long as some candidate's name, so a name
+        embedded in a long label is not diluted by the rest of the text
+        Returns:
+            (n-gram counts per query, window length per query; 0 = whole text)
+        """
+        tokens = patient.split()
+        queries = [char_ngrams(patient)]
+        window_lengths = [0]
+        for length in sorted(set(name_lengths)):
+            if 0 < length < len(tokens):
+                for start in range(len(tokens) - length + 1):
+                    queries.append(char_ngrams(' '.join(tokens[start:start + length])))
+                    window_lengths.append(length)
+        return queries, window_lengths
+
+    @staticmethod
+    def _idf(doc_freq: int, doc_count: int) -> float:
+        """Smoothed idf. Grams seen only in the patient text (mostly OCR noise)
+        get the minimum weight rather than the maximum"""
+        return math.log((1 + doc_count) / (1 + doc_freq)) + 1 if doc_freq else 1.0
+
+    def _cosine_scores(self, patient: str, candidates: List[Dict]):
+        """
+        TF-IDF cosine similarity of the patient text to every name and OCR text
+        Returns:
+            (name similarities, OCR similarities) as arrays
+        """
+        k = len(candidates)
+        docs = [c['name_ngrams'] for c in candidates] + [c['ocr_ngrams'] for c in candidates]
+        name_lengths = np.array([len(c['name'].split()) for c in candidates])
+        queries, window_lengths = self._queries(patient, name_lengths.tolist())
+
+        vocab: Dict[str, int] = {}
+        for doc in docs + queries:
+            for gram in doc:
+                vocab.setdefault(gram, len(vocab))
+        if not vocab:
+            zeros = np.zeros(k)
+            return zeros, zeros
+
+        def to_matrix(counters):
+            matrix = np.zeros((len(counters), len(vocab)), dtype=np.float32)
+            for row, counts in enumerate(counters):
+                if counts:
+                    matrix[row, [vocab[g] for g in counts]] = list(counts.values())
+            # Sublinear tf
+            return np.log1p(matrix, out=matrix)
+
+        doc_matrix = to_matrix(docs)
+        query_matrix = to_matrix(queries)
+
+        doc_freq = np.count_nonzero(doc_matrix, axis=0)
+        idf = np.where(doc_freq > 0, np.log((1 + len(docs)) / (1 + doc_freq)) + 1, 1).astype(np.float32)
+        doc_matrix *= idf
+        query_matrix *= idf
+
+        norms = np.outer(np.linalg.norm(doc_matrix, axis=1), np.linalg.norm(query_matrix, axis=1))
+        dots = doc_matrix @ query_matrix.T
+        scores = np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+        # Each name keeps its best score over the full text and same-length windows
+        window_lengths = np.array(window_lengths)
+        usable = (window_lengths[None, :] == 0) | (window_lengths[None, :] == name_lengths[:, None])
+        name_scores = np.where(usable, scores[:k], 0).max(axis=1)
+        return name_scores, scores[k:, 0]
+
+    def _cosine_scores_python(self, patient: str, candidates: List[Dict]):
+        """Same scores as _cosine_scores, on sparse dicts (no NumPy)"""
+        docs = [c['name_ngrams'] for c in candidates] + [c['ocr_ngrams'] for c in candidates]
+        name_lengths = [len(c['name'].split()) for c in candidates]
+        queries, window_lengths = self._queries(patient, name_lengths)
+
+        doc_freq = Counter(gram for doc in docs for gram in doc)
+
+        def weigh(counts):
+            vector = {g: math.log1p(c) * self._idf(doc_freq.get(g, 0), len(docs)) for g, c in counts.items()}
+            return vector, math.sqrt(sum(v * v for v in vector.values()))
+
+        def cosine(a, b):
+            (va, na), (vb, nb) = a, b
+            if not na or not nb:
+                return 0.0
+            if len(va) > len(vb):
+                va, vb = vb, va
+            return sum(w * vb[g] for g, w in va.items() if g in vb) / (na * nb)
+
+        weighted_queries = [weigh(q) for q in queries]
+        name_scores, ocr_scores = [], []
+        for candidate, length in zip(candidates, name_lengths):
+            name_vector = weigh(candidate['name_ngrams'])
+            name_scores.append(max(
+                cosine(name_vector, query)
+                for query, window in zip(weighted_queries, window_lengths)
+                if window in (0, length)
+            ))
+            ocr_scores.append(cosine(weigh(candidate['ocr_ngrams']), weighted_queries[0]))
+        return name_scores, ocr_scores
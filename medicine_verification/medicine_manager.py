@@ -1,106 +1,301 @@
 """
 Medicine Manager Module
 Handles medicine registration, storage, and verification records
-Uses JSON file-based storage (can be replaced with database)
+Storage is delegated to a pluggable backend (see storage.py):
+SQLite by default, an append-only journal, or the legacy JSON files
+Medicine reads are served from a write-through in-process cache
+Each medicine's match artifact is computed at registration, so verification
+loads only these compact artifacts instead of the full records
 """
 
+import base64
 import json
 import os
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import uuid
 
+from matcher import MATCH_ARTIFACT_VERSION, build_match_artifact
+from outbox import NotificationOutbox
+from storage import StorageBackend, VersionChange, create_backend
+
+
+class MedicineCache:
+    """
+    Write-through cache of parsed medicine records and the per-user index
+    Every read compares the backend's medicines_version() token with the
+    cached one, so writes made by other worker processes invalidate it
+    """
+
+    def __init__(self, storage: StorageBackend):
+        """
+        Initialize the cache
+        Args:
+            storage: Backend the cache sits in front of
+        """
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._version: Any = None
+        self._records: Dict[str, Dict] = {}
+        self._users: Dict[str, List[str]] = {}
+        self._artifacts: Dict[str, Dict] = {}
+        self._artifact_users: Dict[str, List[str]] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'writes': 0}
+
+    def _sync_version(self):
+        """Drop cached data if the backend changed since it was cached (lock held)"""
+        version = self.storage.medicines_version()
+        if version != self._version:
+            if self._records or self._users or self._artifacts:
+                self._stats['invalidations'] += 1
+            self._records.clear()
+            self._users.clear()
+            self._artifacts.clear()
+            self._artifact_users.clear()
+            self._version = version
+
+    def get_medicine(self, medicine_id: str) -> Optional[Dict]:
+        """Get a medicine record, loading it on a miss"""
+        with self._lock:
+            self._sync_version()
+            if medicine_id in self._records:
+                self._stats['hits'] += 1
+                return self._records[medicine_id]
+            self._stats['misses'] += 1
+            version = self._version
+
+        record = self.storage.get_medicine(medicine_id)
+        with self._lock:
+            if record is not None and self._version == version:
+                self._records[medicine_id] = record
+        return record
+
+    def get_user_medicines(self, user_id: str) -> List[Dict]:
+        """Get a user's medicine records, loading them on a miss"""
+        with self._lock:
+            self._sync_version()
+            if user_id in self._users:
+                self._stats['hits'] += 1
+                return [self._records[mid] for mid in self._users[user_id]]
+            self._stats['misses'] += 1
+            version = self._version
+
+        records = self.storage.get_user_medicines(user_id)
+        with self._lock:
+            if self._version == version:
+                for record in records:
+                    self._records[record['medicine_id']] = record
+                self._users[user_id] = [record['medicine_id'] for record in records]
+        return records
+
+    def get_match_artifact(self, medicine_id: str, loader: Callable[[str], Optional[Dict]]) -> Optional[Dict]:
+        """Get a medicine's match artifact, calling loader(medicine_id) on a miss"""
+        with self._lock:
+            self._sync_version()
+            if medicine_id in self._artifacts:
+                self._stats['hits'] += 1
+                return self._artifacts[medicine_id]
+            self._stats['misses'] += 1
+            version = self._version
+
+        artifact = loader(medicine_id)
+        with self._lock:
+            if artifact is not None and self._version == version:
+                self._artifacts[medicine_id] = artifact
+        return artifact
+
+    def get_user_match_artifacts(self, user_id: str, loader: Callable[[str], List[Dict]]) -> List[Dict]:
+        """Get a user's match artifacts, calling loader(user_id) on a miss"""
+        with self._lock:
+            self._sync_version()
+            if user_id in self._artifact_users:
+                self._stats['hits'] += 1
+                return [self._artifacts[mid] for mid in self._artifact_users[user_id]]
+            self._stats['misses'] += 1
+            version = self._version
+
+        artifacts = loader(user_id)
+        with self._lock:
+            if self._version == version:
+                for artifact in artifacts:
+                    self._artifacts[artifact['medicine_id']] = artifact
+                self._artifact_users[user_id] = [artifact['medicine_id'] for artifact in artifacts]
+        return artifacts
+
+    def apply_add(self, record: Dict, change: VersionChange, match_artifact: Optional[Dict] = None):
+        """Write a newly stored record (and its match artifact) through to the cache"""
+        before, after = change
+        with self._lock:
+            self._stats['writes'] += 1
+            if self._version != before:
+                # Someone else wrote in between: resync on next read
+                self._version = None
+                return
+            self._records[record['medicine_id']] = record
+            user_id = record.get('user_id')
+            if user_id in self._users:
+                self._users[user_id].append(record['medicine_id'])
+            if match_artifact is not None:
+                self._artifacts[record['medicine_id']] = match_artifact
+                if user_id in self._artifact_users:
+                    self._artifact_users[user_id].append(record['medicine_id'])
+            elif user_id in self._artifact_users:
+                del self._artifact_users[user_id]
+            self._version = after
+
+    def apply_delete(self, medicine_id: str, change: VersionChange):
+        """Remove a deleted record from the cache"""
+        before, after = change
+        with self._lock:
+            self._stats['writes'] += 1
+            if self._version != before:
+                self._version = None
+                return
+            record = self._records.pop(medicine_id, None)
+            if record is not None and record.get('user_id') in self._users:
+                user_index = self._users[record['user_id']]
+                if medicine_id in user_index:
+                    user_index.remove(medicine_id)
+            else:
+                # Owner unknown: drop every user list that references it
+                for user_index in self._users.values():
+                    if medicine_id in user_index:
+                        user_index.remove(medicine_id)
+            self._artifacts.pop(medicine_id, None)
+            for user_index in self._artifact_users.values():
+                if medicine_id in user_index:
+                    user_index.remove(medicine_id)
+            self._version = after
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size, for monitoring"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': round(self._stats['hits'] / lookups, 3) if lookups else 0.0,
+                'cached_medicines': len(self._records),
+                'cached_users': len(self._users),
+                'cached_match_artifacts': len(self._artifacts),
+            }
+
 
 class MedicineManager:
     """Manages medicine registration and verification records"""
-    
-    def __init__(self, data_dir: str = 'data'):
+
+    def __init__(self, data_dir: str = 'data', backend: Optional[str] = None, cache: bool = True):
         """
         Initialize Medicine Manager
         Args:
             data_dir: Directory to store data files
+            backend: Storage backend name ('sqlite', 'journal' or 'json').
+                     Defaults to the MEDICINE_STORAGE_BACKEND env var, then 'sqlite'
+            cache: Serve medicine reads from the in-process cache
         """
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
-        
+
         self.medicines_file = os.path.join(data_dir, 'medicines.json')
         self.verifications_file = os.path.join(data_dir, 'verifications.json')
-        
-        # Initialize data files if they don't exist
-        self._ensure_data_files()
-    
-    def _ensure_data_files(self):
-        """Create data files if they don't exist"""
-        if not os.path.exists(self.medicines_file):
-            with open(self.medicines_file, 'w') as f:
-                json.dump({}, f)
-        
-        if not os.path.exists(self.verifications_file):
-            with open(self.verifications_file, 'w') as f:
-                json.dump({}, f)
-    
-    def _load_medicines(self) -> Dict:
-        """Load medicines from JSON file"""
-        try:
-            with open(self.medicines_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    
-    def _save_medicines(self, medicines: Dict):
-        """Save medicines to JSON file"""
-        with open(self.medicines_file, 'w') as f:
-            json.dump(medicines, f, indent=2)
-    
-    def _load_verifications(self) -> Dict:
-        """Load verifications from JSON file"""
-        try:
-            with open(self.verifications_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    
-    def _save_verifications(self, verifications: Dict):
-        """Save verifications to JSON file"""
-        with open(self.verifications_file, 'w') as f:
-            json.dump(verifications, f, indent=2)
-    
-    def register_medicine(self, medicine_data: Dict) -> str:
+
+        self.backend_name = (backend or os.getenv('MEDICINE_STORAGE_BACKEND', 'sqlite')).lower()
+        self.storage: StorageBackend = create_backend(self.backend_name, data_dir)
+        self.cache: Optional[MedicineCache] = MedicineCache(self.storage) if cache else None
+
+    def register_medicine(self, medicine_data: Dict, visual_fingerprint: Optional[Dict] = None) -> str:
         """
         Register a new medicine
         Args:
             medicine_data: Dictionary containing medicine information
+            visual_fingerprint: Back-photo fingerprint (VisualMatcher.fingerprint),
+                                kept with the match artifact
         Returns:
             Medicine ID
         """
-        medicines = self._load_medicines()
-        
         # Generate unique ID
         medicine_id = str(uuid.uuid4())
-        
+
         # Add medicine data
         medicine_record = {
             'medicine_id': medicine_id,
             **medicine_data
         }
-        
-        medicines[medicine_id] = medicine_record
-        
-        # Organize by user_id for faster lookup
-        user_id = medicine_data.get('user_id')
-        if user_id and 'users' not in medicines:
-            medicines['users'] = {}
-        if user_id:
-            if 'users' not in medicines:
-                medicines['users'] = {}
-            if user_id not in medicines['users']:
-                medicines['users'][user_id] = []
-            medicines['users'][user_id].append(medicine_id)
-        
-        self._save_medicines(medicines)
-        
+        match_artifact = self._build_match_artifact(medicine_record)
+        if visual_fingerprint:
+            match_artifact['visual'] = visual_fingerprint
+
+        change = self.storage.add_medicine(medicine_record, match_artifact=match_artifact)
+        if self.cache:
+            self.cache.apply_add(medicine_record, change, {'medicine_id': medicine_id, **match_artifact})
+
         return medicine_id
-    
+
+    @staticmethod
+    def _build_match_artifact(record: Dict) -> Dict:
+        """Compute a medicine's match artifact from its record"""
+        return build_match_artifact(
+            record.get('medicine_name', ''),
+            record.get('back_photo_ocr', ''),
+            record.get('dosage', '')
+        )
+
+    def get_match_artifact(self, medicine_id: str) -> Optional[Dict]:
+        """
+        Get the match artifact of one medicine
+        Args:
+            medicine_id: Medicine ID
+        Returns:
+            Artifact (see matcher.build_match_artifact) with medicine_id, or None
+        """
+        if self.cache:
+            return self.cache.get_match_artifact(medicine_id, self._load_match_artifact)
+        return self._load_match_artifact(medicine_id)
+
+    def get_user_match_artifacts(self, user_id: str) -> List[Dict]:
+        """
+        Get the match artifacts of all of a user's medicines
+        Args:
+            user_id: User ID
+        Returns:
+            Artifacts with medicine_id, in registration order
+        """
+        if self.cache:
+            return self.cache.get_user_match_artifacts(user_id, self._load_user_match_artifacts)
+        return self._load_user_match_artifacts(user_id)
+
+    def _load_match_artifact(self, medicine_id: str) -> Optional[Dict]:
+        artifact = self.storage.get_match_artifact(medicine_id)
+        if artifact is None or artifact.get('version') != MATCH_ARTIFACT_VERSION:
+            return self._backfill_match_artifact(medicine_id, artifact)
+        return {'medicine_id': medicine_id, **artifact}
+
+    def _load_user_match_artifacts(self, user_id: str) -> List[Dict]:
+        artifacts = []
+        for medicine_id, artifact in self.storage.get_user_match_artifacts(user_id):
+            if artifact is None or artifact.get('version') != MATCH_ARTIFACT_VERSION:
+                artifact = self._backfill_match_artifact(medicine_id, artifact)
+                if artifact is not None:
+                    artifacts.append(artifact)
+            else:
+                artifacts.append({'medicine_id': medicine_id, **artifact})
+        return artifacts
+
+    def _backfill_match_artifact(self, medicine_id: str, stale: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Build and store the artifact of a medicine registered before artifacts
+        (or with an old version); a stale artifact's visual fingerprint is kept,
+        since the photo it came from is not necessarily still available
+        """
+        record = self.storage.get_medicine(medicine_id)
+        if record is None:
+            return None
+        artifact = self._build_match_artifact(record)
+        if stale and stale.get('visual'):
+            artifact['visual'] = stale['visual']
+        self.storage.set_match_artifact(medicine_id, artifact)
+        return {'medicine_id': medicine_id, **artifact}
+
     def get_medicine(self, medicine_id: str) -> Optional[Dict]:
         """
         Get medicine by ID
@@ -109,9 +304,10 @@ class MedicineManager:
         Returns:
             Medicine record or None
         """
-        medicines = self._load_medicines()
-        return medicines.get(medicine_id)
-    
+        if self.cache:
+            return self.cache.get_medicine(medicine_id)
+        return self.storage.get_medicine(medicine_id)
+
     def get_user_medicines(self, user_id: str) -> List[Dict]:
         """
         Get all medicines for a user
@@ -120,24 +316,10 @@ class MedicineManager:
         Returns:
             List of medicine records
         """
-        medicines = self._load_medicines()
-        user_medicines = []
-        
-        # Check user index first
-        if 'users' in medicines and user_id in medicines['users']:
-            for med_id in medicines['users'][user_id]:
-                if med_id in medicines:
-                    user_medicines.append(medicines[med_id])
-        else:
-            # Fallback: search all medicines
-            for med_id, med_data in medicines.items():
-                if med_id == 'users':
-                    continue
-                if med_data.get('user_id') == user_id:
-                    user_medicines.append(med_data)
-        
-        return user_medicines
-    
+        if self.cache:
+            return self.cache.get_user_medicines(user_id)
+        return self.storage.get_user_medicines(user_id)
+
     def delete_medicine(self, medicine_id: str) -> bool:
         """
         Delete a medicine
@@ -146,60 +328,53 @@ class MedicineManager:
         Returns:
             True if deleted, False if not found
         """
-        medicines = self._load_medicines()
-        
-        if medicine_id not in medicines:
+        change = self.storage.delete_medicine(medicine_id)
+        if change is None:
             return False
-        
-        # Remove from user index
-        med_data = medicines[medicine_id]
-        user_id = med_data.get('user_id')
-        if user_id and 'users' in medicines and user_id in medicines['users']:
-            if medicine_id in medicines['users'][user_id]:
-                medicines['users'][user_id].remove(medicine_id)
-        
-        # Delete medicine
-        del medicines[medicine_id]
-        self._save_medicines(medicines)
-        
+        if self.cache:
+            self.cache.apply_delete(medicine_id, change)
         return True
-    
-    def save_verification(self, verification_data: Dict) -> str:
+
+    def save_verification(
+        self,
+        verification_data: Dict,
+        outbox: Optional[NotificationOutbox] = None,
+        notification: Optional[Dict] = None
+    ) -> str:
         """
         Save a verification record
         Args:
             verification_data: Verification data dictionary
+            outbox: Notification outbox to queue the notification in
+            notification: Payload of the notification to queue with the record;
+                          with the SQLite backend (outbox in the same database)
+                          both are written in one transaction
         Returns:
             Verification ID
         """
-        verifications = self._load_verifications()
-        
         # Generate unique ID
         verification_id = str(uuid.uuid4())
-        
+
         # Add verification data
         verification_record = {
             'verification_id': verification_id,
             **verification_data
         }
-        
-        verifications[verification_id] = verification_record
-        
-        # Organize by user_id for faster lookup
-        user_id = verification_data.get('user_id')
-        if user_id and 'users' not in verifications:
-            verifications['users'] = {}
-        if user_id:
-            if 'users' not in verifications:
-                verifications['users'] = {}
-            if user_id not in verifications['users']:
-                verifications['users'][user_id] = []
-            verifications['users'][user_id].append(verification_id)
-        
-        self._save_verifications(verifications)
-        
+
+        entry = None
+        if outbox is not None and notification is not None:
+            entry = outbox.new_entry(verification_id, verification_data.get('user_id'), notification)
+
+        if entry and outbox.shares_database(getattr(self.storage, 'db_path', None)):
+            self.storage.add_verification(verification_record, outbox_entry=entry)
+            outbox.notify()
+        else:
+            self.storage.add_verification(verification_record)
+            if entry:
+                outbox.enqueue(entry)
+
         return verification_id
-    
+
     def get_user_verifications(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
         """
         Get all verifications for a user
@@ -209,30 +384,56 @@ class MedicineManager:
         Returns:
             List of verification records (newest first)
         """
-        verifications = self._load_verifications()
-        user_verifications = []
-        
-        # Check user index first
-        if 'users' in verifications and user_id in verifications['users']:
-            for verif_id in verifications['users'][user_id]:
-                if verif_id in verifications:
-                    user_verifications.append(verifications[verif_id])
-        else:
-            # Fallback: search all verifications
-            for verif_id, verif_data in verifications.items():
-                if verif_id == 'users':
-                    continue
-                if verif_data.get('user_id') == user_id:
-                    user_verifications.append(verif_data)
-        
-        # Sort by date (newest first)
-        user_verifications.sort(key=lambda x: x.get('verified_at', ''), reverse=True)
-        
-        if limit:
-            user_verifications = user_verifications[:limit]
-        
-        return user_verifications
-    
+        return self.storage.get_user_verifications(user_id, limit)
+
+    def get_user_verifications_page(
+        self,
+        user_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+        fields: Optional[List[str]] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get one page of a user's verifications (newest first)
+        Args:
+            user_id: User ID
+            limit: Page size
+            before: Opaque cursor from the previous page's next_cursor
+            fields: Optional list of top-level fields to return
+                    (verification_id is always included)
+        Returns:
+            (records, next_cursor or None when there are no older records)
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        records, next_cursor = self.storage.get_user_verifications_page(
+            user_id, limit, self._decode_cursor(before) if before else None
+        )
+
+        if fields:
+            wanted = set(fields) | {'verification_id'}
+            records = [{k: v for k, v in record.items() if k in wanted} for record in records]
+
+        return records, (self._encode_cursor(next_cursor) if next_cursor else None)
+
+    @staticmethod
+    def _encode_cursor(cursor: Dict) -> str:
+        """Encode a backend cursor as an opaque URL-safe string"""
+        raw = json.dumps(cursor, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Dict:
+        """Decode a cursor produced by _encode_cursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            decoded = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except Exception:
+            raise ValueError('Invalid cursor')
+        if not isinstance(decoded, dict):
+            raise ValueError('Invalid cursor')
+        return decoded
+
     def get_verification(self, verification_id: str) -> Optional[Dict]:
         """
         Get verification by ID
@@ -241,5 +442,14 @@ class MedicineManager:
         Returns:
             Verification record or None
         """
-        verifications = self._load_verifications()
-        return verifications.get(verification_id)
+        return self.storage.get_verification(verification_id)
+
+    def cache_stats(self) -> Dict:
+        """
+        Get medicine cache counters
+        Returns:
+            Dictionary with hits, misses, invalidations, writes and sizes
+        """
+        if not self.cache:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.stats()}
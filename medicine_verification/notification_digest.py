@@ -0,0 +1,200 @@
+"""
+Notification Digest Module
+Coalesces routine match notifications into one digest per recipient
+- Each match notice is buffered under its recipient's address (a doctor with
+  many patients is one recipient) instead of being sent on its own
+- A recipient's buffer is flushed as a single digest once its oldest notice
+  is `interval` seconds old, or as soon as it holds `max_items` notices
+- The buffer is a SQLite table, so notices survive restarts and all worker
+  processes coalesce into the same digests; a flush claims the recipient's
+  notices with a lease; a digest that fails to send is retried later
+- Mismatch alerts never go through the digest
+- Each process starts its flusher thread on its first use of the digest (so
+  none runs in a gunicorn master that loaded the app before forking)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS notification_digest (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipient TEXT NOT NULL,
+        contact TEXT NOT NULL,
+        item TEXT NOT NULL,
+        created_ts REAL NOT NULL,
+        claim TEXT,
+        lease_until REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_digest_recipient ON notification_digest(recipient, created_ts);
+"""
+
+class NotificationDigest:
+    """SQLite-backed per-recipient buffer of match notices with a flusher thread"""
+
+    def __init__(
+        self,
+        db_path: str,
+        send: Callable[[Dict, List[Dict]], bool],
+        interval: float = 3600.0,
+        max_items: int = 100,
+        lease_seconds: float = 300.0,
+        retry_delay: float = 60.0,
+        poll_interval: float = 5.0
+    ):
+        """
+        Initialize the digest (the flusher starts on first use in each process)
+        Args:
+            db_path: SQLite file holding the buffer table (e.g. the medicines database)
+            send: Delivers one digest: called with the recipient's contact and
+                  its notices, oldest first; returns True if it was sent
+            interval: Longest a notice waits before its recipient's digest is sent (seconds)
+            max_items: A recipient's digest is sent as soon as this many notices are waiting
+            lease_seconds: A flush not finished within this time is considered
+                           abandoned (e.g. its process died) and retried
+            retry_delay: Wait before retrying a digest that failed to send
+            poll_interval: How often the flusher looks for due recipients (seconds)
+        """
+        self.db_path = db_path
+        self.send = send
+        self.interval = interval
+        self.max_items = max(1, max_items)
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None  # process the flusher runs in
+        self._wakeup = threading.Event()
+        self._stats = {'buffered': 0, 'digests': 0, 'digested_items': 0, 'failures': 0}
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection (reopened after fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_flusher(self):
+        """Start this process's flusher thread unless it is running"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._flush_loop, name='notification-digest', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def add(self, recipient: str, contact: Dict, item: Dict):
+        """
+        Buffer a notice for a recipient
+        Args:
+            recipient: Address the digest goes to (e.g. 'email:doctor@example.com')
+            contact: Contact to send the digest to (the latest one is used)
+            item: JSON-serializable notice
+        """
+        self._ensure_flusher()
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO notification_digest (recipient, contact, item, created_ts) VALUES (?, ?, ?, ?)',
+            (recipient, json.dumps(contact), json.dumps(item), time.time())
+        )
+        with self._lock:
+            self._stats['buffered'] += 1
+        pending = conn.execute(
+            'SELECT COUNT(*) FROM notification_digest WHERE recipient = ? AND claim IS NULL', (recipient,)
+        ).fetchone()[0]
+        if pending >= self.max_items:
+            self._wakeup.set()
+
+    def flush_due(self, force: bool = False) -> int:
+        """
+        Send the digests that are due
+        Args:
+            force: Send every recipient's digest now, due or not
+        Returns:
+            Number of digests sent
+        """
+        now = time.time()
+        rows = self._connect().execute(
+            'SELECT recipient FROM notification_digest '
+            'WHERE claim IS NULL OR lease_until < ? '
+            'GROUP BY recipient HAVING ? OR MIN(created_ts) <= ? OR COUNT(*) >= ?',
+            (now, force, now - self.interval, self.max_items)
+        ).fetchall()
+        return sum(self._flush(row['recipient']) for row in rows)
+
+    def _flush(self, recipient: str) -> bool:
+        """Claim a recipient's notices and send them as one digest"""
+        conn = self._connect()
+        claim = str(uuid.uuid4())
+        now = time.time()
+        cursor = conn.execute(
+            'UPDATE notification_digest SET claim = ?, lease_until = ? '
+            'WHERE recipient = ? AND (claim IS NULL OR lease_until < ?)',
+            (claim, now + self.lease_seconds, recipient, now)
+        )
+        if cursor.rowcount == 0:
+            return False  # Claimed by another process
+        rows = conn.execute(
+            'SELECT contact, item FROM notification_digest WHERE claim = ? ORDER BY id', (claim,)
+        ).fetchall()
+
+        items = [json.loads(row['item']) for row in rows]
+        try:
+            sent = self.send(json.loads(rows[-1]['contact']), items)
+        except Exception as e:
+            print(f"❌ Digest to {recipient} failed: {e}")
+            sent = False
+
+        if sent:
+            conn.execute('DELETE FROM notification_digest WHERE claim = ?', (claim,))
+        else:
+            # Stay claimed until the retry: the lease expiring releases them
+            conn.execute(
+                'UPDATE notification_digest SET lease_until = ? WHERE claim = ?',
+                (time.time() + self.retry_delay, claim)
+            )
+        with self._lock:
+            if sent:
+                self._stats['digests'] += 1
+                self._stats['digested_items'] += len(items)
+            else:
+                self._stats['failures'] += 1
+        return sent
+
+    def _flush_loop(self):
+        """Flush due digests until the process exits"""
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                self.flush_due()
+            except Exception as e:
+                print(f"⚠️  Digest flush failed: {e}")
+
+    def stats(self) -> Dict:
+        """Buffered notices and digest counters, for monitoring"""
+        self._ensure_flusher()
+        pending, recipients = self._connect().execute(
+            'SELECT COUNT(*), COUNT(DISTINCT recipient) FROM notification_digest'
+        ).fetchone()
+        with self._lock:
+            return {'pending': pending, 'pending_recipients': recipients, **self._stats}
@@ -6,13 +6,21 @@ Supports email, SMS, and can integrate with Firebase/FCM
 
 import os
 import json
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
+from contact_directory import ContactDirectory
+from notification_digest import NotificationDigest
+
 try:
     import smtplib
     from email.mime.text import MIMEText
     from email.mime.multipart import MIMEMultipart
+    from smtp_pool import SMTPPool
     EMAIL_AVAILABLE = True
 except ImportError:
     EMAIL_AVAILABLE = False
@@ -22,14 +30,40 @@ except ImportError:
 class NotificationService:
     """Service for sending notifications to doctors and family"""
     
-    def __init__(self, config_file: str = 'config/notification_config.json'):
+    def __init__(
+        self,
+        config_file: str = 'config/notification_config.json',
+        contacts: Optional[ContactDirectory] = None,
+        digest_db: Optional[str] = None
+    ):
         """
         Initialize Notification Service
         Args:
             config_file: Path to configuration file
+            contacts: Directory of users' doctor and family contacts
+                      (default: config/user_contacts.json)
+            digest_db: SQLite file buffering match notices for digests;
+                       without it every match is notified on its own
         """
         self.config_file = config_file
         self.config = self._load_config()
+        self.contacts = contacts or ContactDirectory()
+        
+        # Routine match notices are coalesced into one digest per recipient
+        self.digest = None
+        if digest_db and self.config['digest']['enabled']:
+            self.digest = NotificationDigest(
+                digest_db,
+                send=self._send_digest,
+                interval=self.config['digest']['interval'],
+                max_items=self.config['digest']['max_items']
+            )
+        
+        # Shared SMTP sessions and sending threads, created on first use
+        self._smtp_pool = None
+        self._smtp_pool_lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
         
         # Ensure config directory exists
         config_dir = os.path.dirname(config_file)
@@ -45,7 +79,10 @@ class NotificationService:
                 'smtp_port': 587,
                 'sender_email': '',
                 'sender_password': '',
-                'use_tls': True
+                'use_tls': True,
+                'pool_size': 4,
+                'noop_interval': 10,
+                'max_idle': 120
             },
             'sms': {
                 'enabled': False,
@@ -58,6 +95,17 @@ class NotificationService:
                 'enabled': False,
                 'firebase_config_path': ''
             },
+            'digest': {
+                'enabled': False,
+                'interval': 3600,  # seconds a match notice may wait
+                'max_items': 100  # send a recipient's digest at this many notices
+            },
+            'delivery': {
+                'workers': 8,  # sending threads, shared by all notifications
+                'email_timeout': 20,  # seconds
+                'sms_timeout': 10,
+                'deadline': 30  # for all channels of one notification
+            },
             'notification_logs': True,
             'log_file': 'logs/notifications.log'
         }
@@ -70,6 +118,9 @@ class NotificationService:
                     for key, value in default_config.items():
                         if key not in loaded_config:
                             loaded_config[key] = value
+                        elif isinstance(value, dict) and isinstance(loaded_config[key], dict):
+                            for option, default in value.items():
+                                loaded_config[key].setdefault(option, default)
                     return loaded_config
             except:
                 pass
@@ -123,32 +174,30 @@ class NotificationService:
             message = self._create_mismatch_message(user_id, medicine_name, verification_data, confidence)
             priority = 'high'
         
-        # Send to doctor
-        if contacts.get('doctor'):
-            doctor_notified = self._send_notification(
-                contacts['doctor'],
-                subject,
-                message,
-                priority=priority
-            )
-            notification_status['sent_to_doctor'] = doctor_notified
-            if doctor_notified:
-                notification_status['total_sent'] += 1
+        recipients = [('doctor', contacts['doctor'])] if contacts.get('doctor') else []
+        recipients += [('family', member) for member in contacts.get('family') or []]
+        
+        if is_verified and self.digest:
+            # Routine match: add to each recipient's next digest
+            results = self._add_to_digest(user_id, medicine_name, confidence, verification_data, recipients)
+            notification_status['digest_queued'] = sum(result['digest'] for result in results)
+        else:
+            # Notify the doctor and family over all channels at once
+            results = self._fan_out(recipients, subject, message, priority, notification_status['errors'])
         
-        # Send to family members
-        if contacts.get('family'):
-            family_count = 0
-            for family_member in contacts['family']:
-                if self._send_notification(
-                    family_member,
-                    subject,
-                    message,
-                    priority=priority
-                ):
-                    family_count += 1
-            
-            notification_status['sent_to_family'] = family_count > 0
-            notification_status['total_sent'] += family_count
+        family_count = 0
+        for (role, _), result in zip(recipients, results):
+            if role == 'doctor':
+                notification_status['sent_to_doctor'] = result['sent']
+            elif result['sent']:
+                family_count += 1
+            if result['sent']:
+                notification_status['total_sent'] += 1
+            elif result['sent'] is None:
+                # Timed out: may still be delivered
+                notification_status['outcome_unknown'] = notification_status.get('outcome_unknown', 0) + 1
+        notification_status['sent_to_family'] = family_count > 0
+        notification_status['contacts'] = results
         
         # Log notification
         if self.config.get('notification_logs'):
@@ -156,6 +205,10 @@ class NotificationService:
         
         return notification_status
     
+    def channels_enabled(self) -> bool:
+        """Whether any delivery channel (email or SMS) is turned on"""
+        return bool(self.config['email']['enabled'] or self.config['sms']['enabled'])
+    
     def _create_match_message(self, user_id: str, medicine_name: str, verification_data: Dict, confidence: float) -> str:
         """Create message for successful verification"""
         return f"""
@@ -194,100 +247,283 @@ PLEASE CHECK IMMEDIATELY:
 This is an automated ALERT from the Medicine Verification System.
 """
     
+    def _create_digest_message(self, items: List[Dict]) -> str:
+        """Create message listing the buffered match notices"""
+        lines = '\n'.join(
+            f"- {item['verified_at'][:16].replace('T', ' ')}  Patient {item['user_id']}: "
+            f"{item['medicine_name']} ({item['confidence'] * 100:.1f}%)"
+            for item in items
+        )
+        return f"""
+✅ MEDICINE VERIFICATION DIGEST
+
+{len(items)} medicine verification(s) matched the prescribed medicine:
+
+{lines}
+
+Medicine mismatches are not included here; they are always sent immediately as separate alerts.
+
+This is an automated notification from the Medicine Verification System.
+"""
+    
+    def _create_digest_sms(self, items: List[Dict], shown: int = 3) -> str:
+        """Create a one-text digest: the count and the first few medicines"""
+        names = ', '.join(item['medicine_name'] for item in items[:shown])
+        if len(items) > shown:
+            names += f" +{len(items) - shown} more"
+        return f"✅ {len(items)} medicine verification(s) matched: {names}"[:160]
+    
     def _get_user_contacts(self, user_id: str) -> Dict:
         """
         Get doctor and family contacts for a user
-        This should be replaced with actual database/Firebase query
         Args:
             user_id: User ID
         Returns:
             Dictionary with 'doctor' and 'family' keys
         """
-        # Default contacts file (can be replaced with Firebase/database)
-        contacts_file = 'config/user_contacts.json'
-        
-        if os.path.exists(contacts_file):
-            try:
-                with open(contacts_file, 'r') as f:
-                    all_contacts = json.load(f)
-                    return all_contacts.get(user_id, {})
-            except:
-                pass
-        
-        # Return default structure
-        return {
-            'doctor': {
-                'email': os.getenv('DEFAULT_DOCTOR_EMAIL', ''),
-                'phone': os.getenv('DEFAULT_DOCTOR_PHONE', ''),
-                'name': 'Doctor'
-            },
-            'family': [
-                {
-                    'email': os.getenv('DEFAULT_FAMILY_EMAIL', ''),
-                    'phone': os.getenv('DEFAULT_FAMILY_PHONE', ''),
-                    'name': 'Family Member'
-                }
-            ]
+        return self.contacts.get(user_id)
+    
+    def _digest_recipient(self, contact: Dict) -> Optional[str]:
+        """Address a contact's digest goes to: email if possible, else SMS"""
+        if contact.get('email') and self.config['email']['enabled']:
+            return f"email:{contact['email']}"
+        if contact.get('phone') and self.config['sms']['enabled']:
+            return f"sms:{contact['phone']}"
+        return None
+    
+    def _add_to_digest(
+        self,
+        user_id: str,
+        medicine_name: str,
+        confidence: float,
+        verification_data: Dict,
+        recipients: List[Tuple[str, Dict]]
+    ) -> List[Dict]:
+        """
+        Buffer a match notice for each contact's digest
+        Returns:
+            Per recipient, in order: the same fields as _fan_out() with
+            nothing sent, and digest (whether the notice was buffered)
+        """
+        item = {
+            'user_id': user_id,
+            'medicine_name': medicine_name,
+            'confidence': confidence,
+            'verified_at': verification_data.get('verified_at', datetime.now().isoformat())
         }
+        buffered = set()
+        results = []
+        for role, contact in recipients:
+            recipient = self._digest_recipient(contact)
+            if recipient and recipient not in buffered:
+                self.digest.add(recipient, contact, item)
+                buffered.add(recipient)
+            results.append({
+                'role': role,
+                'name': contact.get('name'),
+                'sent': False,
+                'channels': {},
+                'digest': recipient is not None,
+                'latency_ms': 0.0
+            })
+        return results
     
-    def _send_notification(self, contact: Dict, subject: str, message: str, priority: str = 'normal') -> bool:
+    def _send_digest(self, contact: Dict, items: List[Dict]) -> bool:
+        """Send one digest of match notices to a contact"""
+        subject = f"✅ Medicines Verified - {len(items)} verification(s)"
+        message = self._create_digest_message(items)
+        recipient = self._digest_recipient(contact)
+        if recipient is None:
+            return True  # Channel turned off since; nothing to send
+        if recipient.startswith('email:'):
+            return self._send_emails([contact['email']], subject, message)[contact['email']]
+        return self._send_sms(contact['phone'], self._create_digest_sms(items))
+    
+    def _fan_out(
+        self,
+        recipients: List[Tuple[str, Dict]],
+        subject: str,
+        message: str,
+        priority: str,
+        errors: List[str]
+    ) -> List[Dict]:
         """
-        Send notification to a contact
+        Send a notification to every contact, channels in parallel
+        Everyone is emailed over one SMTP session; each contact is texted
+        separately. High priority sends SMS alongside the email, otherwise
+        SMS only goes to contacts the email did not (or cannot) reach. Every channel has
+        its own timeout and the whole notification a deadline, so a hung
+        gateway only costs the contacts that depend on it. A send that timed
+        out may still go through, so its outcome is unknown (None) rather
+        than failed, and an email that timed out gets no SMS fallback
         Args:
-            contact: Contact dictionary with email/phone
+            recipients: (role, contact) pairs; role is 'doctor' or 'family'
             subject: Notification subject
             message: Notification message
             priority: Priority level ('normal' or 'high')
+            errors: Timeouts and failures are appended here
         Returns:
-            True if sent successfully, False otherwise
+            Per recipient, in order: role, name, sent, outcome per channel
+            tried and latency_ms (until its last channel finished or timed out);
+            sent is True if any channel succeeded, None if none did but one timed out
         """
-        sent = False
+        delivery = self.config['delivery']
+        executor = self._get_executor()
+        started = time.monotonic()
+        deadline = started + delivery['deadline']
+        finished = {}
         
-        # Try email first
-        if contact.get('email') and self.config['email']['enabled']:
-            sent = self._send_email(contact['email'], subject, message)
+        def submit(key, fn, *args):
+            future = executor.submit(fn, *args)
+            future.add_done_callback(lambda _: finished.setdefault(key, time.monotonic()))
+            return future
         
-        # Try SMS if email failed or if priority is high
-        if not sent or priority == 'high':
-            if contact.get('phone') and self.config['sms']['enabled']:
-                sms_sent = self._send_sms(contact['phone'], f"{subject}: {message[:100]}")
-                if sms_sent:
-                    sent = True
+        def wait(key, future, timeout, label):
+            """Returns (result or None, whether it timed out)"""
+            remaining = min(timeout, deadline - time.monotonic())
+            try:
+                return future.result(timeout=max(0.0, remaining)), False
+            except FutureTimeoutError:
+                finished.setdefault(key, time.monotonic())
+                errors.append(f"{label} timed out after {time.monotonic() - started:.1f}s (outcome unknown)")
+                return None, True
+            except Exception as e:
+                errors.append(f"{label} failed: {e}")
+            return None, False
+        
+        outcomes = [{} for _ in recipients]
+        sms_text = f"{subject}: {message[:100]}"
+        sms_enabled = bool(self.config['sms']['enabled'] and recipients)
+        sms_futures = {}
+        
+        def send_sms(index):
+            phone = recipients[index][1].get('phone')
+            if phone:
+                sms_futures[index] = (time.monotonic(), submit(('sms', index), self._send_sms, phone, sms_text))
+        
+        addresses = []
+        if self.config['email']['enabled']:
+            addresses = list(dict.fromkeys(c['email'] for _, c in recipients if c.get('email')))
+        email_future = submit('email', self._send_emails, addresses, subject, message) if addresses else None
+        if sms_enabled:
+            for index, (_, contact) in enumerate(recipients):
+                if priority == 'high' or not (addresses and contact.get('email')):
+                    send_sms(index)
+        
+        emailed = {}
+        if email_future:
+            emailed, timed_out = wait('email', email_future, delivery['email_timeout'], 'Email')
+            for index, (_, contact) in enumerate(recipients):
+                if contact.get('email'):
+                    # Still sending after the timeout: it may yet arrive
+                    outcomes[index]['email'] = None if timed_out else (emailed or {}).get(contact['email'], False)
+        
+        # Email failed: fall back to SMS (not if it timed out, the contact could get both)
+        if sms_enabled:
+            for index in range(len(recipients)):
+                if index not in sms_futures and outcomes[index].get('email', False) is False:
+                    send_sms(index)
+        
+        for index, (submitted, future) in sms_futures.items():
+            name = recipients[index][1].get('name') or recipients[index][0]
+            sent, timed_out = wait(
+                ('sms', index), future, submitted + delivery['sms_timeout'] - time.monotonic(), f"SMS to {name}"
+            )
+            outcomes[index]['sms'] = None if timed_out else bool(sent)
         
-        return sent
+        results = []
+        for index, (role, contact) in enumerate(recipients):
+            keys = (['email'] if 'email' in outcomes[index] else []) + ([('sms', index)] if 'sms' in outcomes[index] else [])
+            done = [finished.get(key, started) for key in keys]
+            channels = outcomes[index].values()
+            if any(channels):
+                sent = True
+            elif None in channels:
+                sent = None
+            else:
+                sent = False
+            results.append({
+                'role': role,
+                'name': contact.get('name'),
+                'sent': sent,
+                'channels': outcomes[index],
+                'latency_ms': round((max(done) - started) * 1000, 1) if done else 0.0
+            })
+        return results
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Thread pool for sending (created on first use, and again after fork)"""
+        with self._smtp_pool_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.config['delivery']['workers'],
+                    thread_name_prefix='notify'
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
     
     def _send_email(self, recipient: str, subject: str, message: str) -> bool:
         """Send email notification"""
+        return self._send_emails([recipient], subject, message).get(recipient, False)
+    
+    def _send_emails(self, recipients: List[str], subject: str, message: str) -> Dict[str, bool]:
+        """
+        Send one email per recipient over a single pooled SMTP session
+        Args:
+            recipients: Email addresses
+            subject: Email subject
+            message: Email body
+        Returns:
+            Dictionary mapping each recipient to whether it was sent
+        """
         if not EMAIL_AVAILABLE:
-            print(f"📧 Email not configured (would send to {recipient})")
-            return False
+            print(f"📧 Email not configured (would send to {', '.join(recipients)})")
+            return {recipient: False for recipient in recipients}
         
-        try:
-            email_config = self.config['email']
-            if not email_config['enabled']:
-                print(f"📧 Email disabled in config")
-                return False
-            
+        email_config = self.config['email']
+        if not email_config['enabled']:
+            print(f"📧 Email disabled in config")
+            return {recipient: False for recipient in recipients}
+        
+        messages = []
+        for recipient in recipients:
             msg = MIMEMultipart()
             msg['From'] = email_config['sender_email']
             msg['To'] = recipient
             msg['Subject'] = subject
             msg.attach(MIMEText(message, 'plain'))
-            
-            server = smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port'])
-            
-            if email_config['use_tls']:
-                server.starttls()
-            
-            server.login(email_config['sender_email'], email_config['sender_password'])
-            server.send_message(msg)
-            server.quit()
-            
-            print(f"✅ Email sent to {recipient}")
-            return True
-        except Exception as e:
-            print(f"❌ Failed to send email to {recipient}: {e}")
-            return False
+            messages.append(msg)
+        
+        results = {}
+        for recipient, error in zip(recipients, self._get_smtp_pool().send(messages)):
+            if error is None:
+                print(f"✅ Email sent to {recipient}")
+            else:
+                print(f"❌ Failed to send email to {recipient}: {error}")
+            results[recipient] = error is None
+        return results
+    
+    def _get_smtp_pool(self) -> 'SMTPPool':
+        """Create the SMTP session pool on first use"""
+        with self._smtp_pool_lock:
+            if self._smtp_pool is None:
+                email_config = self.config['email']
+                self._smtp_pool = SMTPPool(
+                    host=email_config['smtp_server'],
+                    port=email_config['smtp_port'],
+                    username=email_config['sender_email'],
+                    password=email_config['sender_password'],
+                    use_tls=email_config['use_tls'],
+                    max_connections=email_config.get('pool_size', 4),
+                    noop_interval=email_config.get('noop_interval', 10),
+                    max_idle=email_config.get('max_idle', 120),
+                    timeout=self.config['delivery']['email_timeout']
+                )
+            return self._smtp_pool
+    
+    def smtp_stats(self) -> Optional[Dict]:
+        """SMTP session pool counters (None until the first email)"""
+        return self._smtp_pool.stats() if self._smtp_pool else None
     
     def _send_sms(self, phone_number: str, message: str) -> bool:
         """Send SMS notification"""
@@ -300,10 +536,12 @@ This is an automated ALERT from the Medicine Verification System.
         if sms_config['provider'] == 'twilio' and sms_config.get('twilio_account_sid'):
             try:
                 from twilio.rest import Client
+                from twilio.http.http_client import TwilioHttpClient
                 
                 client = Client(
                     sms_config['twilio_account_sid'],
-                    sms_config['twilio_auth_token']
+                    sms_config['twilio_auth_token'],
+                    http_client=TwilioHttpClient(timeout=self.config['delivery']['sms_timeout'])
                 )
                 
                 client.messages.create(
@@ -0,0 +1,249 @@
+"""
+OCR Cache Module
+Content-addressed cache of OCR results
+- Keyed by SHA-256 of the image bytes plus engine/preprocessing settings,
+  so re-photographed uploads and client retries skip OCR entirely
+- In-memory LRU tier in front of an on-disk tier with size-based eviction
+- Remembers ETag/Last-Modified per image URL, so an unchanged Firebase
+  Storage object can be answered from cache without downloading it again
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def content_digest(image_bytes: bytes) -> str:
+    """SHA-256 of the raw image file contents"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def make_cache_key(image_bytes: bytes, settings: str) -> str:
+    """
+    Build a cache key
+    Args:
+        image_bytes: Raw image file contents
+        settings: Engine/preprocessing signature (see OCRReader.cache_settings)
+    Returns:
+        Hex digest identifying this image under these settings
+    """
+    return digest_cache_key(content_digest(image_bytes), settings)
+
+
+def digest_cache_key(digest: str, settings: str) -> str:
+    """Cache key from an image's content_digest, when the bytes are not at hand"""
+    return hashlib.sha256(f'{digest}|{settings}'.encode('utf-8')).hexdigest()
+
+
+class OCRResultCache:
+    """Two-tier (memory + disk) cache of OCR text"""
+
+    def __init__(
+        self,
+        memory_entries: int = 512,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 256 * 1024 * 1024
+    ):
+        """
+        Initialize the cache
+        Args:
+            memory_entries: Maximum entries in the in-memory LRU tier
+            disk_dir: Directory for the on-disk tier (None = memory only)
+            disk_max_bytes: Size budget for the on-disk tier
+        """
+        self.memory_entries = memory_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._lock = threading.Lock()
+        self._memory: 'OrderedDict[str, str]' = OrderedDict()
+        self._urls: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._disk_bytes: Optional[int] = None
+        self._stats = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+            'stores': 0, 'evictions': 0, 'not_modified': 0,
+        }
+
+        if disk_dir:
+            os.makedirs(os.path.join(disk_dir, 'results'), exist_ok=True)
+            os.makedirs(os.path.join(disk_dir, 'urls'), exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # OCR results
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up cached text, promoting disk hits into memory"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return self._memory[key]
+
+        text = self._disk_read(self._result_path(key)) if self.disk_dir else None
+        with self._lock:
+            if text is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._memory_put(key, text)
+        return text
+
+    def put(self, key: str, text: str):
+        """Store OCR text in both tiers"""
+        with self._lock:
+            self._stats['stores'] += 1
+            self._memory_put(key, text)
+        if self.disk_dir:
+            self._disk_write(self._result_path(key), text)
+
+    def _memory_put(self, key: str, text: str):
+        """Insert into the LRU tier (lock held)"""
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # URL validators (ETag / Last-Modified)
+    # ------------------------------------------------------------------
+
+    def get_url_entry(self, url: str) -> Optional[Dict]:
+        """
+        Get the validators and cache key last seen for a URL
+        Returns:
+            {'etag', 'last_modified', 'key', 'digest'} or None
+        """
+        with self._lock:
+            if url in self._urls:
+                self._urls.move_to_end(url)
+                return dict(self._urls[url])
+
+        raw = self._disk_read(self._url_path(url)) if self.disk_dir else None
+        if raw is None:
+            return None
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return None
+        with self._lock:
+            self._url_put(url, entry)
+        return dict(entry)
+
+    def put_url_entry(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        key: Optional[str],
+        digest: Optional[str] = None
+    ):
+        """Remember a URL's validators, the cache key of its OCR text and its content digest"""
+        if not etag and not last_modified:
+            return
+        entry = {'etag': etag, 'last_modified': last_modified, 'key': key, 'digest': digest}
+        with self._lock:
+            self._url_put(url, entry)
+        if self.disk_dir:
+            self._disk_write(self._url_path(url), json.dumps(entry))
+
+    def record_not_modified(self):
+        """Count a download skipped thanks to a 304 response"""
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+    def _url_put(self, url: str, entry: Dict):
+        """Insert into the URL LRU (lock held)"""
+        self._urls[url] = entry
+        self._urls.move_to_end(url)
+        while len(self._urls) > self.memory_entries:
+            self._urls.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _result_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, 'results', key[:2], f'{key}.txt')
+
+    def _url_path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, 'urls', name[:2], f'{name}.json')
+
+    @staticmethod
+    def _disk_read(path: str) -> Optional[str]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            # Touch so eviction treats it as recently used
+            os.utime(path)
+            return text
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _disk_write(self, path: str, text: str):
+        """Write an entry atomically, then evict if over budget"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️  OCR cache write failed: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_usage()
+            else:
+                self._disk_bytes += len(text.encode('utf-8'))
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict()
+
+    def _iter_disk_files(self):
+        for sub in ('results', 'urls'):
+            root_dir = os.path.join(self.disk_dir, sub)
+            for root, _, files in os.walk(root_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    yield path, st
+
+    def _scan_disk_usage(self) -> int:
+        return sum(st.st_size for _, st in self._iter_disk_files())
+
+    def _evict(self):
+        """Delete least recently used files until under 90% of the budget"""
+        files = sorted(self._iter_disk_files(), key=lambda item: item[1].st_mtime)
+        total = sum(st.st_size for _, st in files)
+        target = int(self.disk_max_bytes * 0.9)
+        evicted = 0
+        for path, st in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= st.st_size
+                evicted += 1
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+            self._stats['evictions'] += evicted
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes, for monitoring"""
+        with self._lock:
+            return {
+                **self._stats,
+                'memory_entries': len(self._memory),
+                'disk_bytes': self._disk_bytes,
+            }
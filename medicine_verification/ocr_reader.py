@@ -5,47 +5,228 @@ Supports both Tesseract OCR and EasyOCR
 Can work with local files or Firebase Storage URLs
 """
 
+import concurrent.futures
+import importlib.util
+import io
+import json
+import multiprocessing
 import os
 import re
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 import difflib
-import tempfile
-import requests
+
+from image_downloader import ImageDownloader, ImageTooLargeError
+from matcher import build_match_result
+from ocr_cache import OCRResultCache, content_digest, digest_cache_key, make_cache_key
+from preprocessing import ImagePreprocessor, exif_upright
 
 try:
-    import pytesseract
     from PIL import Image
-    TESSERACT_AVAILABLE = True
+    PIL_AVAILABLE = True
 except ImportError:
-    TESSERACT_AVAILABLE = False
-    print("⚠️  Tesseract not available. Install: pip install pytesseract pillow")
+    PIL_AVAILABLE = False
 
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-    # Initialize EasyOCR reader (this may take a moment on first run)
-    try:
-        easyocr_reader = easyocr.Reader(['en'], gpu=False)
-    except:
-        easyocr_reader = None
-        EASYOCR_AVAILABLE = False
-        print("⚠️  EasyOCR not properly initialized")
-except ImportError:
-    EASYOCR_AVAILABLE = False
-    easyocr_reader = None
+# OCR engines are imported lazily on first use. Only their presence is
+# checked here, so importing this module (and app.py) does not load
+# pytesseract or EasyOCR's model weights.
+TESSERACT_AVAILABLE = PIL_AVAILABLE and importlib.util.find_spec('pytesseract') is not None
+EASYOCR_AVAILABLE = importlib.util.find_spec('easyocr') is not None
+
+if not TESSERACT_AVAILABLE:
+    print("⚠️  Tesseract not available. Install: pip install pytesseract pillow")
+if not EASYOCR_AVAILABLE:
     print("⚠️  EasyOCR not available. Install: pip install easyocr")
 
+_engine_lock = threading.Lock()
+_pytesseract = None
+_easyocr_reader = None
+_easyocr_failed = False
+
+
+def get_pytesseract():
+    """Import pytesseract on first use"""
+    global _pytesseract
+    if _pytesseract is None:
+        with _engine_lock:
+            if _pytesseract is None:
+                import pytesseract
+                _pytesseract = pytesseract
+    return _pytesseract
+
+
+def get_easyocr_reader():
+    """
+    Build the EasyOCR reader on first use (loads model weights)
+    Returns:
+        Shared easyocr.Reader, or None if it could not be initialized
+    """
+    global _easyocr_reader, _easyocr_failed
+    if _easyocr_reader is None and not _easyocr_failed:
+        with _engine_lock:
+            if _easyocr_reader is None and not _easyocr_failed:
+                try:
+                    import easyocr
+                    _easyocr_reader = easyocr.Reader(['en'], gpu=False)
+                except Exception as e:
+                    _easyocr_failed = True
+                    print(f"⚠️  EasyOCR not properly initialized: {e}")
+    return _easyocr_reader
+
+
+def preload_ocr_engines(engines: Optional[List[str]] = None):
+    """
+    Load OCR engines eagerly
+    Called in the gunicorn master with preload_app (see gunicorn.conf.py):
+    workers forked afterwards share the EasyOCR weights copy-on-write
+    instead of each loading a private copy
+    Args:
+        engines: Engine names to load (default: every available engine)
+    """
+    engines = engines or ['tesseract', 'easyocr']
+    if 'tesseract' in engines and TESSERACT_AVAILABLE:
+        get_pytesseract()
+    if 'easyocr' in engines and EASYOCR_AVAILABLE:
+        get_easyocr_reader()
+
+
+# Bump when preprocessing or cleaning changes so cached OCR text is not reused
+OCR_PIPELINE_VERSION = 2
+
+# Tesseract page segmentation: 6 = one uniform block of text, 11 = sparse text
+DEFAULT_PSM = 6
+
+# Passes of tiered extraction, cheapest first
+TIERED_PASSES = ('fast', 'roi', 'full', 'sparse', 'easyocr')
+
+# Passes run by default: every mismatch runs all of them, so EasyOCR (hundreds
+# of MB of model weights loaded in each worker) is opt-in, unless it is the
+# configured engine anyway
+DEFAULT_TIERED_PASSES = ('fast', 'roi', 'full', 'sparse')
+
+TESSERACT_WHITELIST = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,- '
+
+
+class OCRUnavailableError(Exception):
+    """OCR capacity exhausted or broken (queue full, task timed out, worker died); clients should retry later"""
+
+
+class OCRPass(NamedTuple):
+    """One way of reading an image: engine, Tesseract page segmentation and preprocessing"""
+    name: str
+    engine: str
+    psm: int = DEFAULT_PSM
+    preprocessor: Optional[ImagePreprocessor] = None  # None: the reader's own
+    roi: bool = False  # Re-read the most prominent text region closely (see _extract_roi)
+
+
+class OCRWord(NamedTuple):
+    """A recognized word (EasyOCR: text fragment) with its box in the image OCR ran on"""
+    text: str
+    confidence: float  # 0-1
+    left: int
+    top: int
+    width: int
+    height: int
+
+
+class TieredOCRResult(NamedTuple):
+    """Result of OCRReader.extract_text_tiered"""
+    text: str
+    decided_by: str  # Pass whose text is returned
+    accepted: bool  # Stopped early on a confident match
+    passes: List[Dict]  # name, score, ms and cached for every pass that ran
+
+
+# Per-process readers used inside OCR pool workers, by engine and preprocessing
+_worker_readers: Dict[Tuple[str, str], 'OCRReader'] = {}
+
+
+def _pool_extract(
+    ocr_engine: str,
+    image_bytes: bytes,
+    preprocess: bool,
+    preprocess_config: Dict,
+    psm: int = DEFAULT_PSM,
+    roi: bool = False
+):
+    """
+    Run one extraction inside a pool worker process
+    Returns:
+        (text, preprocessing timings to merge into the parent's stats)
+    """
+    key = (ocr_engine, repr(sorted(preprocess_config.items())))
+    reader = _worker_readers.get(key)
+    if reader is None:
+        reader = _worker_readers[key] = OCRReader(ocr_engine, preprocessor=ImagePreprocessor(**preprocess_config))
+    text = reader._extract_local(image_bytes, preprocess, OCRPass(ocr_engine, ocr_engine, psm, roi=roi))
+    return text, reader.preprocessor.pop_timings()
+
 
 class OCRReader:
     """OCR Reader for extracting text from medicine photos"""
     
-    def __init__(self, ocr_engine='tesseract'):
+    def __init__(
+        self,
+        ocr_engine='tesseract',
+        execution_mode: str = 'inline',
+        max_workers: Optional[int] = None,
+        task_timeout: float = 60.0,
+        max_pending: Optional[int] = None,
+        cache: Optional[OCRResultCache] = None,
+        downloader: Optional[ImageDownloader] = None,
+        preprocessor: Optional[ImagePreprocessor] = None,
+        tiered_passes: Optional[List[str]] = None
+    ):
         """
         Initialize OCR Reader
         Args:
             ocr_engine: 'tesseract' or 'easyocr' (default: tesseract)
+            execution_mode: 'inline' runs OCR in the calling thread; 'process'
+                            dispatches it to a bounded process pool so CPU-bound
+                            preprocessing and inference are not serialized by the GIL
+            max_workers: Pool size for 'process' mode (default: CPU count)
+            task_timeout: Seconds to wait for a pooled extraction
+            max_pending: Maximum queued + running pooled extractions before new
+                         ones are rejected with OCRUnavailableError (default: 2 x workers)
+            cache: Optional OCR result cache keyed by image content
+            downloader: Pooled HTTP client for image URLs (default: ImageDownloader())
+            preprocessor: Tesseract preprocessing pipeline (default: ImagePreprocessor())
+            tiered_passes: Passes tried by extract_text_tiered, any of TIERED_PASSES
+                           (default: DEFAULT_TIERED_PASSES, plus easyocr when it is the engine)
+                           (default: all of them; unavailable engines are skipped)
         """
         self.ocr_engine = ocr_engine.lower()
+        self.execution_mode = execution_mode.lower()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.task_timeout = task_timeout
+        self.max_pending = max_pending or self.max_workers * 2
+        self.cache = cache
+        self.downloader = downloader or ImageDownloader()
+        self.preprocessor = preprocessor or ImagePreprocessor()
+        config = self.preprocessor.config()
+        self._fast_config = {**config, 'max_side': 1280, 'target_text_height': 20, 'min_side': 640}
+        # ROI reads locate words on a fast, unrotated image (so boxes map straight
+        # back onto the photo), then re-read the chosen region at higher resolution
+        self._roi_locator = ImagePreprocessor(**{
+            **self._fast_config, 'steps': [s for s in config['steps'] if s not in ('exif', 'deskew', 'crop')]
+        })
+        self._roi_reader = ImagePreprocessor(**{
+            **config, 'steps': [s for s in config['steps'] if s not in ('exif', 'crop')],
+            'target_text_height': 40, 'upscale': True
+        })
+        
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._stats_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'completed': 0, 'rejected': 0, 'timeouts': 0, 'broken_pools': 0}
+        self._tiered = {'runs': 0, 'accepted': 0, 'passes_run': 0}
+        self._tiered_decided_by = Counter()
         
         # Check if selected engine is available
         if self.ocr_engine == 'tesseract' and not TESSERACT_AVAILABLE:
@@ -58,6 +239,41 @@ class OCRReader:
                 self.ocr_engine = 'tesseract'
             else:
                 raise ImportError("Neither Tesseract nor EasyOCR is available. Please install one.")
+        
+        if not tiered_passes:
+            tiered_passes = DEFAULT_TIERED_PASSES + (('easyocr',) if self.ocr_engine == 'easyocr' else ())
+        self.tiered_passes = self._build_passes(tiered_passes)
+    
+    def _build_passes(self, names: List[str]) -> List[OCRPass]:
+        """
+        Turn pass names into OCRPass definitions
+        - fast: Tesseract on a strongly downscaled image
+        - roi: fast read with word boxes, then the most prominent text region
+               (where brand and drug names are printed) re-read at higher resolution
+        - full: Tesseract with the regular preprocessing (same as extract_text)
+        - sparse: Tesseract looking for scattered text (--psm 11)
+        - easyocr: EasyOCR
+        """
+        unknown = set(names) - set(TIERED_PASSES)
+        if unknown:
+            raise ValueError(f"Unknown OCR passes: {', '.join(sorted(unknown))}")
+        passes = []
+        for name in names:
+            if name == 'easyocr':
+                if EASYOCR_AVAILABLE:
+                    passes.append(OCRPass('easyocr', 'easyocr'))
+            elif name == 'roi':
+                if TESSERACT_AVAILABLE or EASYOCR_AVAILABLE:
+                    passes.append(OCRPass('roi', 'tesseract' if TESSERACT_AVAILABLE else 'easyocr', roi=True))
+            elif not TESSERACT_AVAILABLE:
+                continue
+            elif name == 'fast':
+                passes.append(OCRPass('fast', 'tesseract', DEFAULT_PSM, ImagePreprocessor(**self._fast_config)))
+            elif name == 'full':
+                passes.append(OCRPass('full', 'tesseract'))
+            elif name == 'sparse':
+                passes.append(OCRPass('sparse', 'tesseract', 11))
+        return passes or [OCRPass(self.ocr_engine, self.ocr_engine)]
     
     def extract_text(self, image_path_or_url: str, preprocess: bool = True) -> str:
         """
@@ -76,96 +292,639 @@ class OCRReader:
         if not os.path.exists(image_path_or_url):
             raise FileNotFoundError(f"Image file not found: {image_path_or_url}")
         
+        with open(image_path_or_url, 'rb') as f:
+            image_bytes = f.read()
+        return self.extract_text_from_bytes(image_bytes, preprocess)
+    
+    def extract_text_from_bytes(self, image_bytes: bytes, preprocess: bool = True) -> str:
+        """
+        Extract text from an encoded image held in memory (no temp files)
+        Args:
+            image_bytes: Encoded image (JPEG, PNG, ...), e.g. an upload's contents
+            preprocess: Whether to preprocess image before OCR
+        Returns:
+            Extracted text string
+        """
+        text, _ = self._extract_bytes(image_bytes, preprocess)
+        return text
+    
+    def cache_settings(self, preprocess: bool, ocr_pass: Optional[OCRPass] = None) -> str:
+        """Signature of everything besides the image that affects OCR output"""
+        engine = ocr_pass.engine if ocr_pass else self.ocr_engine
+        roi_setting = ''
+        if ocr_pass and ocr_pass.roi:
+            roi_setting = '|roi'
+            if engine == 'tesseract':
+                roi_setting += f'={self._roi_locator.signature()}/{self._roi_reader.signature()}'
+        if engine != 'tesseract':
+            return f'{engine}|preprocess={int(preprocess)}{roi_setting}|v{OCR_PIPELINE_VERSION}'
+        preprocessor = (ocr_pass and ocr_pass.preprocessor) or self.preprocessor
+        steps = preprocessor.signature() if preprocess else 0
+        psm = ocr_pass.psm if ocr_pass else DEFAULT_PSM
+        # The default page segmentation is left out, keeping keys from before passes existed
+        psm_setting = f'|psm={psm}' if psm != DEFAULT_PSM else ''
+        return f'{engine}|preprocess={steps}{psm_setting}{roi_setting}|v{OCR_PIPELINE_VERSION}'
+    
+    def _extract_bytes(self, image_bytes: bytes, preprocess: bool, ocr_pass: Optional[OCRPass] = None):
+        """
+        Extract text from image bytes, consulting the result cache
+        Args:
+            ocr_pass: How to read the image (default: the reader's engine and settings)
+        Returns:
+            (text, cache key or None when caching is disabled)
+        """
+        key = None
+        if self.cache:
+            key = make_cache_key(image_bytes, self.cache_settings(preprocess, ocr_pass))
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, key
+        return self._run_extraction(image_bytes, preprocess, ocr_pass, key), key
+    
+    def _run_extraction(
+        self,
+        image_bytes: bytes,
+        preprocess: bool,
+        ocr_pass: Optional[OCRPass],
+        key: Optional[str]
+    ) -> str:
+        """Run OCR (inline or pooled) and cache a non-empty result under key"""
         try:
-            if self.ocr_engine == 'tesseract':
-                return self._extract_with_tesseract(image_path_or_url, preprocess)
-            elif self.ocr_engine == 'easyocr':
-                return self._extract_with_easyocr(image_path_or_url)
+            if self.execution_mode == 'process':
+                text = self._extract_in_pool(image_bytes, preprocess, ocr_pass)
             else:
-                raise ValueError(f"Unknown OCR engine: {self.ocr_engine}")
+                text = self._extract_local(image_bytes, preprocess, ocr_pass)
+        except OCRUnavailableError:
+            raise
+        except MemoryError:
+            # Out of memory is the server's problem, not an unreadable photo
+            raise OCRUnavailableError('OCR ran out of memory, please retry shortly')
         except Exception as e:
             print(f"❌ OCR extraction error: {e}")
             return ""
+        
+        # Empty text usually means a failed read; let the next attempt retry
+        if self.cache and key and text:
+            self.cache.put(key, text)
+        return text
+    
+    def _extract_local(self, image_bytes: bytes, preprocess: bool, ocr_pass: Optional[OCRPass] = None) -> str:
+        """Run the configured engine (or the pass's) in the current process"""
+        engine = ocr_pass.engine if ocr_pass else self.ocr_engine
+        if ocr_pass and ocr_pass.roi:
+            return self._extract_roi(image_bytes, preprocess, engine)
+        if engine == 'tesseract':
+            return self._extract_with_tesseract(
+                image_bytes, preprocess,
+                psm=ocr_pass.psm if ocr_pass else DEFAULT_PSM,
+                preprocessor=ocr_pass.preprocessor if ocr_pass else None
+            )
+        elif engine == 'easyocr':
+            return self._extract_with_easyocr(image_bytes)
+        else:
+            raise ValueError(f"Unknown OCR engine: {engine}")
+    
+    def _get_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Create the process pool on first use (and again after fork)"""
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                # spawn: workers must not inherit server threads or torch state
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pool_pid = os.getpid()
+            return self._pool
+    
+    def _discard_pool(self, pool: concurrent.futures.ProcessPoolExecutor):
+        """Drop a broken pool so the next extraction starts a new one"""
+        with self._pool_lock:
+            if self._pool is not pool:
+                return  # Already replaced by another thread
+            self._pool = None
+        self._count('broken_pools')
+        print("❌ OCR worker process died, restarting the pool")
+        pool.shutdown(wait=False)
+    
+    def _extract_in_pool(self, image_bytes: bytes, preprocess: bool, ocr_pass: Optional[OCRPass] = None) -> str:
+        """
+        Run an extraction in the process pool with back-pressure
+        Raises:
+            OCRUnavailableError: If max_pending extractions are already in flight,
+                                 the task does not finish within task_timeout, or
+                                 a pool worker died (the pool is rebuilt on the next call)
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise OCRUnavailableError('OCR service is busy, please retry shortly')
+        
+        engine = ocr_pass.engine if ocr_pass else self.ocr_engine
+        preprocessor = (ocr_pass and ocr_pass.preprocessor) or self.preprocessor
+        pool = self._get_pool()
+        try:
+            future = pool.submit(
+                _pool_extract, engine, image_bytes, preprocess, preprocessor.config(),
+                ocr_pass.psm if ocr_pass else DEFAULT_PSM, bool(ocr_pass and ocr_pass.roi)
+            )
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard_pool(pool)
+            raise OCRUnavailableError('OCR worker crashed, please retry shortly')
+        except Exception:
+            self._slots.release()
+            raise
+        self._count('submitted')
+        # The slot is held until the worker really finishes, even after a timeout
+        future.add_done_callback(lambda _: self._slots.release())
+        
+        try:
+            text, (runs, timings) = future.result(timeout=self.task_timeout)
+        except concurrent.futures.TimeoutError:
+            self._count('timeouts')
+            raise OCRUnavailableError(f'OCR timed out after {self.task_timeout:g}s')
+        except BrokenProcessPool:
+            # A worker died (OOM kill, engine segfault): the pool accepts no more tasks
+            self._discard_pool(pool)
+            raise OCRUnavailableError('OCR worker crashed, please retry shortly')
+        self._count('completed')
+        preprocessor.merge_timings(runs, timings)
+        return text
+    
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+    
+    def stats(self) -> Dict:
+        """Execution counters for monitoring"""
+        with self._stats_lock:
+            return {
+                'engine': self.ocr_engine,
+                'execution_mode': self.execution_mode,
+                'max_workers': self.max_workers if self.execution_mode == 'process' else None,
+                'max_pending': self.max_pending if self.execution_mode == 'process' else None,
+                **self._stats,
+                'cache': self.cache.stats() if self.cache else None,
+                'preprocess': self.preprocessor.stats(),
+                'tiered': {
+                    'passes': [p.name for p in self.tiered_passes],
+                    **self._tiered,
+                    'decided_by': dict(self._tiered_decided_by)
+                }
+            }
     
     def extract_text_from_url(self, image_url: str, preprocess: bool = True) -> str:
         """
         Extract text from image URL (Firebase Storage or HTTP)
-        Downloads image temporarily, processes it, then deletes it
+        The body is streamed into memory (bounded by the downloader's
+        max_bytes) and decoded there; nothing is written to disk
         Args:
             image_url: URL to image (Firebase Storage URL or any HTTP/HTTPS URL)
             preprocess: Whether to preprocess image before OCR
         Returns:
             Extracted text string
+        Raises:
+            ImageTooLargeError: The image exceeds the downloader's max_bytes
         """
-        temp_file = None
         try:
-            # Download image from URL
-            response = requests.get(image_url, timeout=30, stream=True)
-            response.raise_for_status()
-            
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-            temp_file.write(response.content)
-            temp_file.close()
+            cached, download = self._fetch_url(image_url)
+            if cached is not None:
+                return cached
             
             # Extract text using OCR
-            text = self.extract_text(temp_file.name, preprocess)
-            
+            text, key = self._extract_bytes(download.content, preprocess)
+            self._remember_url(image_url, download, text, key)
             return text
+        except (OCRUnavailableError, ImageTooLargeError):
+            raise
         except Exception as e:
             print(f"❌ Error downloading/processing image from URL: {e}")
             return ""
-        finally:
-            # Clean up temporary file
-            if temp_file and os.path.exists(temp_file.name):
-                try:
-                    os.unlink(temp_file.name)
-                except:
-                    pass
     
-    def _extract_with_tesseract(self, image_path: str, preprocess: bool) -> str:
+    def _fetch_url(self, image_url: str):
+        """
+        Download an image, revalidating a previously seen URL with the server
+        Returns:
+            (cached text, None) if the image is unchanged and its text is cached,
+            otherwise (None, Download)
+        """
+        url_entry, download = self._conditional_fetch(image_url)
+        if url_entry is not None:
+            cached = self.cache.get(url_entry['key'])
+            if cached is not None:
+                self.cache.record_not_modified()
+                return cached, None
+            # Result was evicted: fetch the body after all
+            download = self.downloader.fetch(image_url)
+        return None, download
+    
+    def _conditional_fetch(self, image_url: str):
+        """
+        Download an image unless the server confirms the copy we saw last is unchanged
+        Returns:
+            (URL cache entry, None) on 304 Not Modified, otherwise (None, Download)
+        """
+        url_entry = self.cache.get_url_entry(image_url) if self.cache else None
+        headers = {}
+        if url_entry:
+            if url_entry.get('etag'):
+                headers['If-None-Match'] = url_entry['etag']
+            if url_entry.get('last_modified'):
+                headers['If-Modified-Since'] = url_entry['last_modified']
+        
+        download = self.downloader.fetch(image_url, headers=headers)
+        if download.not_modified:
+            if url_entry:
+                return url_entry, None
+            download = self.downloader.fetch(image_url)
+        return None, download
+    
+    def _remember_url(self, image_url: str, download, text: str, key: Optional[str]):
+        """Store a URL's validators so the next request can skip the download"""
+        if self.cache and text:
+            self.cache.put_url_entry(
+                image_url,
+                download.headers.get('ETag'),
+                download.headers.get('Last-Modified'),
+                key,
+                content_digest(download.content)
+            )
+    
+    def open_image(self, image: Union[str, bytes], preprocess: bool = True) -> 'ImageSource':
+        """
+        Open an image for several readers: OCR and checks on its bytes
+        A URL seen before is revalidated with the server (ETag/Last-Modified);
+        if unchanged, nothing is downloaded unless a result is not cached
+        Args:
+            image: Image bytes, local path or HTTP/HTTPS URL
+            preprocess: Whether to preprocess the image before OCR
+        Returns:
+            ImageSource for extract_text_tiered, extract_text_from_source and derived values
+        """
+        return ImageSource(self, image, preprocess)
+    
+    def extract_text_from_source(self, source: 'ImageSource') -> str:
+        """
+        Extract text from an open_image() source with the default pass
+        Returns:
+            Extracted text string
+        """
+        text, _ = source.extract(None)
+        source.remember()
+        return text
+    
+    def extract_text_tiered(
+        self,
+        image: Union[str, bytes, 'ImageSource'],
+        score: Callable[[str], float],
+        accept_score: float = 0.85,
+        preprocess: bool = True
+    ) -> TieredOCRResult:
+        """
+        Read an image with increasingly expensive passes until one is good enough
+        Passes run cheapest first (see tiered_passes). After each, score(text)
+        rates the text, e.g. the best match confidence against the user's
+        registered medicines, and extraction stops once it reaches accept_score.
+        If no pass gets there, the best-scoring text is returned.
+        Each pass's text is cached by image content like extract_text's.
+        Args:
+            image: Image bytes, local path, HTTP/HTTPS URL or an open_image() source
+            score: Rates extracted text, higher is better
+            accept_score: Score at which to stop early
+            preprocess: Whether to preprocess images before OCR
+        Returns:
+            TieredOCRResult
+        Raises:
+            OCRUnavailableError: Pool busy or timed out (process mode)
+        """
+        source = image if isinstance(image, ImageSource) else ImageSource(self, image, preprocess)
+        best = None
+        passes = []
+        result = None
+        for ocr_pass in self.tiered_passes:
+            started = time.perf_counter()
+            text, cached = source.extract(ocr_pass)
+            pass_score = score(text) if text else 0.0
+            passes.append({
+                'name': ocr_pass.name,
+                'score': round(pass_score, 3),
+                'ms': round((time.perf_counter() - started) * 1000, 1),
+                'cached': cached
+            })
+            # Later passes are more thorough: they win ties
+            if best is None or pass_score >= best[0]:
+                best = (pass_score, text, ocr_pass.name)
+            if pass_score >= accept_score:
+                result = TieredOCRResult(text, ocr_pass.name, True, passes)
+                break
+        if result is None:
+            result = TieredOCRResult(best[1], best[2], False, passes)
+        
+        source.remember()
+        with self._stats_lock:
+            self._tiered['runs'] += 1
+            self._tiered['accepted'] += int(result.accepted)
+            self._tiered['passes_run'] += len(passes)
+            self._tiered_decided_by[result.decided_by] += 1
+        return result
+    
+    def extract_texts(
+        self,
+        images: List[Union[str, bytes]],
+        preprocess: bool = True,
+        download_workers: int = 8
+    ) -> List[Union[str, Exception]]:
+        """
+        Extract text from several images at once
+        URLs are downloaded concurrently, cached results are reused, and the
+        remaining images are OCR'd together (EasyOCR batches same-size images;
+        Tesseract and process-pool extractions run in parallel)
+        Args:
+            images: Image URLs and/or encoded image bytes
+            preprocess: Whether to preprocess images before OCR
+            download_workers: Concurrent downloads
+        Returns:
+            Per image, in input order: the extracted text, or the exception
+            that prevented it (e.g. a failed download)
+        """
+        results: List[Union[str, Exception, None]] = [None] * len(images)
+        pending: Dict[int, bytes] = {}
+        downloads = {}
+        
+        url_indices = [i for i, image in enumerate(images) if isinstance(image, str)]
+        if url_indices:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(download_workers, len(url_indices)),
+                thread_name_prefix='ocr-download'
+            ) as executor:
+                futures = {executor.submit(self._fetch_url, images[i]): i for i in url_indices}
+                for future in concurrent.futures.as_completed(futures):
+                    i = futures[future]
+                    try:
+                        cached, download = future.result()
+                    except Exception as e:
+                        print(f"❌ Error downloading image from URL: {e}")
+                        results[i] = e
+                        continue
+                    if cached is not None:
+                        results[i] = cached
+                    else:
+                        pending[i] = download.content
+                        downloads[i] = download
+        
+        for i, image in enumerate(images):
+            if isinstance(image, bytes):
+                pending[i] = image
+        
+        indices = list(pending)
+        for i, result in zip(indices, self._extract_batch([pending[i] for i in indices], preprocess)):
+            results[i] = result
+            if i in downloads and isinstance(result, str):
+                key = make_cache_key(pending[i], self.cache_settings(preprocess)) if self.cache else None
+                self._remember_url(images[i], downloads[i], result, key)
+        return results
+    
+    def _extract_batch(self, images: List[bytes], preprocess: bool) -> List[Union[str, Exception]]:
+        """OCR a list of image bytes, consulting the result cache"""
+        if not images:
+            return []
+        
+        if self.ocr_engine == 'easyocr' and self.execution_mode == 'inline':
+            results: List[Union[str, Exception, None]] = [None] * len(images)
+            keys = [None] * len(images)
+            misses = []
+            for i, image_bytes in enumerate(images):
+                if self.cache:
+                    keys[i] = make_cache_key(image_bytes, self.cache_settings(preprocess))
+                    results[i] = self.cache.get(keys[i])
+                if results[i] is None:
+                    misses.append(i)
+            
+            texts = self._extract_with_easyocr_batch([images[i] for i in misses])
+            for i, text in zip(misses, texts):
+                results[i] = text
+                if self.cache and text:
+                    self.cache.put(keys[i], text)
+            return results
+        
+        # Tesseract runs as a subprocess and pooled extractions run in other
+        # processes, so threads give real parallelism here
+        workers = self.max_workers if self.execution_mode == 'process' else (os.cpu_count() or 1)
+        
+        def extract(image_bytes):
+            try:
+                return self._extract_bytes(image_bytes, preprocess)[0]
+            except Exception as e:
+                return e
+        
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(workers, len(images)),
+            thread_name_prefix='ocr-batch'
+        ) as executor:
+            return list(executor.map(extract, images))
+    
+    def _extract_with_tesseract(
+        self,
+        image_bytes: bytes,
+        preprocess: bool,
+        psm: int = DEFAULT_PSM,
+        preprocessor: Optional[ImagePreprocessor] = None
+    ) -> str:
         """Extract text using Tesseract OCR"""
         try:
-            image = Image.open(image_path)
+            pytesseract = get_pytesseract()
             
-            # Preprocess image for better OCR results
+            # Preprocess image for better OCR results (orientation, downscaling,
+            # binarization, deskew; see preprocessing.py)
             if preprocess:
-                # Convert to RGB if needed
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                
-                # Enhance contrast and resize if too small
-                from PIL import ImageEnhance, ImageFilter
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(2.0)
-                
-                # Apply slight sharpening
-                image = image.filter(ImageFilter.SHARPEN)
+                image = (preprocessor or self.preprocessor).run(image_bytes)
+            else:
+                image = Image.open(io.BytesIO(image_bytes))
             
             # Run OCR
-            custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,- '
-            text = pytesseract.image_to_string(image, config=custom_config)
+            text = pytesseract.image_to_string(image, config=self._tesseract_config(psm))
             
             return self._clean_text(text)
         except Exception as e:
             print(f"Tesseract OCR error: {e}")
             return ""
     
-    def _extract_with_easyocr(self, image_path: str) -> str:
+    @staticmethod
+    def _tesseract_config(psm: int = DEFAULT_PSM) -> str:
+        return f'--oem 3 --psm {psm} -c tessedit_char_whitelist={TESSERACT_WHITELIST}'
+    
+    def extract_words(self, image_bytes: bytes, preprocess: bool = True) -> List[OCRWord]:
+        """
+        Structured OCR: every word with its bounding box and confidence
+        Runs in the calling thread and is not cached
+        Args:
+            image_bytes: Encoded image
+            preprocess: Whether to preprocess the image (Tesseract)
+        Returns:
+            Words in reading order; boxes are in pixels of the image the engine
+            read (for Tesseract, the preprocessed image)
+        """
+        if self.ocr_engine == 'tesseract':
+            image = self.preprocessor.run(image_bytes) if preprocess else Image.open(io.BytesIO(image_bytes))
+            return self._tesseract_words(image, DEFAULT_PSM)
+        return self._easyocr_words(image_bytes)
+    
+    def _tesseract_words(self, image, psm: int) -> List[OCRWord]:
+        """Words from pytesseract.image_to_data"""
+        pytesseract = get_pytesseract()
+        data = pytesseract.image_to_data(
+            image, config=self._tesseract_config(psm), output_type=pytesseract.Output.DICT
+        )
+        words = []
+        for i, text in enumerate(data['text']):
+            text = text.strip()
+            confidence = float(data['conf'][i])
+            if not text or confidence < 0:
+                continue
+            words.append(OCRWord(
+                text, confidence / 100,
+                int(data['left'][i]), int(data['top'][i]), int(data['width'][i]), int(data['height'][i])
+            ))
+        return words
+    
+    @staticmethod
+    def _easyocr_words(image) -> List[OCRWord]:
+        """Text fragments from EasyOCR readtext (image: encoded bytes or RGB array)"""
+        easyocr_reader = get_easyocr_reader()
+        if easyocr_reader is None:
+            raise RuntimeError("EasyOCR reader not initialized")
+        words = []
+        for corners, text, confidence in easyocr_reader.readtext(image):
+            xs = [point[0] for point in corners]
+            ys = [point[1] for point in corners]
+            words.append(OCRWord(
+                text, float(confidence),
+                int(min(xs)), int(min(ys)), int(max(xs) - min(xs)), int(max(ys) - min(ys))
+            ))
+        return words
+    
+    @staticmethod
+    def _prominent_region(words: List[OCRWord], size: Tuple[int, int]) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Box around the largest confidently read text, where brand and drug
+        names are usually printed
+        Returns:
+            (left, top, right, bottom) with a margin, or None if there is no
+            clear region (nothing confident, or it covers most of the image)
+        """
+        confident = [w for w in words if w.confidence >= 0.6 and sum(c.isalpha() for c in w.text) >= 4]
+        if not confident:
+            return None
+        tallest = max(w.height for w in confident)
+        prominent = [w for w in confident if w.height >= tallest * 0.75]
+        width, height = size
+        left = max(0, min(w.left for w in prominent) - tallest)
+        top = max(0, min(w.top for w in prominent) - tallest // 2)
+        right = min(width, max(w.left + w.width for w in prominent) + tallest)
+        bottom = min(height, max(w.top + w.height for w in prominent) + tallest // 2)
+        if (right - left) * (bottom - top) > 0.6 * width * height:
+            return None
+        return left, top, right, bottom
+    
+    def _extract_roi(self, image_bytes: bytes, preprocess: bool, engine: str) -> str:
+        """
+        Read the whole image quickly with word boxes, then re-read its most
+        prominent text region at higher resolution
+        Returns:
+            Region text followed by the whole-image text
+        """
+        if engine == 'tesseract' and not preprocess:
+            return self._extract_with_tesseract(image_bytes, preprocess)
+        try:
+            original = exif_upright(Image.open(io.BytesIO(image_bytes)))
+            if engine == 'tesseract':
+                located = self._roi_locator.process(original)
+                words = self._tesseract_words(located, DEFAULT_PSM)
+                frame_text = self._clean_text(' '.join(w.text for w in words))
+            else:
+                import numpy as np  # EasyOCR depends on NumPy
+                located = original.convert('RGB')
+                located.thumbnail((1280, 1280))
+                words = self._easyocr_words(np.asarray(located))
+                frame_text = self._clean_text(' '.join(w.text for w in words if w.confidence > 0.5))
+            
+            region = self._prominent_region(words, located.size)
+            if region is None:
+                return frame_text
+            scale = original.width / located.width
+            crop = original.crop(tuple(round(v * scale) for v in region))
+            
+            if engine == 'tesseract':
+                roi_image = self._roi_reader.process(crop)
+                roi_text = self._clean_text(get_pytesseract().image_to_string(roi_image, config=self._tesseract_config()))
+            else:
+                roi_text = self._join_easyocr_results(get_easyocr_reader().readtext(np.asarray(crop.convert('RGB'))))
+            return ' '.join(text for text in (roi_text, frame_text) if text)
+        except Exception as e:
+            print(f"ROI OCR error: {e}")
+            return ""
+    
+    def _extract_with_easyocr(self, image_bytes: bytes) -> str:
         """Extract text using EasyOCR"""
         try:
+            easyocr_reader = get_easyocr_reader()
             if easyocr_reader is None:
                 raise RuntimeError("EasyOCR reader not initialized")
             
-            results = easyocr_reader.readtext(image_path)
-            text_parts = [result[1] for result in results if result[2] > 0.5]  # Confidence threshold
-            text = ' '.join(text_parts)
-            
-            return self._clean_text(text)
+            # EasyOCR decodes encoded bytes in memory (cv2.imdecode)
+            results = easyocr_reader.readtext(image_bytes)
+            return self._join_easyocr_results(results)
         except Exception as e:
             print(f"EasyOCR error: {e}")
             return ""
     
+    def _extract_with_easyocr_batch(self, images: List[bytes]) -> List[str]:
+        """
+        Extract text from several images with EasyOCR
+        readtext_batched needs equally sized images, so images are grouped by
+        size; singletons (and any failed batch) fall back to readtext
+        """
+        texts = [""] * len(images)
+        groups = defaultdict(list)
+        for i, image_bytes in enumerate(images):
+            groups[self._decoded_size(image_bytes)].append(i)
+        
+        for size, indices in groups.items():
+            if size is not None and len(indices) > 1:
+                try:
+                    easyocr_reader = get_easyocr_reader()
+                    if easyocr_reader is None:
+                        raise RuntimeError("EasyOCR reader not initialized")
+                    batch = easyocr_reader.readtext_batched([images[i] for i in indices])
+                    for i, results in zip(indices, batch):
+                        texts[i] = self._join_easyocr_results(results)
+                    continue
+                except Exception as e:
+                    print(f"⚠️  EasyOCR batch failed, reading images one by one: {e}")
+            for i in indices:
+                texts[i] = self._extract_with_easyocr(images[i])
+        return texts
+    
+    @staticmethod
+    def _decoded_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+        """Image size after EXIF rotation (as OpenCV decodes it), from the header only"""
+        if not PIL_AVAILABLE:
+            return None
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            width, height = image.size
+            # Orientations 5-8 rotate by 90 degrees
+            if image.getexif().get(0x0112) in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+        except Exception:
+            return None
+    
+    def _join_easyocr_results(self, results) -> str:
+        """Join confident EasyOCR detections into cleaned text"""
+        text_parts = [result[1] for result in results if result[2] > 0.5]  # Confidence threshold
+        text = ' '.join(text_parts)
+        return self._clean_text(text)
+    
     def _clean_text(self, text: str) -> str:
         """Clean and normalize extracted text"""
         if not text:
@@ -201,7 +960,8 @@ class OCRReader:
     
     def compare_text(self, patient_text: str, registered_name: str, registered_ocr: str = "") -> Dict:
         """
-        Compare patient photo OCR text with registered medicine
+        Compare patient photo OCR text with one registered medicine
+        (see matcher.MedicineMatcher to score all of a user's medicines at once)
         Args:
             patient_text: OCR text from patient photo
             registered_name: Registered medicine name
@@ -231,32 +991,106 @@ class OCRReader:
         common_words = registered_words.intersection(patient_words)
         word_match_ratio = len(common_words) / len(registered_words) if registered_words else 0
         
-        # Calculate overall confidence
-        confidence = 0.0
-        if direct_match:
-            confidence = 0.95
-        elif word_match_ratio >= 0.8:
-            confidence = 0.85
-        elif similarity >= 0.7:
-            confidence = similarity
-        elif ocr_match:
-            confidence = 0.75
-        elif word_match_ratio >= 0.5:
-            confidence = word_match_ratio * 0.7
+        # Calculate overall confidence and match status (threshold: 0.6)
+        return build_match_result(
+            patient_text, registered_name, direct_match, similarity,
+            word_match_ratio, ocr_match, common_words
+        )
+
+
+class ImageSource:
+    """
+    An image opened once for OCR and the other checks run on it (photo
+    hash, visual fingerprint); see OCRReader.open_image
+    Bytes are loaded once, and for an unchanged URL (304 Not Modified) only
+    when some pass (or derived value) is not already cached
+    """
+
+    def __init__(self, reader: OCRReader, image: Union[str, bytes], preprocess: bool):
+        self.reader = reader
+        self.preprocess = preprocess
+        self.url = None
+        self.download = None
+        self.image_bytes = None
+        self.digest = None
+
+        if isinstance(image, bytes):
+            self._set_bytes(image)
+        elif image.startswith('http://') or image.startswith('https://'):
+            self.url = image
+            url_entry, download = reader._conditional_fetch(image)
+            if url_entry is not None and url_entry.get('digest'):
+                self.digest = url_entry['digest']
+                reader.cache.record_not_modified()
+            else:
+                self.download = download or reader.downloader.fetch(image)
+                self._set_bytes(self.download.content)
         else:
-            confidence = similarity * 0.5
-        
-        # Determine match status (threshold: 0.6)
-        match = confidence >= 0.6
-        
-        return {
-            'match': match,
-            'confidence': round(confidence, 3),
-            'direct_match': direct_match,
-            'similarity': round(similarity, 3),
-            'word_match_ratio': round(word_match_ratio, 3),
-            'ocr_match': ocr_match,
-            'common_words': list(common_words),
-            'registered_name': registered_name,
-            'patient_text': patient_text[:100]  # First 100 chars for reference
-        }
+            if not os.path.exists(image):
+                raise FileNotFoundError(f"Image file not found: {image}")
+            with open(image, 'rb') as f:
+                self._set_bytes(f.read())
+
+    def _set_bytes(self, image_bytes: bytes):
+        self.image_bytes = image_bytes
+        self.digest = content_digest(image_bytes)
+
+    def _key(self, ocr_pass: Optional[OCRPass]) -> Optional[str]:
+        if not self.reader.cache:
+            return None
+        return digest_cache_key(self.digest, self.reader.cache_settings(self.preprocess, ocr_pass))
+
+    def load_bytes(self) -> bytes:
+        """The image bytes, fetching the body of an unchanged URL if not loaded yet"""
+        if self.image_bytes is None:
+            self.download = self.reader.downloader.fetch(self.url)
+            self._set_bytes(self.download.content)
+        return self.image_bytes
+
+    def derived(self, name: str, compute: Callable[[bytes], Any]) -> Any:
+        """
+        A value computed from the image bytes (e.g. its perceptual hash),
+        cached by content digest next to the OCR text, so an unchanged URL
+        needs no download for it either
+        Args:
+            name: What the value is, including anything it depends on (e.g. a version)
+            compute: Computes the value from the bytes; a None result is not cached
+        Returns:
+            The (JSON-serializable) value, or None
+        """
+        key = digest_cache_key(self.digest, f'derived:{name}') if self.reader.cache else None
+        if key:
+            cached = self.reader.cache.get(key)
+            if cached is not None:
+                return json.loads(cached)
+        value = compute(self.load_bytes())
+        if key and value is not None:
+            self.reader.cache.put(key, json.dumps(value))
+        return value
+
+    def extract(self, ocr_pass: Optional[OCRPass]) -> Tuple[str, bool]:
+        """
+        Returns:
+            (text, whether it came from the cache)
+        """
+        key = self._key(ocr_pass)
+        if key:
+            cached = self.reader.cache.get(key)
+            if cached is not None:
+                return cached, True
+        if self.image_bytes is None:
+            # Unchanged URL, but this pass has not been cached: fetch the body after all
+            self.load_bytes()
+            key = self._key(ocr_pass)
+        return self.reader._run_extraction(self.image_bytes, self.preprocess, ocr_pass, key), False
+
+    def remember(self):
+        """Store a downloaded URL's validators and digest for the next request"""
+        if self.url and self.download is not None and self.reader.cache:
+            self.reader.cache.put_url_entry(
+                self.url,
+                self.download.headers.get('ETag'),
+                self.download.headers.get('Last-Modified'),
+                self._key(None),
+                self.digest
+            )
@@ -0,0 +1,299 @@
+"""
+Notification Outbox Module
+Durable queue of verification notifications, sent by background dispatcher
+threads so the verify request never waits on SMTP or SMS gateways
+- Entries live in a SQLite table; with the SQLite storage backend it is the
+  medicines database itself, and an entry is inserted in the same
+  transaction as its verification record (a saved verification always has
+  its notification queued, and a crash loses neither)
+- Every server worker process runs dispatcher threads, started on its
+  first use of the outbox (so none run in a gunicorn master that loaded the
+  app before forking); an entry is claimed with a lease, so one abandoned
+  by a dead process is picked up again
+- Failed sends are retried with exponential backoff, up to max_attempts
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Entry states
+QUEUED = 'queued'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        notification_id TEXT PRIMARY KEY,
+        verification_id TEXT,
+        user_id TEXT,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        result TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at TEXT,
+        sent_at TEXT,
+        next_attempt REAL,
+        lease_until REAL,
+        finished_ts REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_due ON notification_outbox(status, next_attempt);
+    CREATE INDEX IF NOT EXISTS idx_outbox_verification ON notification_outbox(verification_id);
+"""
+
+class NotificationRetry(Exception):
+    """Raised by a send function when nothing could be delivered and a later attempt may succeed"""
+
+
+def insert_entry(conn: sqlite3.Connection, entry: Dict):
+    """Insert an outbox entry on a connection (the caller owns the transaction)"""
+    conn.execute(
+        'INSERT INTO notification_outbox '
+        '(notification_id, verification_id, user_id, status, payload, created_at, next_attempt) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (entry['notification_id'], entry['verification_id'], entry['user_id'], QUEUED,
+         json.dumps(entry['payload']), entry['created_at'], 0)
+    )
+
+
+class NotificationOutbox:
+    """SQLite-backed outbox with in-process dispatcher threads"""
+
+    def __init__(
+        self,
+        db_path: str,
+        send: Optional[Callable[[Dict], Dict]] = None,
+        dispatchers: int = 1,
+        max_attempts: int = 5,
+        retry_delay: float = 30.0,
+        lease_seconds: float = 300.0,
+        retention_seconds: float = 7 * 24 * 3600,
+        poll_interval: float = 1.0
+    ):
+        """
+        Initialize the outbox (dispatchers start on first use in each process)
+        Args:
+            db_path: SQLite file holding the outbox table (e.g. the medicines database)
+            send: Delivers one entry's payload and returns its status; raises
+                  NotificationRetry (or any error) to have it retried. Without
+                  it nothing is dispatched until set_sender() is called
+            dispatchers: Dispatcher threads in this process
+            max_attempts: Attempts before an entry is marked failed
+            retry_delay: Wait before the first retry; doubles with every attempt
+            lease_seconds: A send not finished within this time is considered
+                           abandoned (e.g. its process died) and retried
+            retention_seconds: How long finished entries are kept for status queries
+            poll_interval: How often idle dispatchers look for due entries (seconds)
+        """
+        self.db_path = db_path
+        self.send = send
+        self.dispatchers = max(1, dispatchers)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+
+        self._local = threading.local()
+        self._start_lock = threading.Lock()
+        self._pid = None  # process the dispatchers run in
+        self._wakeup = threading.Event()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection (reopened after fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_dispatchers(self):
+        """Start this process's dispatcher threads unless they are running"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            self._purge_lock = threading.Lock()
+            self._last_purge = time.monotonic()
+            self._threads = []
+            for i in range(self.dispatchers):
+                thread = threading.Thread(target=self._dispatch_loop, name=f'outbox-dispatcher-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def set_sender(self, send: Callable[[Dict], Dict]):
+        """Set the function that delivers entries (does not start the dispatchers)"""
+        self.send = send
+        self._wakeup.set()
+
+    def shares_database(self, db_path: Optional[str]) -> bool:
+        """Whether entries can be inserted in the same transaction as writes to db_path"""
+        return bool(db_path) and os.path.abspath(db_path) == os.path.abspath(self.db_path)
+
+    @staticmethod
+    def new_entry(verification_id: str, user_id: str, payload: Dict) -> Dict:
+        """
+        Build an entry for insert_entry() or enqueue()
+        Args:
+            verification_id: Verification the notification is about
+            user_id: Patient user ID
+            payload: JSON-serializable arguments for the send function
+        """
+        return {
+            'notification_id': str(uuid.uuid4()),
+            'verification_id': verification_id,
+            'user_id': user_id,
+            'payload': payload,
+            'created_at': datetime.now().isoformat(),
+        }
+
+    def enqueue(self, entry: Dict) -> str:
+        """Queue an entry in its own transaction; returns its notification ID"""
+        insert_entry(self._connect(), entry)
+        self.notify()
+        return entry['notification_id']
+
+    def notify(self):
+        """Wake the dispatchers, starting them if needed (an entry was added on another connection)"""
+        self._ensure_dispatchers()
+        self._wakeup.set()
+
+    def get_for_verification(self, verification_id: str) -> List[Dict]:
+        """
+        Delivery status of a verification's notifications
+        Returns:
+            Entries (without payload), oldest first
+        """
+        self._ensure_dispatchers()
+        rows = self._connect().execute(
+            'SELECT * FROM notification_outbox WHERE verification_id = ? ORDER BY created_at',
+            (verification_id,)
+        ).fetchall()
+        return [self._public(row) for row in rows]
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict:
+        next_attempt = row['next_attempt']
+        return {
+            'notification_id': row['notification_id'],
+            'verification_id': row['verification_id'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'error': row['error'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'created_at': row['created_at'],
+            'sent_at': row['sent_at'],
+            'next_attempt_at': datetime.fromtimestamp(next_attempt).isoformat()
+            if row['status'] == QUEUED and next_attempt else None,
+        }
+
+    def _claim(self) -> Optional[Dict]:
+        """Atomically move the oldest due (or abandoned) entry to sending"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT * FROM notification_outbox '
+                'WHERE (status = ? AND next_attempt <= ?) OR (status = ? AND lease_until < ?) '
+                'ORDER BY next_attempt, created_at LIMIT 1',
+                (QUEUED, now, SENDING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                'UPDATE notification_outbox SET status = ?, attempts = attempts + 1, lease_until = ? '
+                'WHERE notification_id = ?',
+                (SENDING, now + self.lease_seconds, row['notification_id'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return {
+            'notification_id': row['notification_id'],
+            'payload': json.loads(row['payload']),
+            'attempts': row['attempts'] + 1,
+        }
+
+    def _finish(self, notification_id: str, result: Dict):
+        self._connect().execute(
+            'UPDATE notification_outbox SET status = ?, result = ?, error = NULL, sent_at = ?, '
+            'lease_until = NULL, finished_ts = ? WHERE notification_id = ?',
+            (SENT, json.dumps(result), datetime.now().isoformat(), time.time(), notification_id)
+        )
+
+    def _fail(self, notification_id: str, attempts: int, error: str):
+        """Schedule a retry, or give up after max_attempts"""
+        if attempts >= self.max_attempts:
+            self._connect().execute(
+                'UPDATE notification_outbox SET status = ?, error = ?, lease_until = NULL, finished_ts = ? '
+                'WHERE notification_id = ?',
+                (FAILED, error, time.time(), notification_id)
+            )
+            return
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        self._connect().execute(
+            'UPDATE notification_outbox SET status = ?, error = ?, next_attempt = ?, lease_until = NULL '
+            'WHERE notification_id = ?',
+            (QUEUED, error, time.time() + delay, notification_id)
+        )
+
+    def _dispatch_loop(self):
+        """Claim and send due entries until the process exits"""
+        while True:
+            entry = self._claim() if self.send else None
+            if entry is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                self._maybe_purge()
+                continue
+
+            try:
+                result = self.send(entry['payload'])
+                self._finish(entry['notification_id'], result)
+            except Exception as e:
+                print(f"❌ Notification {entry['notification_id']} attempt {entry['attempts']} failed: {e}")
+                self._fail(entry['notification_id'], entry['attempts'], str(e))
+
+    def _maybe_purge(self):
+        """Drop expired finished entries, at most once a minute per process"""
+        with self._purge_lock:
+            if time.monotonic() - self._last_purge < 60:
+                return
+            self._last_purge = time.monotonic()
+        try:
+            self._connect().execute(
+                'DELETE FROM notification_outbox WHERE finished_ts IS NOT NULL AND finished_ts < ?',
+                (time.time() - self.retention_seconds,)
+            )
+        except Exception as e:
+            print(f"⚠️  Outbox purge failed: {e}")
+
+    def stats(self) -> Dict:
+        """Entry counts by status, for monitoring"""
+        self._ensure_dispatchers()
+        counts = {QUEUED: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        for status, count in self._connect().execute(
+            'SELECT status, COUNT(*) FROM notification_outbox GROUP BY status'
+        ):
+            counts[status] = count
+        return counts
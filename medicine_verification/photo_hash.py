@@ -0,0 +1,221 @@
+"""
+Photo Hash Module
+Detects near-duplicate patient photos (burst shots, re-sent photos)
+- 256-bit perceptual hash (pHash: low frequencies of the DCT of a 64x64
+  grayscale thumbnail; dHash, a PIL-only gradient hash, without NumPy)
+- Photos within a few bits of each other count as the same photo, even
+  after recompression, resizing or a slight camera shift. The hash is
+  finer than the usual 64 bits: at 8x8 two different labels photographed
+  on the same table hash alike, since the printed text barely registers
+- The hash is stored in the verification record, so a repeat is found
+  among the user's recent verifications by every worker process; photos
+  still being verified in this process are tracked too, so a burst waits
+  for the first photo's result instead of running OCR again
+"""
+
+import io
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+HASH_SIZE = 16  # 16x16 = 256 bits
+PHASH_SAMPLE = 64  # thumbnail side the DCT is taken of
+# Which hash image_hash() returns, for caching hashes by image
+HASH_KIND = f"{'phash' if NUMPY_AVAILABLE else 'dhash'}:{HASH_SIZE * HASH_SIZE}"
+
+_dct_matrix = None
+
+
+def _get_dct_matrix():
+    """Orthonormal DCT-II basis, first HASH_SIZE rows (cached)"""
+    global _dct_matrix
+    if _dct_matrix is None:
+        n = np.arange(PHASH_SAMPLE)
+        k = np.arange(HASH_SIZE)[:, None]
+        _dct_matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * PHASH_SAMPLE)) * np.sqrt(2 / PHASH_SAMPLE)
+    return _dct_matrix
+
+
+def phash(image: Image.Image) -> int:
+    """Perceptual hash: low-frequency DCT coefficients above their median"""
+    small = image.convert('L').resize((PHASH_SAMPLE, PHASH_SAMPLE), Image.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float64)
+    dct = _get_dct_matrix()
+    coefficients = (dct @ pixels @ dct.T).flatten()
+    # The DC term only reflects overall brightness
+    median = np.median(coefficients[1:])
+    return int(''.join('1' if c > median else '0' for c in coefficients), 2)
+
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash: whether each pixel is brighter than its right neighbour"""
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return bits
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """
+    Perceptual hash of an encoded image
+    Returns:
+        'phash:<64 hex digits>' ('dhash:...' without NumPy)
+    """
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft('L', (PHASH_SAMPLE * 4, PHASH_SAMPLE * 4))  # JPEG: decode at reduced size
+        digits = HASH_SIZE * HASH_SIZE // 4
+        if NUMPY_AVAILABLE:
+            return f'phash:{phash(image):0{digits}x}'
+        return f'dhash:{dhash(image):0{digits}x}'
+
+
+def hash_distance(a: str, b: str) -> Optional[int]:
+    """Differing bits between two hashes, or None if they are of different kinds"""
+    kind_a, _, value_a = a.partition(':')
+    kind_b, _, value_b = b.partition(':')
+    if kind_a != kind_b:
+        return None
+    return bin(int(value_a, 16) ^ int(value_b, 16)).count('1')
+
+
+class _Claim:
+    """A photo being verified in this process"""
+
+    def __init__(self, user_id: str, photo_hash: str, scope: Tuple[str, ...]):
+        self.user_id = user_id
+        self.photo_hash = photo_hash
+        self.scope = scope
+        self.done = threading.Event()
+        self.verification_id = None
+
+
+class DuplicateDetector:
+    """Finds a user's earlier verification of (nearly) the same photo"""
+
+    def __init__(self, window_seconds: float = 120.0, max_distance: int = 16, wait_timeout: float = 60.0):
+        """
+        Initialize the detector
+        Args:
+            window_seconds: How far back a photo counts as a repeat (0 disables detection)
+            max_distance: Largest number of differing hash bits still treated as the same photo
+            wait_timeout: Longest wait for a duplicate photo still being verified
+        """
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self.wait_timeout = wait_timeout
+
+        self._lock = threading.Lock()
+        self._claims: Dict[str, List[_Claim]] = {}
+        self._stats = {'checked': 0, 'duplicates': 0, 'waited': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def _same_photo(self, photo_hash: str, other_hash: Optional[str]) -> bool:
+        if not other_hash:
+            return False
+        distance = hash_distance(photo_hash, other_hash)
+        return distance is not None and distance <= self.max_distance
+
+    def acquire(
+        self,
+        user_id: str,
+        photo_hash: str,
+        scope: Iterable[str],
+        load_recent: Callable[[], List[Dict]]
+    ) -> Tuple[Optional[str], Optional[_Claim]]:
+        """
+        Look for an earlier verification of the same photo
+        Args:
+            user_id: Patient user ID
+            photo_hash: image_hash() of the new photo
+            scope: IDs of the medicines it is verified against; a repeat only
+                   counts if the earlier verification covered the same ones
+            load_recent: Returns the user's recent verification records, newest first
+        Returns:
+            (verification ID, None) for a duplicate, otherwise (None, claim);
+            pass the claim to release() once the photo's verification is saved
+        """
+        scope = tuple(sorted(scope))
+        with self._lock:
+            self._stats['checked'] += 1
+            pending = next((
+                c for c in self._claims.get(user_id, [])
+                if c.scope == scope and self._same_photo(photo_hash, c.photo_hash)
+            ), None)
+            if pending is None:
+                claim = _Claim(user_id, photo_hash, scope)
+                self._claims.setdefault(user_id, []).append(claim)
+
+        if pending is not None:
+            # Burst shot: reuse the result of the photo already being verified
+            pending.done.wait(self.wait_timeout)
+            with self._lock:
+                self._stats['waited'] += 1
+                if pending.verification_id:
+                    self._stats['duplicates'] += 1
+            return pending.verification_id, None
+
+        previous = self.find_recent(photo_hash, scope, load_recent())
+        if previous:
+            self.release(claim, previous)
+            with self._lock:
+                self._stats['duplicates'] += 1
+            return previous, None
+        return None, claim
+
+    def find_recent(self, photo_hash: str, scope: Tuple[str, ...], records: List[Dict]) -> Optional[str]:
+        """ID of the newest record within the window with a matching hash and scope"""
+        now = datetime.now()
+        for record in records:
+            try:
+                age = (now - datetime.fromisoformat(record.get('verified_at') or '')).total_seconds()
+            except ValueError:
+                continue
+            if age > self.window_seconds:
+                break  # Newest first
+            record_scope = tuple(sorted(r.get('medicine_id') for r in record.get('verification_results', [])))
+            if record_scope == scope and self._same_photo(photo_hash, record.get('photo_hash')):
+                return record.get('verification_id')
+        return None
+
+    def release(self, claim: Optional[_Claim], verification_id: Optional[str] = None):
+        """
+        Finish a claim from acquire(), handing its result to any duplicates waiting on it
+        Args:
+            claim: Claim returned by acquire() (None is ignored)
+            verification_id: ID of the saved verification (None if it failed)
+        """
+        if claim is None:
+            return
+        with self._lock:
+            claims = self._claims.get(claim.user_id, [])
+            if claim in claims:
+                claims.remove(claim)
+            if not claims:
+                self._claims.pop(claim.user_id, None)
+        claim.verification_id = verification_id
+        claim.done.set()
+
+    def stats(self) -> Dict:
+        """Duplicate counters, for monitoring"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'window_seconds': self.window_seconds,
+                'in_flight': sum(len(c) for c in self._claims.values()),
+                **self._stats,
+            }
@@ -0,0 +1,130 @@
+"""
+Photo Store Module
+Persists original uploaded photos off the request path
+- OCR works on the upload held in memory; keeping the original on disk
+  is optional and done by a background writer thread
+- Writes are atomic (temp file + rename), so a stored path never points
+  at a half-written image
+"""
+
+import concurrent.futures
+import os
+import threading
+from typing import Dict, Optional
+
+
+class PhotoStore:
+    """Optional, asynchronous storage of original photos"""
+
+    def __init__(
+        self,
+        root: str,
+        enabled: bool = True,
+        background: bool = True,
+        max_queued_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Initialize the photo store
+        Args:
+            root: Base directory (e.g. the uploads folder)
+            enabled: If False, save() keeps nothing and returns None
+            background: Write on a background thread instead of the caller's
+            max_queued_bytes: Photos waiting for the writer are held in memory;
+                              beyond this budget save() writes synchronously
+        """
+        self.root = root
+        self.enabled = enabled
+        self.background = background
+        self.max_queued_bytes = max_queued_bytes
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._queued_bytes = 0
+        self._stats = {'saved': 0, 'failed': 0, 'sync_fallbacks': 0}
+
+    def path_for(self, subdir: str, filename: str) -> str:
+        return os.path.join(self.root, subdir, filename)
+
+    def write(self, subdir: str, filename: str, data: bytes) -> str:
+        """
+        Write a photo now, whether or not persistence is enabled
+        Used when another component needs the file (e.g. an async job)
+        Returns:
+            Path of the stored photo
+        """
+        path = self.path_for(subdir, filename)
+        self._write_file(path, data)
+        with self._lock:
+            self._stats['saved'] += 1
+        return path
+
+    def save(self, subdir: str, filename: str, data: bytes) -> Optional[str]:
+        """
+        Keep a copy of a photo if persistence is enabled
+        Returns:
+            Path the photo is (or shortly will be) stored at, or None if disabled
+        """
+        if not self.enabled:
+            return None
+        if not self.background:
+            return self.write(subdir, filename, data)
+
+        with self._lock:
+            queue_full = self._queued_bytes + len(data) > self.max_queued_bytes
+            if queue_full:
+                self._stats['sync_fallbacks'] += 1
+            else:
+                self._queued_bytes += len(data)
+        if queue_full:
+            return self.write(subdir, filename, data)
+
+        path = self.path_for(subdir, filename)
+        self._get_executor().submit(self._write_queued, path, data)
+        return path
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Create the writer thread on first use (and again after fork)"""
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='photo-store'
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _write_queued(self, path: str, data: bytes):
+        try:
+            self._write_file(path, data)
+            with self._lock:
+                self._stats['saved'] += 1
+        except Exception as e:
+            print(f"⚠️  Failed to store photo {path}: {e}")
+            with self._lock:
+                self._stats['failed'] += 1
+        finally:
+            with self._lock:
+                self._queued_bytes -= len(data)
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def stats(self) -> Dict:
+        """Write counters, for monitoring"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'background': self.background,
+                'queued_bytes': self._queued_bytes,
+                **self._stats,
+            }
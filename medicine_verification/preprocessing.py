@@ -0,0 +1,321 @@
+"""
+Preprocessing Module
+Prepares medicine photos for Tesseract
+- EXIF orientation, so phone photos are read upright
+- Adaptive downscaling: full-resolution phone photos (12+ MP) dominate OCR
+  latency, so images are shrunk until the estimated text height is near
+  what Tesseract reads best (and never past a maximum side length)
+- Grayscale, adaptive thresholding, deskew and an optional label-region crop
+  with OpenCV/NumPy
+- Per-step timing, so accuracy can be traded against latency
+- Without OpenCV, falls back to the PIL contrast boost and sharpen
+"""
+
+import io
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+except ImportError:
+    # Only needed for Tesseract, which already requires Pillow (see ocr_reader)
+    Image = None
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+    print("⚠️  OpenCV not available, using basic PIL preprocessing. Install: pip install opencv-python numpy")
+
+# Steps in the order they run (grayscale first: later steps touch a third
+# of the data); 'crop' is opt-in
+PREPROCESS_STEPS = ('exif', 'grayscale', 'downscale', 'threshold', 'deskew', 'crop')
+DEFAULT_STEPS = ('exif', 'grayscale', 'downscale', 'threshold', 'deskew')
+
+EXIF_ORIENTATION = 0x0112
+
+
+def exif_upright(image: 'Image.Image') -> 'Image.Image':
+    """Apply the EXIF orientation (exif_transpose copies even when nothing needs rotating)"""
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        return ImageOps.exif_transpose(image)
+    return image
+
+
+class ImagePreprocessor:
+    """Configurable OCR preprocessing pipeline with per-step timing"""
+
+    def __init__(
+        self,
+        steps: Iterable[str] = DEFAULT_STEPS,
+        target_text_height: int = 32,
+        max_side: int = 2400,
+        min_side: int = 800,
+        threshold_block: int = 31,
+        threshold_offset: int = 15,
+        max_skew: float = 10.0,
+        upscale: bool = False
+    ):
+        """
+        Initialize the pipeline
+        Args:
+            steps: Steps to run, any of PREPROCESS_STEPS (always run in that order)
+            target_text_height: Character height in pixels to downscale towards
+            max_side: Images are always shrunk to at most this many pixels per side
+            min_side: Text-height downscaling never goes below this side length
+            threshold_block: Neighbourhood size (odd) for adaptive thresholding
+            threshold_offset: Constant subtracted from the neighbourhood mean
+            max_skew: Largest rotation (degrees) deskew searches and corrects
+            upscale: Also enlarge images whose text is smaller than the target
+                     (up to 3x), e.g. a small region cropped for a closer read
+        Raises:
+            ValueError: Unknown step name
+        """
+        steps = [s.strip().lower() for s in steps if s.strip()]
+        unknown = set(steps) - set(PREPROCESS_STEPS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing steps: {', '.join(sorted(unknown))}")
+        self.steps = [s for s in PREPROCESS_STEPS if s in steps]
+        self.target_text_height = target_text_height
+        self.max_side = max_side
+        self.min_side = min_side
+        self.threshold_block = threshold_block | 1
+        self.threshold_offset = threshold_offset
+        self.max_skew = max_skew
+        self.upscale = upscale
+
+        self._lock = threading.Lock()
+        self._timings: Dict[str, List[float]] = {}
+        self._runs = 0
+
+    def config(self) -> Dict:
+        """Constructor arguments, e.g. to rebuild the pipeline in a worker process"""
+        return {
+            'steps': list(self.steps),
+            'target_text_height': self.target_text_height,
+            'max_side': self.max_side,
+            'min_side': self.min_side,
+            'threshold_block': self.threshold_block,
+            'threshold_offset': self.threshold_offset,
+            'max_skew': self.max_skew,
+            'upscale': self.upscale,
+        }
+
+    def signature(self) -> str:
+        """Short description of the settings, part of the OCR cache key"""
+        if not CV2_AVAILABLE:
+            return 'pil'
+        return (f"{'+'.join(self.steps)}:h{self.target_text_height}:s{self.min_side}-{self.max_side}"
+                f":t{self.threshold_block},{self.threshold_offset}:k{self.max_skew:g}"
+                f"{':up' if self.upscale else ''}")
+
+    def run(self, image_bytes: bytes) -> 'Image.Image':
+        """
+        Decode and preprocess an image
+        Args:
+            image_bytes: Encoded image file contents
+        Returns:
+            Image ready for Tesseract
+        """
+        started = time.perf_counter()
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+        return self.process(image, {'decode': time.perf_counter() - started})
+
+    def process(self, image: 'Image.Image', timings: Optional[Dict[str, float]] = None) -> 'Image.Image':
+        """
+        Preprocess a decoded image (e.g. a region cropped from a photo)
+        Args:
+            image: PIL image
+            timings: Step timings measured so far (e.g. decoding), recorded with this run's
+        Returns:
+            Image ready for Tesseract
+        """
+        timings = dict(timings or {})
+        if 'exif' in self.steps:
+            started = time.perf_counter()
+            image = exif_upright(image)
+            timings['exif'] = time.perf_counter() - started
+
+        if not CV2_AVAILABLE:
+            started = time.perf_counter()
+            image = self._pil_fallback(image)
+            timings['pil_enhance'] = time.perf_counter() - started
+            self._record(timings)
+            return image
+
+        started = time.perf_counter()
+        array = np.asarray(image.convert('RGB') if image.mode not in ('RGB', 'L') else image)
+        timings['decode'] = timings.get('decode', 0.0) + time.perf_counter() - started
+        for step in self.steps:
+            if step == 'exif':
+                continue
+            started = time.perf_counter()
+            array = getattr(self, f'_{step}')(array)
+            timings[step] = time.perf_counter() - started
+
+        self._record(timings)
+        return Image.fromarray(array)
+
+    def _pil_fallback(self, image: 'Image.Image') -> 'Image.Image':
+        """Original pipeline: contrast boost and sharpen, plus the size cap"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if 'downscale' in self.steps and max(image.size) > self.max_side:
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        image = ImageEnhance.Contrast(image).enhance(2.0)
+        return image.filter(ImageFilter.SHARPEN)
+
+    # ------------------------------------------------------------------
+    # Steps (NumPy arrays in, NumPy arrays out)
+    # ------------------------------------------------------------------
+
+    def _downscale(self, array):
+        """Shrink so text is near target_text_height (and no side exceeds max_side), in one resize"""
+        height, width = array.shape[:2]
+        longest = max(height, width)
+        scale = min(1.0, self.max_side / longest)
+
+        # Estimate on a reduced copy: text height scales linearly with the image
+        probe_scale = min(1.0, 1200 / longest)
+        probe = array
+        if probe_scale < 1.0:
+            probe = cv2.resize(array, (round(width * probe_scale), round(height * probe_scale)),
+                               interpolation=cv2.INTER_LINEAR)
+        text_height = self._estimate_text_height(probe)
+        if text_height:
+            text_scale = self.target_text_height / (text_height / probe_scale)
+            scale = min(scale, max(text_scale, self.min_side / longest))
+
+        if scale < 0.9:
+            array = cv2.resize(array, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        elif self.upscale and text_height and text_scale > 1.2:
+            scale = min(text_scale, 3.0, self.max_side / longest)
+            if scale > 1.0:
+                array = cv2.resize(array, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_CUBIC)
+        return array
+
+    def _estimate_text_height(self, array) -> Optional[float]:
+        """Median height of character-sized connected components, or None if unclear"""
+        gray = self._grayscale(array)
+        binary = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, self.threshold_block, self.threshold_offset
+        )
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        heights = stats[1:, cv2.CC_STAT_HEIGHT]
+        widths = stats[1:, cv2.CC_STAT_WIDTH]
+        # Character-like: not specks, not lines or blobs
+        plausible = (heights >= 6) & (heights <= gray.shape[0] / 8) & (widths <= heights * 2) & (widths >= heights / 10)
+        if np.count_nonzero(plausible) < 8:
+            return None
+        return float(np.median(heights[plausible]))
+
+    @staticmethod
+    def _grayscale(array):
+        return array if array.ndim == 2 else cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+
+    def _threshold(self, array):
+        """Adaptive threshold: copes with glare and shadows across curved labels"""
+        gray = self._grayscale(array)
+        return cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, self.threshold_block, self.threshold_offset
+        )
+
+    def _deskew(self, array):
+        """Rotate by the angle whose horizontal projection profile is sharpest"""
+        angle = self._estimate_skew(array)
+        if abs(angle) < 0.5:
+            return array
+        height, width = array.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        border = 255 if array.ndim == 2 else (255, 255, 255)
+        return cv2.warpAffine(array, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=border)
+
+    def _estimate_skew(self, array) -> float:
+        gray = self._grayscale(array)
+        # Search on a small copy: the angle does not depend on resolution
+        scale = min(1.0, 600 / max(gray.shape))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+        _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        ink = ink.astype(np.float32)
+        height, width = ink.shape
+        center = (width / 2, height / 2)
+
+        def sharpness(angle):
+            rotated = cv2.warpAffine(ink, cv2.getRotationMatrix2D(center, angle, 1.0), (width, height))
+            profile = rotated.sum(axis=1)
+            return float(np.sum(np.diff(profile) ** 2))
+
+        coarse = np.arange(-self.max_skew, self.max_skew + 0.01, 1.0)
+        best = max(coarse, key=sharpness)
+        fine = np.arange(best - 0.75, best + 0.76, 0.25)
+        return float(max(fine, key=sharpness))
+
+    def _crop(self, array):
+        """Crop to the region holding most of the text (the label), with a margin"""
+        gray = self._grayscale(array)
+        ink = cv2.bitwise_not(self._threshold(gray))
+        # Merge characters into text blocks
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, gray.shape[1] // 40), max(3, gray.shape[0] // 80)))
+        blocks = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, kernel)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(blocks, connectivity=8)
+        if count <= 1:
+            return array
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = stats[1:][areas >= areas.max() * 0.1]
+        x0 = keep[:, cv2.CC_STAT_LEFT].min()
+        y0 = keep[:, cv2.CC_STAT_TOP].min()
+        x1 = (keep[:, cv2.CC_STAT_LEFT] + keep[:, cv2.CC_STAT_WIDTH]).max()
+        y1 = (keep[:, cv2.CC_STAT_TOP] + keep[:, cv2.CC_STAT_HEIGHT]).max()
+        margin = self.target_text_height
+        height, width = array.shape[:2]
+        x0, y0 = max(0, x0 - margin), max(0, y0 - margin)
+        x1, y1 = min(width, x1 + margin), min(height, y1 + margin)
+        if (x1 - x0) * (y1 - y0) < 0.05 * width * height:
+            # Suspiciously small: probably a logo or speck, keep everything
+            return array
+        return array[y0:y1, x0:x1]
+
+    # ------------------------------------------------------------------
+    # Timing
+    # ------------------------------------------------------------------
+
+    def _record(self, timings: Dict[str, float]):
+        self.merge_timings(1, {step: [seconds] for step, seconds in timings.items()})
+
+    def pop_timings(self) -> Tuple[int, Dict[str, List[float]]]:
+        """Take the recorded timings (used to ship them out of pool workers)"""
+        with self._lock:
+            runs, timings = self._runs, self._timings
+            self._runs, self._timings = 0, {}
+            return runs, timings
+
+    def merge_timings(self, runs: int, timings: Dict[str, List[float]]):
+        """Add timings recorded elsewhere (e.g. by a pool worker)"""
+        with self._lock:
+            self._runs += runs
+            for step, values in timings.items():
+                self._timings.setdefault(step, []).extend(values)
+                del self._timings[step][:-1000]
+
+    def stats(self) -> Dict:
+        """Per-step latency (mean and p95 over the last 1000 runs), for monitoring"""
+        with self._lock:
+            timings = {step: sorted(values) for step, values in self._timings.items()}
+            runs = self._runs
+        return {
+            'opencv': CV2_AVAILABLE,
+            'steps': list(self.steps),
+            'runs': runs,
+            'step_ms': {
+                step: {
+                    'mean': round(sum(values) / len(values) * 1000, 2),
+                    'p95': round(values[int(len(values) * 0.95)] * 1000, 2),
+                }
+                for step, values in timings.items() if values
+            },
+        }
@@ -0,0 +1,203 @@
+"""
+SMTP Pool Module
+Reuses authenticated SMTP sessions for notification emails
+- Sessions (connect, STARTTLS, login) are kept open and shared by the sending
+  threads instead of being set up and torn down for every email
+- A session idle for more than a few seconds is checked with NOOP before it
+  is reused; one that fails the check, or has been idle longer than servers
+  usually keep a connection, is replaced
+- All emails of one notification are sent over one session; if the session
+  drops mid-way, the unsent emails are retried once on a new session
+- Counters for monitoring
+"""
+
+import os
+import smtplib
+import threading
+import time
+from email.message import Message
+from typing import Dict, List, Optional, Tuple
+
+# Refused by the server for this message only; the session is still usable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPPool:
+    """Pool of authenticated SMTP sessions to one server"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = '',
+        password: str = '',
+        use_tls: bool = True,
+        max_connections: int = 4,
+        noop_interval: float = 10.0,
+        max_idle: float = 120.0,
+        timeout: float = 30.0
+    ):
+        """
+        Initialize the pool (sessions are opened on first use)
+        Args:
+            host: SMTP server
+            port: SMTP port
+            username: Login user (no login if empty)
+            password: Login password
+            use_tls: Upgrade sessions with STARTTLS
+            max_connections: Sessions open at once; more senders wait for one
+            noop_interval: Sessions idle longer than this are checked with NOOP before reuse
+            max_idle: Sessions idle longer than this are closed instead of reused
+            timeout: Socket timeout for connecting and each command (seconds)
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_connections = max(1, max_connections)
+        self.noop_interval = noop_interval
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+        self._stats = {
+            'connects': 0, 'reuses': 0, 'noop_checks': 0, 'stale': 0,
+            'reconnects': 0, 'messages': 0, 'failures': 0,
+        }
+
+    def _reset(self):
+        """Forget this process's sessions (after fork they belong to the parent)"""
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._pid = os.getpid()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self._stats['connects'] += 1
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        """Take an idle session (checked if needed) or open a new one"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            slots = self._slots
+        slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    server, last_used = self._idle.pop()
+                idle_for = time.monotonic() - last_used
+                if idle_for > self.max_idle:
+                    self._close(server)
+                    continue
+                if idle_for > self.noop_interval:
+                    with self._lock:
+                        self._stats['noop_checks'] += 1
+                    try:
+                        healthy = server.noop()[0] == 250
+                    except Exception:
+                        healthy = False
+                    if not healthy:
+                        with self._lock:
+                            self._stats['stale'] += 1
+                        server.close()
+                        continue
+                with self._lock:
+                    self._stats['reuses'] += 1
+                return server
+            return self._connect()
+        except Exception:
+            slots.release()
+            raise
+
+    def _checkin(self, server: smtplib.SMTP, healthy: bool):
+        """Return a session to the pool, or close it if it is broken"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return  # Checked out before a fork; the parent owns it
+            if healthy:
+                self._idle.append((server, time.monotonic()))
+            slots = self._slots
+        if not healthy:
+            server.close()
+        slots.release()
+
+    def send(self, messages: List[Message]) -> List[Optional[str]]:
+        """
+        Send messages over one session
+        Args:
+            messages: Complete emails (From/To headers set)
+        Returns:
+            Per message: None if the server accepted it, otherwise the error
+        """
+        results: List[Optional[str]] = [None] * len(messages)
+        pending = list(range(len(messages)))
+        error = None
+        for attempt in range(2):
+            if attempt:
+                with self._lock:
+                    self._stats['reconnects'] += 1
+            try:
+                server = self._checkout()
+            except Exception as e:
+                error = e
+                break
+
+            healthy = True
+            try:
+                while pending:
+                    index = pending[0]
+                    try:
+                        server.send_message(messages[index])
+                    except MESSAGE_ERRORS as e:
+                        results[index] = str(e)
+                    pending.pop(0)
+            except Exception as e:
+                # Connection lost or unusable: retry the rest on a new session
+                healthy = False
+                error = e
+            finally:
+                self._checkin(server, healthy)
+            if not pending:
+                break
+
+        for index in pending:
+            results[index] = str(error)
+        with self._lock:
+            self._stats['messages'] += len(messages)
+            self._stats['failures'] += sum(result is not None for result in results)
+        return results
+
+    def close(self):
+        """Close all idle sessions"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+    def stats(self) -> Dict:
+        """Session and message counters, for monitoring"""
+        with self._lock:
+            return {'idle_sessions': len(self._idle), **self._stats}
@@ -0,0 +1,687 @@
+"""
+Storage Backends Module
+Pluggable persistence for medicines and verification records
+Supports the legacy JSON files and an indexed SQLite database (WAL mode)
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from file_lock import FileLock, atomic_write_json
+from journal import VerificationJournal
+from outbox import insert_entry
+
+
+# (version before, version after) of the medicines collection for one write
+VersionChange = Tuple[Any, Any]
+
+
+class StorageBackend:
+    """Interface implemented by every MedicineManager storage backend"""
+
+    def medicines_version(self) -> Any:
+        """
+        Cheap token that changes whenever any process modifies medicines
+        Used by MedicineManager's cache to detect other workers' writes
+        """
+        raise NotImplementedError
+
+    def add_medicine(self, record: Dict, match_artifact: Optional[Dict] = None) -> VersionChange:
+        """
+        Persist a medicine record (must contain medicine_id)
+        Args:
+            record: Medicine record
+            match_artifact: Precomputed matching data, stored apart from the
+                            record so verification can load it alone
+        """
+        raise NotImplementedError
+
+    def get_medicine(self, medicine_id: str) -> Optional[Dict]:
+        """Return a medicine record or None"""
+        raise NotImplementedError
+
+    def get_user_medicines(self, user_id: str) -> List[Dict]:
+        """Return a user's medicines in registration order"""
+        raise NotImplementedError
+
+    def delete_medicine(self, medicine_id: str) -> Optional[VersionChange]:
+        """Delete a medicine, returning None if it does not exist"""
+        raise NotImplementedError
+
+    def get_match_artifact(self, medicine_id: str) -> Optional[Dict]:
+        """Return a medicine's stored match artifact, or None (unknown medicine or none stored)"""
+        return None
+
+    def get_user_match_artifacts(self, user_id: str) -> List[Tuple[str, Optional[Dict]]]:
+        """
+        Return (medicine_id, match artifact or None) for a user's medicines,
+        in registration order, without loading the full records where possible
+        """
+        return [(record['medicine_id'], None) for record in self.get_user_medicines(user_id)]
+
+    def set_match_artifact(self, medicine_id: str, match_artifact: Dict) -> None:
+        """Store a match artifact computed after registration (optional backfill)"""
+        pass
+
+    def add_verification(self, record: Dict) -> None:
+        """Persist a verification record (must contain verification_id)"""
+        raise NotImplementedError
+
+    def get_verification(self, verification_id: str) -> Optional[Dict]:
+        """Return a verification record or None"""
+        raise NotImplementedError
+
+    def get_user_verifications(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """Return a user's verifications, newest first"""
+        raise NotImplementedError
+
+    def get_user_verifications_page(
+        self, user_id: str, limit: int, before: Optional[Dict] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Return one page of a user's verifications, newest first
+        This fallback materializes and sorts the whole history; indexed
+        backends override it to read only the requested page
+        Args:
+            user_id: User ID
+            limit: Page size
+            before: Cursor returned with the previous page (None for the first page)
+        Returns:
+            (records, cursor for the next page or None)
+        """
+        records = self.get_user_verifications(user_id)
+        records.sort(key=lambda x: (x.get('verified_at', ''), x.get('verification_id', '')), reverse=True)
+        if before:
+            boundary = (before.get('t', ''), before.get('id', ''))
+            records = [
+                r for r in records
+                if (r.get('verified_at', ''), r.get('verification_id', '')) < boundary
+            ]
+        page = records[:limit]
+        next_cursor = None
+        if len(records) > limit:
+            last = page[-1]
+            next_cursor = {'t': last.get('verified_at', ''), 'id': last.get('verification_id', '')}
+        return page, next_cursor
+
+    def close(self):
+        """Release any open resources"""
+        pass
+
+
+class JSONStorage(StorageBackend):
+    """
+    Legacy storage: one JSON document per collection
+    Every read parses the whole file and every write rewrites it.
+    Writes hold a cross-process lock for the whole read-modify-write cycle
+    and replace the file atomically, so concurrent workers never lose records
+    """
+
+    def __init__(self, medicines_file: str, verifications_file: str):
+        """
+        Initialize JSON storage
+        Args:
+            medicines_file: Path to medicines.json
+            verifications_file: Path to verifications.json
+        """
+        self.medicines_file = medicines_file
+        self.verifications_file = verifications_file
+        self._locks = {
+            medicines_file: FileLock(medicines_file + '.lock'),
+            verifications_file: FileLock(verifications_file + '.lock'),
+        }
+        self._ensure_data_files()
+
+    def _ensure_data_files(self):
+        """Create data files if they don't exist"""
+        for path in (self.medicines_file, self.verifications_file):
+            with self._locks[path]:
+                if not os.path.exists(path):
+                    atomic_write_json(path, {})
+
+    def _load(self, path: str) -> Dict:
+        """Load a JSON collection"""
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save(self, path: str, data: Dict):
+        """Save a JSON collection (caller holds the file's lock)"""
+        atomic_write_json(path, data)
+
+    @staticmethod
+    def _index_user(collection: Dict, user_id: Optional[str], record_id: str):
+        """Add a record ID to the collection's 'users' index"""
+        if not user_id:
+            return
+        collection.setdefault('users', {}).setdefault(user_id, []).append(record_id)
+
+    @staticmethod
+    def _user_records(collection: Dict, user_id: str) -> List[Dict]:
+        """Collect a user's records, using the 'users' index when present"""
+        if 'users' in collection and user_id in collection['users']:
+            return [collection[rid] for rid in collection['users'][user_id] if rid in collection]
+        # Fallback: search all records
+        return [
+            data for rid, data in collection.items()
+            if rid != 'users' and data.get('user_id') == user_id
+        ]
+
+    def medicines_version(self) -> Any:
+        # Every save replaces the file, so inode/mtime/size change on each write
+        try:
+            st = os.stat(self.medicines_file)
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return None
+
+    # Key under which the JSON collection keeps a medicine's match artifact
+    ARTIFACT_KEY = '_match_artifact'
+
+    @classmethod
+    def _public(cls, record: Optional[Dict]) -> Optional[Dict]:
+        """A stored medicine without its internal match artifact"""
+        if record is None or cls.ARTIFACT_KEY not in record:
+            return record
+        return {k: v for k, v in record.items() if k != cls.ARTIFACT_KEY}
+
+    def add_medicine(self, record: Dict, match_artifact: Optional[Dict] = None) -> VersionChange:
+        with self._locks[self.medicines_file]:
+            before = self.medicines_version()
+            medicines = self._load(self.medicines_file)
+            stored = dict(record)
+            if match_artifact is not None:
+                stored[self.ARTIFACT_KEY] = match_artifact
+            medicines[record['medicine_id']] = stored
+            self._index_user(medicines, record.get('user_id'), record['medicine_id'])
+            self._save(self.medicines_file, medicines)
+            return before, self.medicines_version()
+
+    def get_medicine(self, medicine_id: str) -> Optional[Dict]:
+        if medicine_id == 'users':
+            return None
+        return self._public(self._load(self.medicines_file).get(medicine_id))
+
+    def get_user_medicines(self, user_id: str) -> List[Dict]:
+        return [self._public(r) for r in self._user_records(self._load(self.medicines_file), user_id)]
+
+    def get_match_artifact(self, medicine_id: str) -> Optional[Dict]:
+        if medicine_id == 'users':
+            return None
+        return (self._load(self.medicines_file).get(medicine_id) or {}).get(self.ARTIFACT_KEY)
+
+    def get_user_match_artifacts(self, user_id: str) -> List[Tuple[str, Optional[Dict]]]:
+        return [
+            (record['medicine_id'], record.get(self.ARTIFACT_KEY))
+            for record in self._user_records(self._load(self.medicines_file), user_id)
+        ]
+
+    def set_match_artifact(self, medicine_id: str, match_artifact: Dict) -> None:
+        with self._locks[self.medicines_file]:
+            medicines = self._load(self.medicines_file)
+            if medicine_id == 'users' or medicine_id not in medicines:
+                return
+            medicines[medicine_id][self.ARTIFACT_KEY] = match_artifact
+            self._save(self.medicines_file, medicines)
+
+    def delete_medicine(self, medicine_id: str) -> Optional[VersionChange]:
+        with self._locks[self.medicines_file]:
+            before = self.medicines_version()
+            medicines = self._load(self.medicines_file)
+            if medicine_id == 'users' or medicine_id not in medicines:
+                return None
+
+            # Remove from user index
+            user_id = medicines[medicine_id].get('user_id')
+            user_index = medicines.get('users', {}).get(user_id)
+            if user_index and medicine_id in user_index:
+                user_index.remove(medicine_id)
+
+            del medicines[medicine_id]
+            self._save(self.medicines_file, medicines)
+            return before, self.medicines_version()
+
+    def add_verification(self, record: Dict) -> None:
+        with self._locks[self.verifications_file]:
+            verifications = self._load(self.verifications_file)
+            verifications[record['verification_id']] = record
+            self._index_user(verifications, record.get('user_id'), record['verification_id'])
+            self._save(self.verifications_file, verifications)
+
+    def get_verification(self, verification_id: str) -> Optional[Dict]:
+        if verification_id == 'users':
+            return None
+        return self._load(self.verifications_file).get(verification_id)
+
+    def get_user_verifications(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        records = self._user_records(self._load(self.verifications_file), user_id)
+        records.sort(key=lambda x: x.get('verified_at', ''), reverse=True)
+        if limit:
+            records = records[:limit]
+        return records
+
+
+class JournalStorage(JSONStorage):
+    """
+    Medicines in the legacy JSON file, verifications in an append-only journal
+    Adding a verification is a single line append instead of a full rewrite
+    """
+
+    def __init__(self, medicines_file: str, verifications_file: str, data_dir: str, **journal_options):
+        """
+        Initialize journal storage
+        Args:
+            medicines_file: Path to medicines.json
+            verifications_file: Path to legacy verifications.json (imported once)
+            data_dir: Directory holding the journal files
+            journal_options: Extra keyword arguments for VerificationJournal
+        """
+        super().__init__(medicines_file, verifications_file)
+        self.journal = VerificationJournal(data_dir, **journal_options)
+
+        # Held exclusively so only one of several starting workers imports
+        with self.journal.lock:
+            if self.journal.count() == 0:
+                self._import_legacy_verifications()
+
+    def _import_legacy_verifications(self):
+        """Copy legacy verifications.json records into the journal (oldest first)"""
+        records = list(_iter_legacy_records(self.verifications_file, 'verification_id'))
+        if not records:
+            return
+        records.sort(key=lambda x: x.get('verified_at', ''))
+        for record in records:
+            self.journal.append(record)
+        self.journal.compact()
+        print(f"✅ Imported {len(records)} verifications into the journal")
+
+    def add_verification(self, record: Dict) -> None:
+        self.journal.append(record)
+
+    def get_verification(self, verification_id: str) -> Optional[Dict]:
+        return self.journal.get(verification_id)
+
+    def get_user_verifications(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        return self.journal.get_user_records(user_id, limit)
+
+    def get_user_verifications_page(
+        self, user_id: str, limit: int, before: Optional[Dict] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        # The journal keeps each user's records in append order, so a cursor
+        # is simply a position in that list
+        end = before.get('i') if before else None
+        records, start = self.journal.get_user_page(user_id, limit, end)
+        return records, ({'i': start} if start > 0 else None)
+
+    def close(self):
+        self.journal.close()
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Embedded SQLite storage in WAL mode
+    Records are stored as JSON blobs next to indexed lookup columns, so a
+    lookup only touches the rows it returns instead of the whole history
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS medicines (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id TEXT NOT NULL UNIQUE,
+            user_id TEXT,
+            registered_at TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_medicines_user ON medicines(user_id, seq);
+
+        CREATE TABLE IF NOT EXISTS verifications (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            verification_id TEXT NOT NULL UNIQUE,
+            user_id TEXT,
+            medicine_id TEXT,
+            verified_at TEXT,
+            verified INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_verifications_user_time
+            ON verifications(user_id, verified_at);
+        CREATE INDEX IF NOT EXISTS idx_verifications_medicine ON verifications(medicine_id);
+        CREATE INDEX IF NOT EXISTS idx_verifications_time ON verifications(verified_at);
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('medicines_version', 0);
+    """
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000):
+        """
+        Initialize SQLite storage
+        Args:
+            db_path: Path to the SQLite database file
+            busy_timeout_ms: How long a writer waits for a competing lock
+        """
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+
+        conn = self._connect()
+        conn.executescript(self.SCHEMA)
+        self._add_column(conn, 'medicines', 'match_artifact', 'TEXT')
+
+    @staticmethod
+    def _add_column(conn: sqlite3.Connection, table: str, column: str, column_type: str):
+        """Add a column to a table created by an older version of the schema"""
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column in columns:
+            return
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+        except sqlite3.OperationalError as e:
+            # Another worker added it first
+            if 'duplicate column' not in str(e):
+                raise
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not cross fork() (e.g. gunicorn preload_app)
+        if conn is not None and getattr(self._local, 'pid', None) != os.getpid():
+            conn = None
+        if conn is None:
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            # timeout installs the busy handler before any statement runs, so
+            # workers starting together wait for each other instead of failing
+            conn = sqlite3.connect(self.db_path, isolation_level=None,
+                                   timeout=self.busy_timeout_ms / 1000)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _verification_columns(record: Dict) -> tuple:
+        """Extract indexed columns from a verification record"""
+        best_match = record.get('best_match') or {}
+        return (
+            record['verification_id'],
+            record.get('user_id'),
+            best_match.get('medicine_id'),
+            record.get('verified_at'),
+            1 if record.get('verified') else 0,
+            json.dumps(record),
+        )
+
+    def medicines_version(self) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM meta WHERE key = 'medicines_version'"
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+    def _bump_medicines_version(self, conn: sqlite3.Connection) -> VersionChange:
+        """Increment the medicines version counter (inside a write transaction)"""
+        before = self.medicines_version()
+        conn.execute(
+            "UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'medicines_version'"
+        )
+        return before, before + 1
+
+    def add_medicine(self, record: Dict, match_artifact: Optional[Dict] = None) -> VersionChange:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO medicines (medicine_id, user_id, registered_at, data, match_artifact) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (record['medicine_id'], record.get('user_id'), record.get('registered_at'), json.dumps(record),
+                 json.dumps(match_artifact) if match_artifact is not None else None)
+            )
+            change = self._bump_medicines_version(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return change
+
+    def get_medicine(self, medicine_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            'SELECT data FROM medicines WHERE medicine_id = ?', (medicine_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_user_medicines(self, user_id: str) -> List[Dict]:
+        rows = self._connect().execute(
+            'SELECT data FROM medicines WHERE user_id = ? ORDER BY seq', (user_id,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def delete_medicine(self, medicine_id: str) -> Optional[VersionChange]:
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute('DELETE FROM medicines WHERE medicine_id = ?', (medicine_id,))
+            change = self._bump_medicines_version(conn) if cursor.rowcount > 0 else None
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return change
+
+    def get_match_artifact(self, medicine_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            'SELECT match_artifact FROM medicines WHERE medicine_id = ?', (medicine_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def get_user_match_artifacts(self, user_id: str) -> List[Tuple[str, Optional[Dict]]]:
+        # Only the artifact column: the record blobs (with raw OCR text) are not read
+        rows = self._connect().execute(
+            'SELECT medicine_id, match_artifact FROM medicines WHERE user_id = ? ORDER BY seq', (user_id,)
+        ).fetchall()
+        return [(row[0], json.loads(row[1]) if row[1] else None) for row in rows]
+
+    def set_match_artifact(self, medicine_id: str, match_artifact: Dict) -> None:
+        # Derived data only: the medicines version is not bumped
+        self._connect().execute(
+            'UPDATE medicines SET match_artifact = ? WHERE medicine_id = ?',
+            (json.dumps(match_artifact), medicine_id)
+        )
+
+    def add_verification(self, record: Dict, outbox_entry: Optional[Dict] = None) -> None:
+        """
+        Insert a verification record
+        Args:
+            record: Verification record
+            outbox_entry: Notification outbox entry (outbox.NotificationOutbox.new_entry)
+                          inserted in the same transaction; the outbox table must
+                          live in this database
+        """
+        conn = self._connect()
+        insert = (
+            'INSERT INTO verifications '
+            '(verification_id, user_id, medicine_id, verified_at, verified, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)'
+        )
+        if outbox_entry is None:
+            conn.execute(insert, self._verification_columns(record))
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(insert, self._verification_columns(record))
+            insert_entry(conn, outbox_entry)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_verification(self, verification_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            'SELECT data FROM verifications WHERE verification_id = ?', (verification_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_user_verifications(self, user_id: str, limit: Optional[int] = None) -> List[Dict]:
+        rows = self._connect().execute(
+            'SELECT data FROM verifications WHERE user_id = ? '
+            'ORDER BY verified_at DESC, seq DESC LIMIT ?',
+            (user_id, limit if limit else -1)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_user_verifications_page(
+        self, user_id: str, limit: int, before: Optional[Dict] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        # Keyset pagination over idx_verifications_user_time (which also
+        # carries seq as the rowid): no OFFSET scan, no sort
+        if before:
+            rows = self._connect().execute(
+                'SELECT seq, verified_at, data FROM verifications '
+                'WHERE user_id = ? AND (verified_at < ? OR (verified_at = ? AND seq < ?)) '
+                'ORDER BY verified_at DESC, seq DESC LIMIT ?',
+                (user_id, before.get('t'), before.get('t'), before.get('s'), limit + 1)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                'SELECT seq, verified_at, data FROM verifications WHERE user_id = ? '
+                'ORDER BY verified_at DESC, seq DESC LIMIT ?',
+                (user_id, limit + 1)
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = {'t': rows[-1][1], 's': rows[-1][0]}
+        return [json.loads(row[2]) for row in rows], next_cursor
+
+    def migrate_from_json(self, medicines_file: str, verifications_file: str, force: bool = False) -> Dict:
+        """
+        One-shot import of the legacy JSON files
+        Runs inside a single write transaction and records a marker in the
+        meta table, so concurrent workers starting together import only once
+        Args:
+            medicines_file: Path to legacy medicines.json
+            verifications_file: Path to legacy verifications.json
+            force: Import again even if a previous migration was recorded
+        Returns:
+            Dictionary with imported counts and whether the import ran
+        """
+        result = {'migrated': False, 'medicines': 0, 'verifications': 0}
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if done and not force:
+                conn.execute('COMMIT')
+                return result
+
+            for record in _iter_legacy_records(medicines_file, 'medicine_id'):
+                match_artifact = record.pop(JSONStorage.ARTIFACT_KEY, None)
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO medicines (medicine_id, user_id, registered_at, data, match_artifact) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (record['medicine_id'], record.get('user_id'), record.get('registered_at'),
+                     json.dumps(record), json.dumps(match_artifact) if match_artifact else None)
+                )
+                result['medicines'] += cursor.rowcount
+
+            for record in _iter_legacy_records(verifications_file, 'verification_id'):
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO verifications '
+                    '(verification_id, user_id, medicine_id, verified_at, verified, data) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    self._verification_columns(record)
+                )
+                result['verifications'] += cursor.rowcount
+
+            if result['medicines']:
+                self._bump_medicines_version(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', datetime('now'))"
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        result['migrated'] = True
+        return result
+
+
+def _iter_legacy_records(path: str, id_field: str):
+    """Yield records from a legacy JSON collection, skipping the 'users' index"""
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r') as f:
+            collection = json.load(f)
+    except Exception as e:
+        print(f"⚠️  Could not read legacy data file {path}: {e}")
+        return
+
+    for record_id, record in collection.items():
+        if record_id == 'users' or not isinstance(record, dict):
+            continue
+        record.setdefault(id_field, record_id)
+        yield record
+
+
+def create_backend(backend: str, data_dir: str) -> StorageBackend:
+    """
+    Build a storage backend by name
+    Args:
+        backend: 'sqlite', 'journal' or 'json'
+        data_dir: Directory holding the data files
+    Returns:
+        StorageBackend instance
+    """
+    backend = backend.lower()
+    medicines_file = os.path.join(data_dir, 'medicines.json')
+    verifications_file = os.path.join(data_dir, 'verifications.json')
+
+    if backend == 'json':
+        return JSONStorage(medicines_file, verifications_file)
+
+    if backend == 'journal':
+        return JournalStorage(medicines_file, verifications_file, data_dir)
+
+    if backend == 'sqlite':
+        storage = SQLiteStorage(os.path.join(data_dir, 'medicines.db'))
+        # Import legacy JSON data the first time the database is used
+        if os.path.exists(medicines_file) or os.path.exists(verifications_file):
+            result = storage.migrate_from_json(medicines_file, verifications_file)
+            if result['migrated'] and (result['medicines'] or result['verifications']):
+                print(f"✅ Migrated {result['medicines']} medicines and "
+                      f"{result['verifications']} verifications from JSON to SQLite")
+        return storage
+
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+if __name__ == '__main__':
+    # Usage: python storage.py migrate [data_dir]
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print("Usage: python storage.py migrate [data_dir]")
+        sys.exit(1)
+
+    target_dir = sys.argv[2] if len(sys.argv) > 2 else 'data'
+    sqlite_storage = SQLiteStorage(os.path.join(target_dir, 'medicines.db'))
+    summary = sqlite_storage.migrate_from_json(
+        os.path.join(target_dir, 'medicines.json'),
+        os.path.join(target_dir, 'verifications.json'),
+        force=True
+    )
+    print(f"✅ Imported {summary['medicines']} medicines and {summary['verifications']} verifications")
@@ -109,6 +109,63 @@ def test_list_verifications():
     print(f"   Response: {json.dumps(result, indent=2)}")
     return response.status_code == 200
 
+def test_list_verifications_paginated():
+    """Test cursor pagination and field projection on verifications"""
+    print("\n6. Testing Paginated Verifications...")
+    params = {'user_id': 'test_user_123', 'limit': 2, 'fields': 'verified,verified_at'}
+    response = requests.get(f"{BASE_URL}/api/medicine/verifications", params=params)
+    print(f"   Status: {response.status_code}")
+    result = response.json()
+    print(f"   Page 1: {result.get('count')} records, next_cursor={result.get('next_cursor')}")
+    
+    if result.get('next_cursor'):
+        params['before'] = result['next_cursor']
+        response = requests.get(f"{BASE_URL}/api/medicine/verifications", params=params)
+        page2 = response.json()
+        print(f"   Page 2: {page2.get('count')} records, has_more={page2.get('has_more')}")
+    
+    return response.status_code == 200
+
+def test_verify_batch():
+    """Test batch verification with NDJSON results"""
+    print("\n7. Testing Batch Verification...")
+    
+    test_image = "test_patient_photo.jpg"
+    if not os.path.exists(test_image):
+        print(f"   ⚠️  Test image '{test_image}' not found. Skipping...")
+        return None
+    
+    items = [{'user_id': 'test_user_123', 'file': 'photo0'}, {'user_id': 'test_user_123', 'file': 'photo1'}]
+    with open(test_image, 'rb') as f0, open(test_image, 'rb') as f1:
+        files = {'photo0': f0, 'photo1': f1}
+        response = requests.post(f"{BASE_URL}/api/medicine/verify/batch",
+                                 files=files, data={'items': json.dumps(items)}, stream=True)
+        print(f"   Status: {response.status_code}")
+        for line in response.iter_lines():
+            if line:
+                result = json.loads(line)
+                outcome = result.get('error') or ("✅ MATCH" if result.get('verified') else "❌ MISMATCH")
+                print(f"   Item {result.get('index')}: {outcome}")
+    
+    return response.status_code == 200
+
+def test_notification_status(verification_id):
+    """Test the delivery status of a verification's queued notifications"""
+    print("\n8. Testing Notification Status...")
+    
+    if not verification_id:
+        print("   ⚠️  No verification to check. Skipping...")
+        return None
+    
+    response = requests.get(f"{BASE_URL}/api/medicine/verifications/{verification_id}/notifications")
+    print(f"   Status: {response.status_code}")
+    result = response.json()
+    for notification in result.get('notifications', []):
+        print(f"   {notification['notification_id']}: {notification['status']} "
+              f"(attempts: {notification['attempts']})")
+    
+    return response.status_code == 200
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -128,12 +185,12 @@ def main():
     medicine_id = test_register_medicine()
     test_list_medicines()
     
-    if medicine_id:
-        test_verify_medicine(medicine_id)
-    else:
-        test_verify_medicine()
+    verification_id = test_verify_medicine(medicine_id)
     
     test_list_verifications()
+    test_list_verifications_paginated()
+    test_verify_batch()
+    test_notification_status(verification_id)
     
     print("\n" + "=" * 60)
     print("✅ Test suite completed!")
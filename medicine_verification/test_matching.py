@@ -0,0 +1,103 @@
+"""
+Regression tests for medicine matching
+Runs offline, no server needed: python -m pytest test_matching.py
+(or python test_matching.py)
+"""
+
+from drug_lexicon import DrugLexicon
+from matcher import MedicineMatcher, build_match_artifact
+
+LEXICON = DrugLexicon.load()
+
+# Patient label text vs a different registered drug one or two letters away
+LOOK_ALIKE_PAIRS = [
+    ('PREDNISONE TABLETS USP 5 mg', 'Prednisolone 5mg'),
+    ('PITAVASTATIN CALCIUM TABLETS 2 mg', 'Pravastatin 40mg'),
+    ('HYDRALAZINE HYDROCHLORIDE TABLETS 25 mg', 'Hydroxyzine 25mg'),
+    ('HYDROXYZINE HYDROCHLORIDE TABLETS 25 mg', 'Hydralazine 25mg'),
+    ('KLONOPIN 0.5 mg tablets', 'Clonidine 0.1mg'),
+    ('CLONIDINE HYDROCHLORIDE TABLETS 0.1 mg', 'Klonopin 0.5mg'),
+]
+
+
+def compare(patient_text, registered_name, lexicon=None, visual_score=None):
+    """Match result of one patient text against one registered medicine"""
+    matcher = MedicineMatcher(lexicon=lexicon)
+    visual_scores = [visual_score] if visual_score is not None else None
+    return matcher.compare(patient_text, [build_match_artifact(registered_name)], visual_scores)[0]
+
+
+def test_lexicon_keeps_well_formed_words():
+    """A drug name missing from the lexicon is not rewritten into a neighbour"""
+    for word in ['PREDNISONE', 'PITAVASTATIN', 'hydralazine', 'klonopin']:
+        assert LEXICON.correct_token(word) == word
+
+
+def test_lexicon_corrects_ocr_damage():
+    """Digits misread inside a word (and letters inside a strength) are still corrected"""
+    assert LEXICON.correct_token('PARACETAM0L') == 'paracetamol'
+    assert LEXICON.correct_token('Amoxici11in') == 'amoxicillin'
+    assert LEXICON.correct_token('5OOmg') == '500mg'
+
+
+def test_look_alike_drugs_do_not_match():
+    """No look-alike pair matches, with or without the lexicon"""
+    for patient_text, registered_name in LOOK_ALIKE_PAIRS:
+        for lexicon in (None, LEXICON):
+            result = compare(patient_text, registered_name, lexicon)
+            assert not result['match'], (patient_text, registered_name, result['confidence'])
+
+
+def test_lexicon_never_raises_confidence():
+    """A correction can lower a score but never raise it"""
+    for patient_text, registered_name in LOOK_ALIKE_PAIRS + [('PARACETAM0L TABLETS 500 mg', 'Paracetamol 500mg')]:
+        plain = compare(patient_text, registered_name)
+        corrected = compare(patient_text, registered_name, LEXICON)
+        assert corrected['confidence'] <= plain['confidence']
+
+
+def test_conflicting_strength_does_not_match():
+    """The right drug at the wrong strength is a mismatch"""
+    result = compare('AMLODIPINE BESYLATE TABLETS 10 mg', 'Amlodipine 5mg')
+    assert not result['match']
+    assert result['strength_conflict']
+
+
+def test_matching_or_missing_strength_still_matches():
+    """Same strength (in any unit), or none readable on the label, does not block a match"""
+    for patient_text, registered_name in [
+        ('AMLODIPINE BESYLATE TABLETS 5 mg', 'Amlodipine 5mg'),
+        ('AMLODIPINE BESYLATE TABLETS', 'Amlodipine 5mg'),
+        ('Amoxicillin 0.5 g capsules', 'Amoxicillin 500mg'),
+    ]:
+        result = compare(patient_text, registered_name)
+        assert result['match'] and not result['strength_conflict'], (patient_text, result['confidence'])
+
+
+def test_look_alike_pack_is_not_verified_by_its_looks():
+    """A high visual score with sparse text that is not the registered name stays below a match"""
+    for patient_text, registered_name in [
+        ('', 'Amlodipine 5mg'),
+        ('PFIZER', 'Amlodipine 5mg'),
+        ('ATENOLOL', 'Amlodipine 5mg'),
+        ('PANTOPRAZOLE', 'Omeprazole 20mg'),
+        ('TELMISARTAN', 'Losartan 50mg'),
+        ('ibuprofen tablets', 'Paracetamol Tablets 500 mg'),
+    ]:
+        result = compare(patient_text, registered_name, visual_score=1.0)
+        assert not result['match'], (patient_text, registered_name, result['confidence'])
+
+
+def test_visual_score_confirms_partly_read_name():
+    """Part of the registered name plus a matching look verifies a foil pack"""
+    for patient_text, registered_name in [('AMLODIP', 'Amlodipine 5mg'), ('METOP 50', 'Metoprolol 50mg')]:
+        assert not compare(patient_text, registered_name)['match']
+        result = compare(patient_text, registered_name, visual_score=0.75)
+        assert result['match'], (patient_text, result['confidence'])
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"✅ {name}")
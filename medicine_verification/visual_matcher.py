@@ -0,0 +1,236 @@
+"""
+Visual Matcher Module
+Matches a patient photo against the registered back-label photos by
+appearance, for packs where OCR finds little text (e.g. foil blister packs)
+- At registration a compact fingerprint of the back photo is stored with the
+  medicine's match artifact: ORB keypoint descriptors (OpenCV) and a global
+  colour + edge-orientation histogram
+- At verification the patient photo is fingerprinted once and compared with
+  each candidate: Hamming brute-force matching with a ratio test, confirmed
+  by RANSAC (matches must agree on one rotation + scale + shift), plus
+  histogram intersection
+- CPU only, a few milliseconds per candidate (benchmarks/bench_visual.py)
+- Without OpenCV only the histograms are compared, as weaker evidence
+"""
+
+import base64
+import io
+import threading
+import time
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from preprocessing import exif_upright
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    print("⚠️  NumPy not available, visual matching disabled. Install: pip install numpy")
+
+try:
+    import cv2
+    CV2_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    CV2_AVAILABLE = False
+
+# Bump when the fingerprint layout changes; other versions are ignored
+VISUAL_FINGERPRINT_VERSION = 1
+
+FINGERPRINT_SIDE = 640  # photos are fingerprinted at this size
+ORB_FEATURES = 500  # 32-byte descriptor each
+RATIO_TEST = 0.75
+MIN_INLIERS = 10  # up to this many geometrically consistent matches happen by chance
+FULL_SCORE_INLIERS = 30
+HUE_BINS = 16
+SATURATION_BINS = 4
+EDGE_BINS = 8
+KEYPOINT_WEIGHT = 0.8  # share of the score from keypoints when both photos have them
+HISTOGRAM_ONLY_WEIGHT = 0.5  # histograms alone say little: similar packs look alike
+
+
+def _encode(array) -> str:
+    return base64.b64encode(array.tobytes()).decode('ascii')
+
+
+def _decode(text: str, dtype, width: int):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).reshape(-1, width)
+
+
+class VisualMatcher:
+    """Appearance fingerprints of label photos and their comparison"""
+
+    def __init__(self, use_keypoints: bool = True):
+        """
+        Initialize the matcher
+        Args:
+            use_keypoints: Extract and compare ORB keypoints (requires OpenCV)
+        """
+        self.use_keypoints = use_keypoints and CV2_AVAILABLE
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'fingerprints': 0, 'fingerprint_seconds': 0.0, 'comparisons': 0, 'compare_seconds': 0.0}
+
+    def _orb(self):
+        # ORB detectors are not thread-safe; one per thread
+        orb = getattr(self._local, 'orb', None)
+        if orb is None:
+            orb = self._local.orb = cv2.ORB_create(nfeatures=ORB_FEATURES)
+        return orb
+
+    def fingerprint(self, image_bytes: bytes) -> Optional[Dict]:
+        """
+        Fingerprint a label photo
+        Args:
+            image_bytes: Encoded image
+        Returns:
+            JSON-serializable fingerprint, or None if the image cannot be read
+        """
+        if not NUMPY_AVAILABLE:
+            return None
+        started = time.perf_counter()
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.draft('RGB', (FINGERPRINT_SIDE * 2, FINGERPRINT_SIDE * 2))  # JPEG: decode at reduced size
+            image = exif_upright(image).convert('RGB')
+            image.thumbnail((FINGERPRINT_SIDE, FINGERPRINT_SIDE))
+        except Exception as e:
+            print(f"⚠️  Could not fingerprint photo: {e}")
+            return None
+
+        gray = np.asarray(image.convert('L'))
+        fingerprint = {
+            'version': VISUAL_FINGERPRINT_VERSION,
+            'histogram': self._histogram(image, gray),
+            'keypoints': 0,
+        }
+        if self.use_keypoints:
+            keypoints, descriptors = self._orb().detectAndCompute(gray, None)
+            if descriptors is not None and len(keypoints) >= MIN_INLIERS:
+                points = np.array([kp.pt for kp in keypoints], dtype=np.float32)
+                fingerprint.update({
+                    'keypoints': len(keypoints),
+                    'descriptors': _encode(descriptors),
+                    'points': _encode(points),
+                })
+        self._record('fingerprints', 'fingerprint_seconds', time.perf_counter() - started)
+        return fingerprint
+
+    @staticmethod
+    def _histogram(image, gray) -> List[float]:
+        """Hue/saturation histogram, then magnitude-weighted edge orientation histogram (each sums to 1)"""
+        hsv = np.asarray(image.convert('HSV'))
+        colour = np.histogram2d(
+            hsv[..., 0].ravel(), hsv[..., 1].ravel(),
+            bins=(HUE_BINS, SATURATION_BINS), range=((0, 256), (0, 256))
+        )[0].ravel()
+        gy, gx = np.gradient(gray.astype(np.float32))
+        edges = np.histogram(
+            np.arctan2(gy, gx) % np.pi, bins=EDGE_BINS, range=(0, np.pi), weights=np.hypot(gx, gy)
+        )[0]
+        parts = [colour / max(colour.sum(), 1.0), edges / max(edges.sum(), 1e-9)]
+        return [round(float(v), 4) for v in np.concatenate(parts)]
+
+    @staticmethod
+    def _histogram_similarity(a: List[float], b: List[float]) -> float:
+        """Mean histogram intersection of the colour and edge parts (0-1)"""
+        a = np.asarray(a)
+        b = np.asarray(b)
+        split = HUE_BINS * SATURATION_BINS
+        return float(np.minimum(a[:split], b[:split]).sum() + np.minimum(a[split:], b[split:]).sum()) / 2
+
+    @staticmethod
+    def _keypoint_score(patient: Dict, candidate: Dict) -> float:
+        """
+        Geometrically consistent keypoint matches, scaled from 0 at MIN_INLIERS
+        to 1 at FULL_SCORE_INLIERS
+        A similarity transform is fitted rather than a homography: it needs two
+        points per RANSAC sample instead of four, so it converges in a few
+        hundred iterations even when most matches are wrong (a homography took
+        20-60 ms per candidate there), and label photos are rarely at steep angles
+        """
+        query = _decode(candidate['descriptors'], np.uint8, 32)
+        train = _decode(patient['descriptors'], np.uint8, 32)
+        pairs = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(query, train, k=2)
+        good = [p[0] for p in pairs if len(p) == 2 and p[0].distance < RATIO_TEST * p[1].distance]
+        if len(good) < MIN_INLIERS:
+            return 0.0
+        source = _decode(candidate['points'], np.float32, 2)[[m.queryIdx for m in good]]
+        target = _decode(patient['points'], np.float32, 2)[[m.trainIdx for m in good]]
+        _, mask = cv2.estimateAffinePartial2D(
+            source, target, method=cv2.RANSAC, ransacReprojThreshold=6.0, maxIters=500
+        )
+        inliers = int(mask.sum()) if mask is not None else 0
+        return min(1.0, max(0.0, (inliers - MIN_INLIERS) / (FULL_SCORE_INLIERS - MIN_INLIERS)))
+
+    def compare(self, patient: Dict, candidate: Optional[Dict]) -> Optional[float]:
+        """
+        Visual similarity of two fingerprints
+        Returns:
+            Score 0-1, or None if the candidate has no usable fingerprint
+        """
+        if not candidate or candidate.get('version') != VISUAL_FINGERPRINT_VERSION:
+            return None
+        started = time.perf_counter()
+        histogram = self._histogram_similarity(patient['histogram'], candidate['histogram'])
+        if self.use_keypoints and patient.get('keypoints') and candidate.get('keypoints'):
+            keypoints = self._keypoint_score(patient, candidate)
+            score = KEYPOINT_WEIGHT * keypoints + (1 - KEYPOINT_WEIGHT) * histogram
+        else:
+            score = HISTOGRAM_ONLY_WEIGHT * histogram
+        self._record('comparisons', 'compare_seconds', time.perf_counter() - started)
+        return round(score, 3)
+
+    def score(self, image_bytes: bytes, candidates: List[Dict]) -> List[Optional[float]]:
+        """
+        Score a patient photo against candidates' stored fingerprints
+        Args:
+            image_bytes: Encoded patient photo
+            candidates: Match artifacts; a fingerprint is under 'visual'
+        Returns:
+            One score (or None: no fingerprint) per candidate, in order
+        """
+        if not self.has_fingerprints(candidates):
+            return [None] * len(candidates)
+        return self.score_fingerprint(self.fingerprint(image_bytes), candidates)
+
+    @staticmethod
+    def has_fingerprints(candidates: List[Dict]) -> bool:
+        """Whether any candidate can be compared (otherwise the photo need not be fingerprinted)"""
+        return any(candidate.get('visual') for candidate in candidates)
+
+    @property
+    def fingerprint_name(self) -> str:
+        """Identifies this matcher's fingerprints, for caching them by image"""
+        return f"visual:v{VISUAL_FINGERPRINT_VERSION}:{'orb' if self.use_keypoints else 'histogram'}"
+
+    def score_fingerprint(self, patient: Optional[Dict], candidates: List[Dict]) -> List[Optional[float]]:
+        """
+        Score an already fingerprinted patient photo against candidates' stored fingerprints
+        Returns:
+            One score (or None: no fingerprint) per candidate, in order
+        """
+        if patient is None:
+            return [None] * len(candidates)
+        return [self.compare(patient, candidate.get('visual')) for candidate in candidates]
+
+    def _record(self, count_key: str, seconds_key: str, seconds: float):
+        with self._lock:
+            self._stats[count_key] += 1
+            self._stats[seconds_key] += seconds
+
+    def stats(self) -> Dict:
+        """Fingerprint and comparison counts and mean latency, for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            'keypoints': self.use_keypoints,
+            'fingerprints': stats['fingerprints'],
+            'fingerprint_ms': round(stats['fingerprint_seconds'] / stats['fingerprints'] * 1000, 2)
+            if stats['fingerprints'] else None,
+            'comparisons': stats['comparisons'],
+            'compare_ms': round(stats['compare_seconds'] / stats['comparisons'] * 1000, 2)
+            if stats['comparisons'] else None,
+        }